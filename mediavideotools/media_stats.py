@@ -15,9 +15,15 @@ Arguments:
   output.csv        Filename of output CSV (delimiter ";"), or STDOUT.
 
 Options:
+  -c --cache        Use a persistent cache of media file information,
+                    only unchanged files (modification time, size) are reused.
   -f --force        Force overwrite of existing output files.
   -h --help         Show this screen.
+  -j --jobs=N       Number of parallel media file analyses [default: 0].
+                    0 means one per CPU core.
   --no-color        No colored log output.
+  -p --processes=N  Number of worker processes, each scanning one of the
+                    top-level sub-directories [default: 0].
   -v --verbose      Be more verbose.
   --version         Show version.
 """
@@ -39,25 +45,35 @@ Options:
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import json
 import logging
+import multiprocessing
 import os
+import queue
+import shutil
 import subprocess
 import sys
+import threading
 # pylint: disable-next=redefined-builtin
 from codecs import open
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
 import colorlog
 from docopt import docopt
-from pymediainfo import MediaInfo
 
 # HACK to run file both as module and Python program
 try:
     # for running as Python program
-    from mime_checker import is_mediafile
+    from mime_checker import is_mediafile_path, NON_MEDIA_EXTENSIONS
+    from utils.metadata_cache import MetadataCache
+    from utils.mediainfo_handle import get_thread_handle, to_number
 except ModuleNotFoundError:
     # for pytest a relative import is needed
-    from .mime_checker import is_mediafile
+    from .mime_checker import is_mediafile_path, NON_MEDIA_EXTENSIONS
+    from .utils.metadata_cache import MetadataCache
+    from .utils.mediainfo_handle import get_thread_handle, to_number
 
 __version__ = "1.5.2"
 __date__ = "2022-03-24"
@@ -71,9 +87,18 @@ __status__ = "Production"
 DELIMITER = ";"
 # number of rounding digits for CSV
 NDIGITS = 3
+# MediaInfo parsing speed, 0 = only container headers (enough for duration,
+# file size and overall bit rate), 1 = full parse of the whole file
+MEDIAINFO_PARSE_SPEED = 0
 
 DEBUG = bool(os.environ.get("DEBUG", "").lower() in ("1", "true", "yes"))
 
+# limit the number of concurrently running ffprobe fallback processes
+# (independent of the number of worker threads, which can be much higher
+# for I/O bound scans, e.g., on network shares)
+FFPROBE_MAX_PROCESSES = os.cpu_count() or 1
+_ffprobe_semaphore = threading.BoundedSemaphore(FFPROBE_MAX_PROCESSES)
+
 # check for Python3
 if sys.version_info < (3, 0):
     sys.stderr.write('Minimum required version is Python 3.x!\n')
@@ -83,15 +108,17 @@ if sys.version_info < (3, 0):
 class MyMediaInfo:
     """My own data structure for media files information."""
 
-    file_size = None
-    duration = None
-    bit_rate = None
+    # no per-instance __dict__, there can be many instances
+    __slots__ = ("_path", "file_size", "duration", "bit_rate")
 
     def __init__(self, path: Path):
         """Media information data structure."""
         if not isinstance(path, Path):
             raise TypeError("path must be type pathlib.Path!")
         self._path = path
+        self.file_size = None
+        self.duration = None
+        self.bit_rate = None
 
     @property
     def path(self) -> Path:
@@ -102,6 +129,9 @@ class MyMediaInfo:
 class DirectoryMediaStats:
     """Collection of media files information for a directory."""
 
+    __slots__ = ("_path", "_num_entries", "_cum_filesize_bytes", "_cum_duration_seconds",
+                 "_sum_bit_rate", "_bit_rate_count")
+
     def __init__(self, path: Path):
         """Directory media information."""
         if not isinstance(path, Path):
@@ -110,7 +140,9 @@ class DirectoryMediaStats:
         self._num_entries = 0  # >0 when a new entry is added
         self._cum_filesize_bytes = 0
         self._cum_duration_seconds = 0
-        self._mean_bit_rate = 0
+        # the mean bit rate is computed on demand from these
+        self._sum_bit_rate = 0
+        self._bit_rate_count = 0
 
     @property
     def path(self) -> Path:
@@ -147,7 +179,10 @@ class DirectoryMediaStats:
     @property
     def mean_bit_rate(self):
         """Mean (average) bit rate of the media files."""
-        return self._mean_bit_rate
+        if not self._bit_rate_count:
+            return 0
+        # limit decimal places
+        return round(self._sum_bit_rate / self._bit_rate_count, 1)
 
     @staticmethod
     def get_str_fields_names():
@@ -193,8 +228,8 @@ class DirectoryMediaStats:
             self._cum_duration_seconds += other.duration
             if other.bit_rate:
                 # only update if there's actually a valid (not None) bit_rate
-                self._mean_bit_rate = (self._mean_bit_rate * (
-                    self._num_entries - 1) + other.bit_rate) / self._num_entries
+                self._sum_bit_rate += other.bit_rate
+                self._bit_rate_count += 1
         elif isinstance(other, DirectoryMediaStats):
             if other._cum_filesize_bytes == 0 or other.cum_duration_seconds == 0:
                 # skip directories which do not have accountable media files
@@ -202,64 +237,161 @@ class DirectoryMediaStats:
             self._num_entries += 1
             self._cum_filesize_bytes += other.cum_filesize_bytes
             self._cum_duration_seconds += other.cum_duration_seconds
-            self._mean_bit_rate = (self._mean_bit_rate * (
-                self._num_entries - 1) + other._mean_bit_rate) / self.num_entries
+            # a sub-directory accounts as one entry with its (unrounded) mean bit rate
+            if other._bit_rate_count:
+                self._sum_bit_rate += other._sum_bit_rate / other._bit_rate_count
+            self._bit_rate_count += 1
         else:
             raise TypeError(
                 f"unsupported operand type(s) for +: '{type(self).__name__}' and '{type(other).__name__}'")
-        # limit decimal places
-        self._mean_bit_rate = round(self._mean_bit_rate, 1)
         return self
 
 
-def get_media_file_info(filepath: Path) -> MyMediaInfo:
+@lru_cache(maxsize=1)
+def _get_path_to_ffprobe() -> str | None:
+    """Locate the ffprobe executable (only once, not per file)."""
+    return shutil.which("ffprobe")
+
+
+def _get_ffprobe_duration(filepath: Path) -> float | None:
+    """Fallback duration detection using ffprobe.
+
+    ffprobe can only handle one input file per invocation, i.e., there is
+    no way to batch several files into one process. At least the executable
+    lookup is done only once, and no process is spawned at all if there
+    is no ffprobe available. Called from the worker threads, i.e., several
+    ffprobe processes run concurrently while other files are being parsed.
+
+    :param filepath: media file path
+    :return: duration in seconds, or None if not available
+    """
+    ffprobe = _get_path_to_ffprobe()
+    if not ffprobe:
+        logging.error("Could not run ffprobe command: ffprobe not found")
+        return None
+    cmd_args = [ffprobe, '-v', 'warning', '-i', str(filepath),
+                '-show_entries', 'format=duration', '-print_format', 'json']
+    logging.debug("ffprobe cmd: %s", cmd_args)
+    try:
+        with _ffprobe_semaphore:
+            proc = subprocess.run(
+                cmd_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+        logging.debug(proc)
+        if proc.stderr:
+            logging.warning("ffprobe warning: %s",
+                            proc.stderr.decode(errors="replace").replace(os.linesep, ""))
+        if proc.stdout.strip():
+            duration = json.loads(proc.stdout).get("format", {}).get("duration")
+            if duration is not None:
+                return float(duration)
+    except FileNotFoundError as ex:
+        logging.error("Could not run ffprobe command: %s", ex)
+    except OSError as ex:
+        logging.exception(ex)
+    except ValueError as ex:
+        # also json.JSONDecodeError
+        logging.exception(ex)
+    return None
+
+
+def get_media_file_info(filepath: Path, cache: MetadataCache = None) -> MyMediaInfo:
     """Get information for a media file.
 
     :param filepath: full filename and path
+    :param cache: optional persistent cache for unchanged files
     :return: media information
     """
     if not isinstance(filepath, Path):
         raise TypeError("filepath must be type pathlib.Path!")
 
-    media_info = MediaInfo.parse(filepath, encoding_errors="replace")
+    stat_result = None
+    if cache is not None:
+        stat_result = filepath.stat()
+        cached = cache.get(filepath, stat_result)
+        if cached is not None:
+            mmi = MyMediaInfo(filepath)
+            mmi.duration = cached["duration"]
+            mmi.file_size = cached["file_size"]
+            mmi.bit_rate = cached["bit_rate"]
+            return mmi
+
+    # direct library access (one handle per thread), only the general track's fields
+    handle = get_thread_handle(MEDIAINFO_PARSE_SPEED)
     mmi = MyMediaInfo(filepath)
-    gt0 = media_info.general_tracks[0]
-    # duration is in ms
-    mmi.duration = gt0.duration / 1000.0 if gt0.duration is not None else None
-    mmi.file_size = gt0.file_size if gt0.file_size is not None else None
-    mmi.bit_rate = gt0.overall_bit_rate
+    if not handle.open(filepath):
+        # not cached, e.g., a temporary read problem
+        logging.error("MediaInfo could not open the file: %s", filepath)
+        return mmi
+    try:
+        # duration is in ms
+        duration = to_number(handle.get("Duration"))
+        mmi.duration = duration / 1000.0 if duration is not None else None
+        mmi.file_size = to_number(handle.get("FileSize"))
+        mmi.bit_rate = to_number(handle.get("OverallBitRate"))
+    finally:
+        # release the file, the handle is kept for the next one
+        handle.close()
 
     if mmi.duration is None:
         logging.warning(
             "MediaInfo detection problems, trying with ffprobe for: %s", filepath)
-        # fallback to ffprobe
-        cmd_args = ['ffprobe', '-i', filepath, '-show_entries',
-                    'format=duration', '-v', 'warning', '-of', 'csv=p=0']
-        logging.debug("ffprobe cmd: %s", cmd_args)
-        try:
-            proc = subprocess.run(
-                cmd_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
-            logging.debug(proc)
-            stdout = proc.stdout.strip()
-            if stdout:
-                mmi.duration = float(proc.stdout)
-            if proc.stderr:
-                logging.warning("ffprobe warning: %s",
-                                proc.stderr.decode().replace(os.linesep, ""))
-        except FileNotFoundError as ex:
-            logging.error("Could not run ffprobe command: %s", ex)
-        except OSError as ex:
-            logging.exception(ex)
-        except ValueError as ex:
-            logging.exception(ex)
-        except subprocess.CalledProcessError as ex:
-            logging.exception(ex, exc_info=False)
+        mmi.duration = _get_ffprobe_duration(filepath)
 
+    if cache is not None:
+        cache.put(filepath, {"duration": mmi.duration, "file_size": mmi.file_size,
+                             "bit_rate": mmi.bit_rate}, stat_result)
     return mmi
 
 
-def _scan_recursive(root: Path, output_stream) -> DirectoryMediaStats:
-    dirstats = DirectoryMediaStats(root)
+def _analyze_file(filepath: str, cache: MetadataCache = None) -> MyMediaInfo | None:
+    """Check and analyze a single file, to be run in a worker thread.
+
+    :param filepath: file path (plain string, a Path is only built for media files)
+    :param cache: optional persistent cache
+    :return: media information, or None if not a (readable) media file
+    """
+    try:
+        if not is_mediafile_path(filepath):
+            return None
+    except FileNotFoundError as ex:
+        logging.exception(ex, exc_info=False)
+        return None
+    except OSError as ex:
+        logging.exception(ex, exc_info=False)
+        return None
+    return get_media_file_info(Path(filepath), cache)
+
+
+def _write_queued(output_queue: queue.SimpleQueue, output_stream):
+    """Write the queued output lines until the None sentinel, in a background thread.
+
+    :param output_queue: queue of output lines
+    :param output_stream: where to write the results
+    """
+    while True:
+        lines = [output_queue.get()]
+        # write everything which is already available at once
+        while lines[-1] is not None and not output_queue.empty():
+            lines.append(output_queue.get())
+        if lines[-1] is None:
+            output_stream.write("".join(lines[:-1]))
+            return
+        output_stream.write("".join(lines))
+
+
+def _list_directory(root: Path, executor: ThreadPoolExecutor, cache: MetadataCache = None) -> tuple[list, list]:
+    """List a directory and submit its files for analysis.
+
+    :param root: directory path
+    :param executor: worker threads pool for the file analyses
+    :param cache: optional persistent cache
+    :return: (items, sub-directories), items in scandir order, either a
+             sub-directory's index or a pending file analysis
+    """
+    # file analyses are submitted before descending further,
+    # so that the workers stay busy while the sub-directories are scanned
+    items = []
+    subdirs = []
     with os.scandir(root) as path_iterator:
         for entry in path_iterator:
             try:
@@ -269,46 +401,164 @@ def _scan_recursive(root: Path, output_stream) -> DirectoryMediaStats:
                 logging.exception(ex)
                 continue
             if isdir:
-                try:
-                    dms = _scan_recursive(Path(entry.path), output_stream)
-                    if dms.num_entries > 0:
-                        output_stream.write("%s\n" % dms)
-                        dirstats.path = root  # parent path!
-                        dirstats += dms
-                except RuntimeError as ex:
-                    if str(ex).startswith("Symlink loop from "):
-                        # OSError(40, 'Too many levels of symbolic links'), Symlink loop
-                        pass
-                    else:
-                        raise ex
+                subdirs.append(Path(entry.path))
+                items.append(len(subdirs) - 1)
             else:
+                # cheap checks first, before any file is opened by a worker
+                if os.path.splitext(entry.name)[1].lower() in NON_MEDIA_EXTENSIONS:
+                    continue
                 try:
-                    if not is_mediafile(Path(entry.path)):
+                    if entry.stat().st_size == 0:
+                        # empty files can not be media files
                         continue
-                except FileNotFoundError as ex:
-                    logging.exception(ex, exc_info=False)
-                    continue
                 except OSError as ex:
+                    # e.g., broken symlinks
                     logging.exception(ex, exc_info=False)
                     continue
-                mmi = get_media_file_info(Path(entry.path))
+                items.append(executor.submit(_analyze_file, entry.path, cache))
+    return items, subdirs
+
+
+def _aggregate(root: Path, items: list, subdirs_stats: list) -> DirectoryMediaStats:
+    """Aggregate a directory's results, on the main thread, in the original entry order.
+
+    :param root: directory path
+    :param items: items as from _list_directory()
+    :param subdirs_stats: sub-directories' stats (or None), by index
+    :return: directory stats
+    """
+    dirstats = DirectoryMediaStats(root)
+    for item in items:
+        if isinstance(item, Future):
+            mmi = item.result()
+            if mmi is not None:
                 dirstats += mmi
+        else:
+            dms = subdirs_stats[item]
+            if dms is not None and dms.num_entries > 0:
+                dirstats.path = root  # parent path!
+                dirstats += dms
     return dirstats
 
 
-def scan(root: Path, output_stream) -> int:
+def _scan_iterative(root: Path, output_queue: queue.SimpleQueue, executor: ThreadPoolExecutor,
+                    cache: MetadataCache = None) -> DirectoryMediaStats:
+    # depth-first, post-order, with an explicit stack (no recursion limit),
+    # stack frames: (directory, items, sub-directories, sub-directories' stats)
+    stack = [(root, *_list_directory(root, executor, cache), [])]
+    while True:
+        dirpath, items, subdirs, subdirs_stats = stack[-1]
+        if len(subdirs_stats) < len(subdirs):
+            # descend into the next sub-directory
+            subdir = subdirs[len(subdirs_stats)]
+            stack.append((subdir, *_list_directory(subdir, executor, cache), []))
+            continue
+        # all sub-directories done
+        stack.pop()
+        dms = _aggregate(dirpath, items, subdirs_stats)
+        if not stack:
+            return dms
+        # the parent's sub-directories' stats
+        stack[-1][3].append(_output_dirstats(dms, output_queue))
+
+
+def _output_dirstats(dms: DirectoryMediaStats, output_queue: queue.SimpleQueue) -> DirectoryMediaStats | None:
+    """Output a sub-directory's CSV line.
+
+    :param dms: sub-directory's stats
+    :param output_queue: queue of output lines
+    :return: the stats, or None if not accountable
+    """
+    try:
+        if dms.num_entries > 0:
+            output_queue.put(f"{dms}\n")
+    except RuntimeError as ex:
+        if str(ex).startswith("Symlink loop from "):
+            # OSError(40, 'Too many levels of symbolic links'), Symlink loop
+            return None
+        raise ex
+    return dms
+
+
+def _scan_subtree(root: Path, max_workers: int, cache_filepath: Path = None) \
+        -> tuple[str, DirectoryMediaStats, list]:
+    """Scan a complete sub-tree, in a worker process.
+
+    :param root: sub-tree root directory
+    :param max_workers: number of parallel file analyses
+    :param cache_filepath: persistent cache database file, if any
+    :return: (sub-tree's CSV lines, without the root's own line; root's stats; new cache entries)
+    """
+    # the cache's database connection can not be shared between processes,
+    # and only the main process writes, the new entries are returned to it
+    cache = MetadataCache(cache_filepath.stem, cache_filepath.parent, read_only=True) \
+        if cache_filepath else None
+    output_queue = queue.SimpleQueue()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            dms = _scan_iterative(root, output_queue, executor, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    lines = []
+    while not output_queue.empty():
+        lines.append(output_queue.get())
+    return "".join(lines), dms, cache.collected if cache is not None else []
+
+
+def _scan_processes(root: Path, output_queue: queue.SimpleQueue, executor: ThreadPoolExecutor,
+                    max_workers: int, processes: int, cache: MetadataCache = None) -> DirectoryMediaStats:
+    # the root's files are handled here, each sub-tree by a worker process
+    items, subdirs = _list_directory(root, executor, cache)
+    cache_filepath = cache.filepath if cache is not None else None
+    # fresh worker processes instead of forking, the worker threads are already running here
+    # and a fork could copy locks held by them (e.g., of MediaInfo, libmagic, logging)
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=mp_context) as process_executor:
+        futures = [process_executor.submit(_scan_subtree, subdir, max_workers, cache_filepath)
+                   for subdir in subdirs]
+        subdirs_stats = []
+        # same output order as for the single process scan
+        for future in futures:
+            lines, dms, cache_entries = future.result()
+            output_queue.put(lines)
+            subdirs_stats.append(_output_dirstats(dms, output_queue))
+            for filepath, data, stat_result in cache_entries:
+                cache.put(filepath, data, stat_result)
+    return _aggregate(root, items, subdirs_stats)
+
+
+def scan(root: Path, output_stream, max_workers: int = None, cache: MetadataCache = None,
+         processes: int = 0) -> int:
     """Run the main job.
 
     :param root: root directory for recursive scanning
     :param output_stream: where to write the results
+    :param max_workers: number of parallel file analyses (None: one per CPU core)
+    :param cache: optional persistent cache of media file information
+    :param processes: number of worker processes for the root's sub-directories (0: none)
     :return: exit/return code (for main())
     """
     if not root.is_dir():
         raise NotADirectoryError(str(root))
     header_fields = DirectoryMediaStats.get_str_fields_names()
-    output_stream.write("%s\n" % DELIMITER.join(header_fields))
-    total = _scan_recursive(root, output_stream)
-    output_stream.write("%s\n" % total)
+    # output is written by a background thread, i.e., the scan never waits for it
+    output_queue = queue.SimpleQueue()
+    writer_thread = threading.Thread(target=_write_queued, args=(output_queue, output_stream))
+    writer_thread.start()
+    try:
+        output_queue.put(f"{DELIMITER.join(header_fields)}\n")
+        max_workers = max_workers or os.cpu_count()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if processes > 0:
+                total = _scan_processes(root, output_queue, executor, max_workers, processes, cache)
+            else:
+                total = _scan_iterative(root, output_queue, executor, cache)
+        output_queue.put(f"{total}\n")
+    finally:
+        # sentinel, end of output
+        output_queue.put(None)
+        writer_thread.join()
     output_stream.flush()
     return 0
 
@@ -325,6 +575,11 @@ def main():
     arg_verbose = arguments["--verbose"]
     arg_force = arguments["--force"]
     arg_nocolor = arguments["--no-color"]
+    arg_jobs = int(arguments["--jobs"])
+    arg_cache = arguments["--cache"]
+    assert arg_jobs >= 0, "number of jobs must not be negative!"
+    arg_processes = int(arguments["--processes"])
+    assert arg_processes >= 0, "number of processes must not be negative!"
 
     # setup logging
     handler = colorlog.StreamHandler(stream=sys.stderr)
@@ -348,7 +603,13 @@ def main():
     root = Path(arg_root)
     logging.info("base path: %s", root.absolute())
     logging.info("output: %s", out)
-    return scan(root, out)
+    logging.info("jobs: %d", arg_jobs)
+    logging.info("processes: %d", arg_processes)
+    if not arg_cache:
+        return scan(root, out, max_workers=arg_jobs or None, processes=arg_processes)
+    with MetadataCache("stats") as cache:
+        logging.info("cache: %s", cache.filepath)
+        return scan(root, out, max_workers=arg_jobs or None, cache=cache, processes=arg_processes)
 
 
 if __name__ == '__main__':
@@ -40,6 +40,7 @@ import os
 import sys
 import json
 import logging
+from functools import lru_cache
 from pathlib import Path
 
 import colorlog
@@ -63,13 +64,70 @@ if sys.version_info < (3, 9):
     sys.exit(1)
 
 
+# filename extensions which are certainly no media files, i.e.,
+# no need to open and check such files with libmagic
+# (a positive list is not possible, e.g., there are broken *.mkv files)
+NON_MEDIA_EXTENSIONS = frozenset((
+    ".sub", ".idx", ".srt", ".ass", ".ssa", ".vtt",
+    ".nfo", ".txt", ".md", ".log", ".xml", ".json", ".csv", ".htm", ".html", ".pdf",
+    ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp",
+    ".py", ".sh", ".bat", ".lock", ".db",
+    ".zip", ".rar", ".7z", ".gz", ".bz2", ".xz", ".tar",
+    ".torrent", ".url", ".lnk", ".ini", ".cfg",
+))
+# container signatures (offset, magic bytes) of well-known video filename extensions,
+# a matching signature makes the (more expensive) libmagic check unnecessary
+# (still no plain positive list, e.g., there are broken *.mkv files)
+VIDEO_SIGNATURES = {
+    ".mkv": ((0, b"\x1a\x45\xdf\xa3"),),
+    ".webm": ((0, b"\x1a\x45\xdf\xa3"),),
+    ".mp4": ((4, b"ftyp"),),
+    ".m4v": ((4, b"ftyp"),),
+    ".mov": ((4, b"ftyp"), (4, b"moov"), (4, b"mdat"), (4, b"wide"), (4, b"free")),
+    ".avi": ((8, b"AVI "),),
+    ".flv": ((0, b"FLV"),),
+    ".ts": ((0, b"\x47"),),
+    ".m2ts": ((4, b"\x47"),),
+    ".mpg": ((0, b"\x00\x00\x01\xba"),),
+    ".mpeg": ((0, b"\x00\x00\x01\xba"),),
+    ".wmv": ((0, b"\x30\x26\xb2\x75"),),
+}
+# main MIME types of media files
+MEDIA_MAIN_TYPES = frozenset(("video", "audio"))
+
+# one libmagic handle for all checks (thread-safe, python-magic uses a lock)
+_MAGIC = magic.Magic(mime=True)
+
+
 def is_mediafile(filepath: Path) -> bool:
     """Detect if the specified file is a media-type using MIME type and libmagic.
 
     :param filepath: media filename and path
     :return: boolean true if file has video MIME type or relevant filename extension.
     """
-    return is_video(filepath) or is_audio(filepath)
+    if not isinstance(filepath, Path):
+        raise TypeError("filepath must be pathlib.Path")
+    return is_mediafile_path(str(filepath))
+
+
+def is_mediafile_path(filepath: str) -> bool:
+    """Detect if the specified file is a media-type, for plain string paths.
+
+    Same as is_mediafile() but without any pathlib overhead,
+    e.g., for os.DirEntry.path values in large scans.
+
+    :param filepath: media filename and path
+    :return: boolean true if file has video MIME type or relevant filename extension.
+    """
+    suffix = os.path.splitext(filepath)[1].lower()
+    if suffix in NON_MEDIA_EXTENSIONS:
+        return False
+    if suffix == ".mts":
+        # special handling for .mts video files, detected as "application/octet-stream"
+        return True
+    # only one libmagic check for both, video and audio
+    main_type = __get_mime_type_path(filepath).split('/')[0]
+    return main_type.lower() in MEDIA_MAIN_TYPES
 
 
 def is_video(filepath: Path) -> bool:
@@ -80,15 +138,33 @@ def is_video(filepath: Path) -> bool:
     """
     if not isinstance(filepath, Path):
         raise TypeError("filepath must be pathlib.Path")
-    if filepath.suffix.lower() == ".sub":
+    suffix = filepath.suffix.lower()
+    if suffix == ".sub":
         # special handling for .sub files which are detected as MIME "video/mpeg"
         return False
-    if filepath.suffix.lower() == ".mts":
+    if suffix == ".mts":
         # special handling for .mts video files, detected as "application/octet-stream"
         return True
+    if has_video_signature(str(filepath), suffix):
+        return True
     return __mime_mainclass_check(filepath, "video")
 
 
+def has_video_signature(filepath: str, extension: str) -> bool:
+    """Check if a file has the container signature of its (well-known video) extension.
+
+    :param filepath: filename and path
+    :param extension: filename extension (lower-case), e.g., ".mkv"
+    :return: True if matching, False if not or unknown extension
+    """
+    signatures = VIDEO_SIGNATURES.get(extension)
+    if not signatures:
+        return False
+    # raises FileNotFoundError etc., like the libmagic check
+    head = _read_head(filepath, 12)
+    return any(head[offset:offset + len(magic_bytes)] == magic_bytes for offset, magic_bytes in signatures)
+
+
 def is_audio(filepath: Path) -> bool:
     """Check if file is an audiofile, uses filename and MIME type heuristics.
 
@@ -106,20 +182,71 @@ def get_mime_type(filepath: Path) -> str:
     """
     if not isinstance(filepath, Path):
         raise TypeError("filepath must be pathlib.Path")
-    # open file in binary mode
+    return __get_mime_type_path(str(filepath))
+
+
+def __get_mime_type_path(filepath: str) -> str:
     # raises FileNotFoundException or IOError if the file does not exist
     # raises OSError(40, 'Too many levels of symbolic links') for symlink loop
-    #
+    stat_result = os.stat(filepath)
+    # cached, as long as the file is unchanged
+    return __get_mime_type_cached(filepath, stat_result.st_mtime_ns, stat_result.st_size)
+
+
+# pylint: disable-next=unused-argument
+@lru_cache(maxsize=4096)
+def __get_mime_type_cached(filepath: str, mtime_ns: int, size: int) -> str:
     # NOTE / ATTENTION:
     # magic.from_file(...) does have Unicode decoding problems on MS Windows
     # (use magic.from_buffer() instead!)
     #
-    result = magic.from_buffer(filepath.open(mode="rb").read(1024), mime=True)
+    result = _MAGIC.from_buffer(_read_head(filepath, 1024))
     # return MIME type (e.g., 'video/x-matroska')
     return result
 
 
+# flags for the raw probe reads: binary on MS Windows, no blocking on FIFOs
+_OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_BINARY", 0) | getattr(os, "O_NONBLOCK", 0)
+# Linux only, no atime updates (only allowed for the file owner or root)
+_O_NOATIME = getattr(os, "O_NOATIME", 0)
+
+
+def _read_head(filepath: str, size: int) -> bytes:
+    """Read the first bytes of a file, unbuffered, as raw syscalls.
+
+    :param filepath: filename and path
+    :param size: number of bytes to read
+    :return: file head
+    """
+    if _O_NOATIME:
+        try:
+            fd = os.open(filepath, _OPEN_FLAGS | _O_NOATIME)
+        except PermissionError:
+            # EPERM, not the owner of the file
+            fd = os.open(filepath, _OPEN_FLAGS)
+    else:
+        fd = os.open(filepath, _OPEN_FLAGS)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            try:
+                # no read-ahead, only this small chunk is needed
+                os.posix_fadvise(fd, 0, size, os.POSIX_FADV_RANDOM)
+            except OSError:
+                # ESPIPE, e.g., FIFO
+                pass
+        try:
+            return os.read(fd, size)
+        except BlockingIOError:
+            # e.g., FIFO without writer
+            return b""
+    finally:
+        os.close(fd)
+
+
 def __mime_mainclass_check(filepath: Path, expected_main_type: Path) -> bool:
+    if filepath.suffix.lower() in NON_MEDIA_EXTENSIONS:
+        # no need to ask libmagic (e.g., subtitles, images, text files)
+        return False
     mimetype = get_mime_type(filepath)
     main_type = mimetype.split('/')[0]
     return main_type.lower() == expected_main_type.lower()
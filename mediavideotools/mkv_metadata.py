@@ -25,75 +25,121 @@ import os
 import shutil
 import subprocess
 import xml.etree.ElementTree as ET
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from tempfile import mkstemp
 from typing import Dict
+from xml.sax.saxutils import escape
 
 MKV_METADATA_BASETAGNAME = "video_convert_x265"
+# XML declaration, as written by ElementTree with encoding 'utf8'
+XML_DECLARATION = b"<?xml version='1.0' encoding='utf8'?>\n"
 
 
+@lru_cache(maxsize=1)
 def get_path_to_mkvpropedit():
-    """Find the file path to the mkvpropedit binary."""
+    """Find the file path to the mkvpropedit binary (once, cached)."""
     cmd = shutil.which("mkvpropedit")
     if not cmd:
         raise RuntimeError("Could not find mkvpropedit in PATH!")
     return cmd
 
 
-def mkv_produce_metadata(meta_standard: Dict[str, str],
-                         meta_custom: Dict[str, object],
-                         basetagname: str = MKV_METADATA_BASETAGNAME) -> ET.ElementTree:
-    """Produce MKV metadata.
+def _simple_xml(key: str, value: object) -> str:
+    """Produce a <Simple> element, i.e., a key-value pair, as XML string.
+
+    :param key: the name
+    :param value: the value, converted to string
+    :return: XML string
+    """
+    return f"<Simple><Name>{escape(key)}</Name><String>{escape(str(value))}</String></Simple>"
+
+
+def mkv_produce_metadata_xml(meta_standard: Dict[str, str],
+                             meta_custom: Dict[str, object],
+                             basetagname: str = MKV_METADATA_BASETAGNAME) -> bytes:
+    """Produce MKV metadata, as serialized XML document.
+
+    The structure is fixed (<Tags><Tag><Simple>...), i.e., the XML is written
+    directly without building an ElementTree first.
 
     :param meta_standard: key-value dictionary with field names according to IETF standard
     :param meta_custom: key-value dictionary with custom field names
     :param basetagname: the tags parent name
-    :return: MKV metadata XML as xml.etree.Elementree
+    :return: MKV metadata XML (UTF-8, with XML declaration)
     """
     # https://datatracker.ietf.org/doc/html/draft-ietf-cellar-tags-04#section-6.15
     # https://gitlab.com/mbunkus/mkvtoolnix/-/blob/main/examples/matroskatags.dtd
     # https://www.ietf.org/archive/id/draft-ietf-cellar-matroska-06.html#name-tag-element
     # https://www.ietf.org/archive/id/draft-ietf-cellar-matroska-06.html#name-simpleblock-element
+    parts = []
+    if meta_standard:
+        parts.append("<Tag>")
+        parts.extend(_simple_xml(key, value) for key, value in meta_standard.items())
+        parts.append("</Tag>")
+    if meta_custom:
+        parts.append(f"<Tag><Simple><Name>{escape(basetagname)}</Name>")
+        parts.extend(_simple_xml(key, value) for key, value in meta_custom.items())
+        parts.append("</Simple></Tag>")
+    # same output as ElementTree's serialization (e.g., "<Tags />" if empty)
+    body = f"<Tags>{''.join(parts)}</Tags>" if parts else "<Tags />"
+    return XML_DECLARATION + body.encode("utf8")
 
-    def create_simple(node: ET.Element, key: str, value: object):
-        simple = ET.SubElement(node, "Simple")
-        ET.SubElement(simple, "Name").text = key
-        ET.SubElement(simple, "String").text = str(value)
-
-    def add_meta(node: ET.Element, meta: Dict[str, object]):
-        for key, value in meta.items():
-            create_simple(node, key, value)
 
-    root = ET.Element("Tags")
-    tree = ET.ElementTree(root)
+def mkv_produce_metadata(meta_standard: Dict[str, str],
+                         meta_custom: Dict[str, object],
+                         basetagname: str = MKV_METADATA_BASETAGNAME) -> ET.ElementTree:
+    """Produce MKV metadata.
 
-    if meta_standard:
-        tag0 = ET.SubElement(root, "Tag")
-        add_meta(tag0, meta_standard)
+    :param meta_standard: key-value dictionary with field names according to IETF standard
+    :param meta_custom: key-value dictionary with custom field names
+    :param basetagname: the tags parent name
+    :return: MKV metadata XML as xml.etree.Elementree
+    """
+    xml = mkv_produce_metadata_xml(meta_standard, meta_custom, basetagname)
+    return ET.ElementTree(ET.fromstring(xml))
 
-    if meta_custom:
-        tag_custom = ET.SubElement(root, "Tag")
-        # targets = ET.SubElement(tag_custom, "Targets")
-        # ET.SubElement(targets, "TargetTypeValue").text = "50"
-        # ET.SubElement(targets, "TrackUID").text = "17166847858402652337"
-        tag_custom_simple = ET.SubElement(tag_custom, "Simple")
-        ET.SubElement(tag_custom_simple, "Name").text = basetagname
-        add_meta(tag_custom_simple, meta_custom)
 
-    return tree
+def _write_xml(fout, xml: ET.ElementTree | bytes):
+    """Write the XML metadata document to a binary file object."""
+    if isinstance(xml, bytes):
+        fout.write(xml)
+    else:
+        # serialized directly into the file, no intermediate bytes object
+        # (same output as ET.tostring(..., encoding='utf8'), incl. XML declaration)
+        xml.write(fout, encoding='utf8', method='xml')
 
 
-def mkv_add_metadata_xml(filepath: Path, xml: ET.ElementTree,
+def mkv_add_metadata_xml(filepath: Path, xml: ET.ElementTree | bytes,
                          keep_times: bool = False, keep_xml: bool = False):
     """Add XML metadata to an MKV file.
 
+    On Linux the XML is passed to mkvpropedit as an in-memory file (memfd),
+    i.e., no temporary file is written to disk (unless keep_xml).
+
     :param filepath: Path to MKV file
-    :param xml: XML ElementTree by mkv_produce_metadata()
+    :param xml: XML document by mkv_produce_metadata_xml(), or ElementTree by mkv_produce_metadata()
     :param keep_times: restore file's access and modification times
     :param keep_xml: keep the temporary XML metadata file (input for mkvpropedit)
     """
     if not isinstance(filepath, Path):
         raise TypeError("filepath must be pathlib.Path")
+    # first, i.e., no temporary file left behind if not available
+    cmd = get_path_to_mkvpropedit()
+
+    if not keep_xml and hasattr(os, "memfd_create") and os.path.isdir("/dev/fd"):
+        # anonymous in-memory file, inherited by mkvpropedit and opened there as /dev/fd/N
+        # (seekable, unlike a pipe, and nothing to delete afterwards)
+        memfd = os.memfd_create("metadata_xml")
+        try:
+            with open(memfd, "wb", closefd=False) as fout:
+                _write_xml(fout, xml)
+            _run_mkvpropedit(cmd, filepath, f"/dev/fd/{memfd}", keep_times, pass_fds=(memfd,))
+        finally:
+            os.close(memfd)
+        return
 
     # NOTE: NamedTemporaryFile did not work on MS Windows !
     # with NamedTemporaryFile(prefix="metadata_", suffix=".xml", delete=True) as tmpf:
@@ -101,21 +147,58 @@ def mkv_add_metadata_xml(filepath: Path, xml: ET.ElementTree,
     tmpf_int, tmpfp = mkstemp(prefix="metadata_", suffix=".xml")
 
     logging.debug("writing metadata XML to temporary file: %s", tmpfp)
-    xml_str = ET.tostring(xml.getroot(), encoding='utf8', method='xml')
     with open(tmpf_int, "wb") as fout:
-        fout.write(xml_str)
+        _write_xml(fout, xml)
+
+    _run_mkvpropedit(cmd, filepath, tmpfp, keep_times)
+
+    if not keep_xml:
+        # delete temporary file
+        logging.debug("deleting temporary file: %s", tmpfp)
+        os.unlink(tmpfp)
+
+
+def mkv_add_metadata_xml_batch(jobs: Iterable[tuple[Path, ET.ElementTree | bytes]],
+                               keep_times: bool = False, max_workers: int = None):
+    """Add XML metadata to multiple MKV files, with parallel mkvpropedit processes.
+
+    mkvpropedit is mostly waiting for I/O, i.e., overlapping the processes
+    hides the process start-up and file access latency.
+
+    :param jobs: (Path to MKV file, XML document) pairs, see mkv_add_metadata_xml()
+    :param keep_times: restore files' access and modification times
+    :param max_workers: number of parallel mkvpropedit processes (None: one per CPU core)
+    """
+    # first, i.e., fail before any file is touched
+    get_path_to_mkvpropedit()
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        futures = [executor.submit(mkv_add_metadata_xml, filepath, xml, keep_times)
+                   for filepath, xml in jobs]
+        for future in futures:
+            # re-raise exceptions of the workers
+            future.result()
 
+
+def _run_mkvpropedit(cmd: str, filepath: Path, xml_filepath: str, keep_times: bool,
+                     pass_fds: tuple[int, ...] = ()):
+    """Run mkvpropedit to set the global tags of an MKV file.
+
+    :param cmd: path to the mkvpropedit binary
+    :param filepath: Path to MKV file
+    :param xml_filepath: path of the XML metadata file
+    :param keep_times: restore file's access and modification times
+    :param pass_fds: file descriptors to be inherited by mkvpropedit
+    """
     stats = filepath.stat()
 
     # run external command to add metadata
     # NOTE:
     # use mkvpropedit which just modifies metadata without creating a new file
     # (ffmpeg would create a whole new file...)
-    cmd = get_path_to_mkvpropedit()
-    cmd_args = [cmd, f'{str(filepath.resolve())}', "--tags", f'global:{tmpfp}']
+    cmd_args = [cmd, f'{str(filepath.resolve())}', "--tags", f'global:{xml_filepath}']
     logging.info("running: %s", " ".join(cmd_args))
     try:
-        subprocess.run(cmd_args, check=True, shell=(os.name == "nt"))
+        subprocess.run(cmd_args, check=True, shell=(os.name == "nt"), pass_fds=pass_fds)
     except subprocess.CalledProcessError as ex:
         logging.exception(ex)
 
@@ -124,15 +207,9 @@ def mkv_add_metadata_xml(filepath: Path, xml: ET.ElementTree,
             "restoring file's original access and modification times ...")
         os.utime(filepath.resolve(), ns=(stats.st_atime_ns, stats.st_mtime_ns))
 
-    if not keep_xml:
-        # delete temporary file
-        logging.debug("deleting temporary file: %s", tmpfp)
-        os.unlink(tmpfp)
-
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Modify MKV metadata.")
-    parser.add_argument("mkvfile", type=Path)
+    parser.add_argument("mkvfile", type=Path, nargs="+")
     parser.add_argument("--kv", action="append", required=True,
                         help="key-value metadata pairs, format 'key:value'")
     parser.add_argument("--keep-times", action="store_true",
@@ -152,7 +229,12 @@ if __name__ == "__main__":
         mc[k] = v
     logging.debug("metadata: %s", mc)
 
-    metadata_xml = mkv_produce_metadata(
+    metadata_xml = mkv_produce_metadata_xml(
         meta_custom=mc, meta_standard={}, basetagname=args.basetagname)
-    mkv_add_metadata_xml(args.mkvfile, metadata_xml,
-                         keep_times=args.keep_times, keep_xml=args.keep_xml)
+    if args.keep_xml:
+        for mkvfile in args.mkvfile:
+            mkv_add_metadata_xml(mkvfile, metadata_xml,
+                                 keep_times=args.keep_times, keep_xml=True)
+    else:
+        mkv_add_metadata_xml_batch(((mkvfile, metadata_xml) for mkvfile in args.mkvfile),
+                                   keep_times=args.keep_times)
@@ -19,6 +19,7 @@ Options:
   -p --pattern=X    Globbing pattern [default: *.mkv].
   -f --force        Force overwrite of existing output files.
   -h --help         Show this screen.
+  -j --jobs=N       Number of parallel directory listings [default: 4].
   --no-color        No colored log output.
   -v --verbose      Be more verbose.
   --version         Show version.
@@ -44,11 +45,22 @@ Options:
 import logging
 import os
 import sys
+from collections import deque
+from fnmatch import fnmatch
+from io import StringIO
 from pathlib import Path
 
 import colorlog
 from docopt import docopt
 
+# HACK to run file both as module and Python program
+try:
+    # for running as Python program
+    from utils.file_utils import scandir_walk
+except ModuleNotFoundError:
+    # for pytest a relative import is needed
+    from .utils.file_utils import scandir_walk
+
 __appname__ = "rename_based_on_dirname"
 __version__ = "1.2.0"
 __date__ = "2022-08-19"
@@ -66,9 +78,10 @@ if sys.version_info < (3, 0):
     sys.exit(1)
 
 
-def _get_dst(src: Path):
-    dirname = src.parts[-2]
-    return src.with_stem(dirname)
+def _get_dst(src: Path, dirname: str = None):
+    if dirname is None:
+        dirname = src.parts[-2]
+    return src.with_name(f"{dirname}{src.suffix}")
 
 
 def _is_os_windows():
@@ -101,28 +114,50 @@ def build_renaming_commands(src: Path, dst: Path, output_stream=sys.stdout):
         output_stream.write(f'mv --no-clobber "{src}" "{dst}"\n')
 
 
-def nfo_renaming(src: Path):
+def nfo_renaming(src: Path, dirname: str = None):
     """.nfo file renaming.
 
     :param src: media file path according to which a matching .nfo is constructed
+    :param dirname: name of the parent directory, if already known
     """
     assert isinstance(src, Path)
     nfo_filepath = src.with_suffix(".nfo")
     if not nfo_filepath.exists():
         # no matching .nfo file => do nothing
         return None, None
-    dirname = src.parts[-2]
+    if dirname is None:
+        dirname = src.parts[-2]
     assert dirname != "/"
-    nfo_filepath_new = nfo_filepath.with_name(dirname).with_suffix(".nfo")
+    nfo_filepath_new = nfo_filepath.with_name(f"{dirname}.nfo")
     return nfo_filepath, nfo_filepath_new
 
 
-def run(rootdir: Path, output_stream=sys.stdout, pattern: str = "*.mkv"):
+def _handle_file(src: Path, dirname: str, output_stream):
+    # use the dirpath as the new src
+    dst = _get_dst(src, dirname)
+    logging.debug("src: %s", src)
+    logging.debug("dst: %s", dst)
+
+    if len(str(dst)) <= len(str(src)):
+        logging.warning("The new name must be longer! %s (%d) --> %s (%d)",
+                        src.name, len(src.name), dst.name, len(dst.name))
+        return
+
+    build_renaming_commands(src, dst, output_stream)
+
+    # renaming for .nfo files
+    nfo_filepath, nfo_filepath_new = nfo_renaming(src, dirname)
+    build_renaming_commands(
+        nfo_filepath, nfo_filepath_new, output_stream)
+
+
+def run(rootdir: Path, output_stream=sys.stdout, pattern: str = "*.mkv", max_workers: int = 4):
     """Run the main job.
 
     :param rootdir: root directory for recursive scanning
     :param output_stream: where to write the results
     :param pattern: globbing pattern
+    :param max_workers: number of threads for parallel directory listings
     :return: exit/return code (for main())
     """
     if not rootdir.is_dir():
@@ -130,31 +165,44 @@ def run(rootdir: Path, output_stream=sys.stdout, pattern: str = "*.mkv"):
 
     logging.debug("globbing pattern: %s", pattern)
 
-    for root, dirs, _ in os.walk(str(rootdir.resolve())):
-        for dirname in dirs:
-            dirpath = Path(root, dirname)
-            logging.debug("dirpath: %s", dirpath)
-
-            for src in dirpath.glob(pattern):
-                # use the dirpath as the new src
-                dst = _get_dst(src)
-                logging.debug("src: %s", src)
-                logging.debug("dst: %s", dst)
-
-                if len(str(dst)) <= len(str(src)):
-                    logging.warning("The new name must be longer! %s (%d) --> %s (%d)",
-                                    src.name, len(src.name), dst.name, len(dst.name))
-                    continue
-
-                build_renaming_commands(src, dst, output_stream)
-
-                # renaming for .nfo files
-                nfo_filepath, nfo_filepath_new = nfo_renaming(src)
-                build_renaming_commands(
-                    nfo_filepath, nfo_filepath_new, output_stream)
-
-                # only rename once, only first file in directory
-                continue
+    # The output order is the one of the former os.walk() + glob() implementation,
+    # i.e., a directory's sub-directories are handled when the directory is visited.
+    # Each sub-directory's files are known only later (when it is visited itself),
+    # therefore the output is buffered until it is in order.
+    pending = deque()
+    outputs = {}
+
+    def flush_in_order():
+        while pending and pending[0] in outputs:
+            output_stream.write(outputs.pop(pending.popleft()))
+
+    top = str(rootdir.resolve())
+    for root, dir_entries, file_entries in scandir_walk(top, max_workers=max_workers):
+        pending.extend(entry.path for entry in dir_entries)
+        # symlinked directories are not walked into, but their files are relevant
+        for dir_entry in dir_entries:
+            if dir_entry.is_symlink():
+                dirpath = Path(dir_entry.path)
+                logging.debug("dirpath: %s", dirpath)
+                buffer = StringIO()
+                for src in dirpath.glob(pattern):
+                    _handle_file(src, dir_entry.name, buffer)
+                outputs[dir_entry.path] = buffer.getvalue()
+        # only files in sub-directories, not in the root directory itself
+        if root != top:
+            logging.debug("dirpath: %s", root)
+            # the same for all files in this directory
+            dirname = os.path.basename(root)
+            buffer = StringIO()
+            for entry in file_entries:
+                if fnmatch(entry.name, pattern):
+                    _handle_file(Path(entry.path), dirname, buffer)
+            outputs[root] = buffer.getvalue()
+        flush_in_order()
+
+    # unlistable directories never got any output
+    for dirpath in pending:
+        output_stream.write(outputs.get(dirpath, ""))
 
     return 0
 
@@ -173,6 +221,8 @@ def main():
     arg_force = arguments["--force"]
     arg_nocolor = arguments["--no-color"]
     arg_pattern = arguments["--pattern"]
+    arg_jobs = int(arguments["--jobs"])
+    assert arg_jobs > 0, "number of jobs must be positive!"
 
     # setup logging
     handler = colorlog.StreamHandler(stream=sys.stderr)
@@ -196,7 +246,7 @@ def main():
     root = Path(arg_root)
     logging.info("root: %s", root.absolute())
     logging.info("output: %s", out)
-    return run(root, out, arg_pattern)
+    return run(root, out, arg_pattern, arg_jobs)
 
 
 if __name__ == '__main__':
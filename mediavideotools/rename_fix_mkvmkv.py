@@ -14,6 +14,7 @@ Arguments:
 
 Options:
   -h --help         Show this screen.
+  -j --jobs=N       Number of parallel directory listings [default: 4].
   -l --list         Do not rename just print list of files.
   -v --verbose      Be more verbose.
   --version         Show version.
@@ -44,6 +45,14 @@ from pathlib import Path
 # pylint: disable-next=redefined-builtin
 from docopt import docopt
 
+# HACK to run file both as module and Python program
+try:
+    # for running as Python program
+    from utils.file_utils import scandir_walk
+except ModuleNotFoundError:
+    # for pytest a relative import is needed
+    from .utils.file_utils import scandir_walk
+
 __appname__ = "rename_fix_mkvmkv"
 __version__ = "1.0.0"
 __date__ = "2022-10-03"
@@ -64,35 +73,55 @@ if sys.version_info < (3, 0):
 FILENAME_EXTENSION = ".mkv"
 # marker for converted files
 FILENAME_MARKER_X265 = "_x265"
+# marker of the broken filenames, e.g., ".mkv_x265.mkv"
+MARKER = f"{FILENAME_EXTENSION}{FILENAME_MARKER_X265}{FILENAME_EXTENSION}"
+# the same, encoded once for comparisons with the raw (bytes) directory entries
+MARKER_BYTES = os.fsencode(MARKER)
+# fixed filename ending, e.g., "_x265.mkv"
+MARKER_REPLACEMENT = f"{FILENAME_MARKER_X265}{FILENAME_EXTENSION}"
+
+
+def _scan_matching(rootdir: bytes, marker: bytes, max_workers: int = 4):
+    """Find all files whose names end with the marker.
+
+    Walks with bytes paths, i.e., there is no decoding of all the
+    (non-matching) filenames, and the inner loop is kept minimal.
+
+    :param rootdir: root directory for recursive scanning
+    :param marker: filename ending
+    :param max_workers: number of threads for parallel directory listings
+    :return: generator of matching file paths (bytes)
+    """
+    for _, _, file_entries in scandir_walk(rootdir, max_workers=max_workers):
+        for entry in file_entries:
+            if entry.name.endswith(marker):
+                yield entry.path
 
 
-def run(rootdir: Path, print_list=False):
+def run(rootdir: Path, print_list=False, max_workers: int = 4):
     """Run the main job.
 
     :param rootdir: root directory for recursive scanning
     :param print_list: just list files
+    :param max_workers: number of threads for parallel directory listings
     :return: exit/return code (for main())
     """
-    # e.g., ".mkv_x265.mkv"
-    marker = f"{FILENAME_EXTENSION}{FILENAME_MARKER_X265}{FILENAME_EXTENSION}"
-    logging.debug("marker: %s", marker)
-
-    for root, _, files in os.walk(rootdir):
-        for filename in files:
-            if filename.endswith(marker):
-                filepath = Path(root, filename)
-                logging.debug("filepath: %s", filepath)
-
-                if print_list:
-                    print(filepath.resolve())
-                    continue
-
-                filename_new = filename.replace(
-                    marker, f"{FILENAME_MARKER_X265}{FILENAME_EXTENSION}")
-                filepath_new = Path(root, filename_new)
-                logging.debug("filepath_new: %s", filepath_new)
-                print(
-                    f'mv --no-clobber --verbose "{filepath.resolve()}" "{filepath_new.resolve()}"')
+    logging.debug("marker: %s", MARKER)
+
+    for path in _scan_matching(os.fsencode(rootdir), MARKER_BYTES, max_workers):
+        filepath = Path(os.fsdecode(path))
+        logging.debug("filepath: %s", filepath)
+
+        if print_list:
+            print(filepath.resolve())
+            continue
+
+        # the filename is known to end with the marker
+        filename_new = filepath.name.removesuffix(MARKER) + MARKER_REPLACEMENT
+        filepath_new = filepath.with_name(filename_new)
+        logging.debug("filepath_new: %s", filepath_new)
+        print(
+            f'mv --no-clobber --verbose "{filepath.resolve()}" "{filepath_new.resolve()}"')
 
     return 0
 
@@ -107,6 +136,8 @@ def main():
     arg_root = arguments["<directory>"]
     arg_verbose = arguments["--verbose"]
     arg_list = arguments["--list"]
+    arg_jobs = int(arguments["--jobs"])
+    assert arg_jobs > 0, "number of jobs must be positive!"
 
     # setup logging
     logging.basicConfig(level=logging.WARNING if not DEBUG else logging.DEBUG,
@@ -119,7 +150,7 @@ def main():
 
     root = Path(arg_root)
     logging.info("base path: %s", root.absolute())
-    return run(root, arg_list)
+    return run(root, arg_list, arg_jobs)
 
 
 if __name__ == '__main__':
@@ -2,8 +2,8 @@
 # -*- coding: utf-8 -*-
 """rename_x265_remove_x264.py - Fix x265 MKV files with abundant "x264".
 
-Print the renaming commands to fix MKV filenames which
-contain "x264" but are actually x265.
+Print the renaming commands (or rename directly) to fix MKV filenames
+which contain "x264" but are actually x265.
 
 Example:
     xyz_x264.mkv --> xyz_x265.mkv
@@ -18,9 +18,14 @@ Arguments:
   directory         Starting root directory for recursive scan.
 
 Options:
+  --apply           Rename the files directly instead of printing mv commands
+                    (existing files are not overwritten).
   -h --help         Show this screen.
   -l --list         Do not rename just print list of files.
   --no-color        No colored log output.
+  --prune=NAMES     Comma-separated names of directories not to descend into
+                    (case-insensitive, hidden directories are always skipped)
+                    [default: Subs,Subtitles,Artwork].
   -v --verbose      Be more verbose.
   --version         Show version.
 """
@@ -44,13 +49,22 @@ Options:
 #
 import logging
 import os
+import re
 import sys
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
 # pylint: disable-next=redefined-builtin
-import colorlog
 from docopt import docopt
 
+# HACK to run file both as module and Python program
+try:
+    # for running as Python program
+    from utils.file_utils import scandir_walk
+except ModuleNotFoundError:
+    # for pytest a relative import is needed
+    from .utils.file_utils import scandir_walk
+
 __appname__ = "rename_x265_remove_x264"
 __version__ = "1.1.0"
 __date__ = "2022-10-03"
@@ -64,9 +78,21 @@ __status__ = "Production"
 FILENAME_EXTENSION = ".mkv"
 # marker for converted files
 FILENAME_MARKER_X265 = "_x265"
+# marker of relevant files, e.g., "_x265.mkv"
+MARKER = f"{FILENAME_MARKER_X265}{FILENAME_EXTENSION}"
+# only the filename's tail is lower-cased for the comparison, not the whole name,
+# and as bytes, i.e., only matching names are decoded
+_MARKER_LC_BYTES = os.fsencode(MARKER.lower())
 # strings which should be replaced
 STRINGS_TO_REPLACE = (".x264-", ".h264-")
 REPLACE_STRING = "."
+_PATTERN = re.compile("|".join(re.escape(s) for s in STRINGS_TO_REPLACE))
+# directories which do not contain converted MKV files, i.e., not descended into
+PRUNE_DIRS = ("Subs", "Subtitles", "Artwork")
+# number of threads for parallel directory listings (I/O bound)
+SCAN_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# number of output lines to be written at once
+OUTPUT_CHUNK_LINES = 1000
 
 DEBUG = bool(os.environ.get("DEBUG", "").lower() in ("1", "true", "yes"))
 
@@ -79,88 +105,176 @@ def _handle_filepath(filepath: Path) -> Path | None:
     """Handle single files, i.e., erase/replace strings in filenames."""
     assert isinstance(filepath, Path)
 
-    if not any([e in filepath.stem for e in STRINGS_TO_REPLACE]):
+    filepath_new = _handle_filepath_str(str(filepath))
+    return Path(filepath_new) if filepath_new else None
+
+
+def _handle_filepath_str(filepath: str) -> str | None:
+    """Handle single files, i.e., erase/replace strings in filenames (plain string variant)."""
+    # split like PurePath.stem/suffix, but without Path objects
+    head, sep, name = filepath.rpartition(os.sep)
+    i = name.rfind(".")
+    if 0 < i < len(name) - 1:
+        stem, suffix = name[:i], name[i:]
+    else:
+        stem, suffix = name, ""
+
+    # all strings replaced in one pass
+    stem_new, num_replaced = _PATTERN.subn(REPLACE_STRING, stem)
+    if num_replaced == 0:
         # no string-to-erase in fhe filepath
         return None
 
-    filepath_new = filepath
-    for erase in STRINGS_TO_REPLACE:
-        stem_new = filepath_new.stem.replace(erase, REPLACE_STRING)
-        filepath_new = filepath_new.with_stem(stem_new)
+    return f"{head}{sep}{stem_new}{suffix}"
 
-    return filepath_new
 
+def _handle_files(files: Iterable[Path]) -> Iterator[tuple[Path, Path]]:
+    """Handle (process) files, lazily.
 
-def _handle_files(files: list[Path]) -> dict[Path, Path]:
-    """Handle (process) list of files."""
-    result = {}
+    :param files: file paths
+    :return: (old-filepath, new-filepath) for all files to be renamed
+    """
     for filepath in files:
         filepath_new = _handle_filepath(filepath)
         if filepath_new:
-            result[filepath] = filepath_new
-    # return: old-filepath --> new-filepath
-    return result
+            yield filepath, filepath_new
+
 
+def _entry_name(entry: os.DirEntry) -> bytes:
+    return entry.name
 
-def _get_marker() -> str:
-    return f"{FILENAME_MARKER_X265}{FILENAME_EXTENSION}"
 
+def scan(rootdir: Path, max_workers: int = SCAN_MAX_WORKERS,
+         prune_dirs: Iterable[str] = PRUNE_DIRS) -> Iterator[Path]:
+    """Scan for relevant MKV file candidates, i.e., files with marker.
 
-def scan(rootdir: Path) -> list[Path]:
-    """Scan for relevant MKV file candidates, i.e., files with marker."""
-    # e.g., "_x265.mkv"
-    marker = _get_marker()
+    :param rootdir: root directory for recursive scanning
+    :param max_workers: number of threads for parallel directory listings
+    :param prune_dirs: names of directories not to descend into (case-insensitive),
+                       hidden directories are always skipped
+    :return: candidates, lazily (in sorted traversal order)
+    """
     logging.debug(
-        "scanning for relevant files with markers (marker: '%s') ...", marker)
-
-    candidates = []
-    for root, dirs, files in os.walk(rootdir):
-        dirs.sort()
-        files.sort()
-        for filename in files:
-            if not filename.lower().endswith(marker):
+        "scanning for relevant files with markers (marker: '%s') ...", MARKER)
+
+    marker_lc = _MARKER_LC_BYTES
+    marker_len = len(marker_lc)
+    # bytes, like the entry names
+    prune_lc = frozenset(os.fsencode(name.lower()) for name in prune_dirs)
+    # once, not per file
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+    for _, dir_entries, file_entries in scandir_walk(os.fsencode(rootdir), max_workers=max_workers):
+        # in-place, i.e., also the pruning and the order of the traversal
+        dir_entries[:] = [entry for entry in dir_entries
+                          if not entry.name.startswith(b".") and entry.name.lower() not in prune_lc]
+        dir_entries.sort(key=_entry_name)
+        file_entries.sort(key=_entry_name)
+        for entry in file_entries:
+            if entry.name[-marker_len:].lower() != marker_lc:
                 # skip files not marked as x265 and MKV
                 continue
-            filepath = Path(root, filename)
-            logging.debug("candidate: %s", filepath)
-            candidates.append(filepath)
-    return candidates
+            filepath = Path(os.fsdecode(entry.path))
+            if debug:
+                logging.debug("candidate: %s", filepath)
+            yield filepath
+
 
+def _rename_no_clobber(src: str, dst: str) -> bool:
+    """Rename a file like `mv --no-clobber`, i.e., never overwrite an existing file.
 
-def run(rootdir: Path, print_list=False, output_stream=sys.stdout):
+    :param src: source file path
+    :param dst: destination file path
+    :return: True if renamed
+    """
+    if os.path.lexists(dst):
+        logging.warning("Not renaming, target already exists: %s", dst)
+        return False
+    try:
+        os.rename(src, dst)
+    except OSError as ex:
+        logging.error("Could not rename '%s': %s", src, ex)
+        return False
+    return True
+
+
+def run(rootdir: Path, print_list=False, output_stream=sys.stdout, apply=False,
+        prune_dirs: Iterable[str] = PRUNE_DIRS):
     """Run the main job.
 
     :param rootdir: root directory for recursive scanning
     :param print_list: just list files
     :param output_stream: target stream to write output to
+    :param apply: rename files directly instead of printing mv commands (ignored with print_list)
+    :param prune_dirs: names of directories not to descend into, see scan()
     :return: exit/return code (for main())
     """
-    candidates = scan(rootdir)
-    logging.debug("#candidates: %d", len(candidates))
-
-    if not candidates:
+    # absolute paths without Path.resolve(), i.e., no symlink resolution syscalls per file
+    cwd = os.getcwd()
+    num_candidates = 0
+    num_processed = 0
+    num_failed = 0
+    lines = []
+    # streaming, i.e., candidates are processed while scanning
+    for old in scan(rootdir, prune_dirs=prune_dirs):
+        num_candidates += 1
+        old_abs = os.path.normpath(os.path.join(cwd, old))
+        new_abs = _handle_filepath_str(old_abs)
+        if not new_abs:
+            continue
+        num_processed += 1
+        if print_list:
+            output = old_abs
+        elif apply:
+            if not _rename_no_clobber(old_abs, new_abs):
+                num_failed += 1
+                continue
+            # like `mv --verbose`
+            output = f"renamed '{old_abs}' -> '{new_abs}'"
+        else:
+            output = f'mv --no-clobber --verbose "{old_abs}" "{new_abs}"'
+        lines.append(output)
+        if len(lines) >= OUTPUT_CHUNK_LINES:
+            # in chunks, not two writes per line
+            _write_lines(output_stream, lines)
+            lines.clear()
+    logging.debug("#candidates: %d", num_candidates)
+    logging.debug("#processed: %d", num_processed)
+
+    if not num_candidates:
         logging.warning("No file candidates found.")
         return -1
 
-    files = _handle_files(candidates)
-    logging.debug("#processed: %d", len(files))
-
-    if not files:
+    if not num_processed:
         logging.warning("No relevant files to process.")
         return -2
 
-    for old, new in files.items():
-        if print_list:
-            output = str(old.resolve())
-        else:
-            output = f'mv --no-clobber --verbose "{old.resolve()}" "{new.resolve()}"'
-        output_stream.write(output)
-        output_stream.write("\n")
-
+    if lines:
+        _write_lines(output_stream, lines)
     output_stream.flush()
+
+    if num_failed:
+        logging.warning("Could not rename %d files.", num_failed)
+        return -3
     return 0
 
 
+def _write_lines(output_stream, lines: list[str]):
+    text = "\n".join(lines) + "\n"
+    try:
+        fd = output_stream.fileno()
+    except (AttributeError, OSError):
+        # not a real file, e.g., StringIO (io.UnsupportedOperation is an OSError)
+        output_stream.write(text)
+        return
+    # directly to the file descriptor, i.e., one syscall instead of one per line
+    output_stream.flush()
+    # file system encoding, i.e., undecodable filenames are written as they are
+    data = memoryview(os.fsencode(text))
+    while data:
+        data = data[os.write(fd, data):]
+
+
 def main():
     """Run main program entry.
 
@@ -170,10 +284,14 @@ def main():
     arguments = docopt(__doc__, version=version_string)
     arg_root = arguments["<directory>"]
     arg_list = arguments["--list"]
+    arg_apply = arguments["--apply"]
     arg_nocolor = arguments["--no-color"]
+    arg_prune = [name.strip() for name in arguments["--prune"].split(",") if name.strip()]
     arg_verbose = arguments["--verbose"]
 
-    # setup logging
+    # setup logging, colorlog is imported only now, i.e., not for --help or --version
+    # pylint: disable-next=import-outside-toplevel
+    import colorlog
     handler = colorlog.StreamHandler(stream=sys.stderr)
     handler.setFormatter(
         colorlog.ColoredFormatter('%(log_color)s%(asctime)s %(levelname)-8s %(message)s',
@@ -186,7 +304,7 @@ def main():
 
     root = Path(arg_root)
     logging.info("base path: %s", root.absolute())
-    return run(root, arg_list)
+    return run(root, arg_list, apply=arg_apply, prune_dirs=arg_prune)
 
 
 if __name__ == '__main__':
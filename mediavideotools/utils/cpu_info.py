@@ -0,0 +1,69 @@
+#!python3
+# -*- coding: utf-8 -*-
+"""CPU information, e.g., the number of cores usable for encoder threads."""
+
+import logging
+import math
+import os
+
+# Linux, cgroup v2 CPU bandwidth limit, e.g., "200000 100000" or "max 100000"
+CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+# Linux, CPU details
+PROC_CPUINFO = "/proc/cpuinfo"
+
+
+def get_physical_cpu_count(cpuinfo_filepath: str = PROC_CPUINFO) -> int:
+    """Get the number of physical CPU cores, i.e., without SMT/hyper-threading.
+
+    :param cpuinfo_filepath: path of the cpuinfo file
+    :return: number of physical cores (at least 1)
+    """
+    cores = set()
+    try:
+        with open(cpuinfo_filepath, encoding="utf8") as fin:
+            physical_id = None
+            for line in fin:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    physical_id = value.strip()
+                elif key == "core id":
+                    cores.add((physical_id, value.strip()))
+    except OSError as ex:
+        logging.debug("cpuinfo problem: %s", ex)
+    if cores:
+        return len(cores)
+    # unknown, assume 2 threads per core
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+def get_cgroup_cpu_limit(cpu_max_filepath: str = CGROUP_CPU_MAX) -> int | None:
+    """Get the CPU limit of the (cgroup v2) control group, e.g., in a container.
+
+    :param cpu_max_filepath: path of the cgroup's cpu.max file
+    :return: number of CPUs (rounded up), None if not limited
+    """
+    try:
+        with open(cpu_max_filepath, encoding="utf8") as fin:
+            quota, period = fin.read().split()[:2]
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    return max(1, math.ceil(int(quota) / int(period)))
+
+
+def get_usable_cpu_count() -> int:
+    """Get the number of physical CPU cores which may actually be used by this process.
+
+    Considers the CPU affinity and the control group (cgroup) limit.
+
+    :return: number of cores (at least 1)
+    """
+    count = get_physical_cpu_count()
+    if hasattr(os, "sched_getaffinity"):
+        count = min(count, len(os.sched_getaffinity(0)))
+    limit = get_cgroup_cpu_limit()
+    if limit is not None:
+        count = min(count, limit)
+    return max(1, count)
@@ -0,0 +1,345 @@
+#!python3
+# -*- coding: utf-8 -*-
+"""Fast container probing, reading only the relevant parts of MKV and MP4 files.
+
+MediaInfo.parse() is thorough, but expensive. To know the video codecs (and,
+for MKV, the tag names) it is enough to read the container's header
+structures: Matroska's Tracks and Tags elements (found via the SeekHead) and
+MP4's moov/trak/stsd boxes.
+"""
+
+import os
+import struct
+
+CONTAINER_MATROSKA = "matroska"
+CONTAINER_MP4 = "mp4"
+
+# video codec IDs (Matroska) and sample entry types (MP4) of HEVC/x265
+HEVC_CODECS = frozenset(("V_MPEGH/ISO/HEVC", "hvc1", "hev1"))
+# codec IDs which do not tell the actual codec (e.g., AVI compatibility mode, encryption)
+_INDIRECT_CODECS = frozenset(("V_MS/VFW/FOURCC", "V_QUICKTIME", "encv", "resv"))
+
+# number of bytes read at once from the beginning of the file
+HEAD_SIZE = 128 * 1024
+# upper limit for the size of a single element/box which is read completely
+MAX_ELEMENT_SIZE = 64 * 1024 * 1024
+# upper limit of top-level elements/boxes to look at
+_MAX_TOPLEVEL = 1000
+
+# EBML/Matroska element IDs
+_EBML = 0x1A45DFA3
+_DOCTYPE = 0x4282
+_SEGMENT = 0x18538067
+_SEEKHEAD = 0x114D9B74
+_SEEK = 0x4DBB
+_SEEKID = 0x53AB
+_SEEKPOSITION = 0x53AC
+_TRACKS = 0x1654AE6B
+_TRACKENTRY = 0xAE
+_TRACKTYPE = 0x83
+_CODECID = 0x86
+_TAGS = 0x1254C367
+_TAG = 0x7373
+_SIMPLETAG = 0x67C8
+_TAGNAME = 0x45A3
+_CLUSTER = 0x1F43B675
+_TRACKTYPE_VIDEO = 1
+
+# MP4 boxes which contain the boxes on the way to the sample descriptions
+_MP4_CONTAINERS = (b"trak", b"mdia", b"minf", b"stbl")
+
+
+class _Reader:
+    """Random access reads, with the file's head kept in memory."""
+
+    def __init__(self, fin):
+        self._fin = fin
+        self.size = os.fstat(fin.fileno()).st_size
+        self.head = fin.read(HEAD_SIZE)
+
+    def read(self, offset: int, size: int) -> bytes:
+        if offset + size <= len(self.head):
+            return self.head[offset:offset + size]
+        if size > MAX_ELEMENT_SIZE:
+            raise ValueError(f"element too big: {size}")
+        self._fin.seek(offset)
+        return self._fin.read(size)
+
+
+def _read_vint(data: bytes, pos: int, keep_marker: bool = False) -> tuple[int | None, int]:
+    """Read an EBML variable size integer.
+
+    :param data: data
+    :param pos: position in data
+    :param keep_marker: keep the length marker bit (for element IDs)
+    :return: (value, length), value None for "unknown" sizes (all bits set)
+    """
+    first = data[pos]
+    if first == 0:
+        raise ValueError("invalid EBML variable size integer")
+    length = 9 - first.bit_length()
+    value = first if keep_marker else first & ((1 << (8 - length)) - 1)
+    all_ones = value == (1 << (8 - length)) - 1
+    for byte in data[pos + 1:pos + length]:
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    if pos + length > len(data):
+        raise ValueError("truncated EBML variable size integer")
+    if all_ones and not keep_marker:
+        return None, length
+    return value, length
+
+
+def _read_element_header(data: bytes, pos: int) -> tuple[int, int | None, int]:
+    """Read an EBML element header.
+
+    :return: (element ID, data size or None if unknown, header length)
+    """
+    element_id, id_length = _read_vint(data, pos, keep_marker=True)
+    size, size_length = _read_vint(data, pos + id_length)
+    return element_id, size, id_length + size_length
+
+
+def _iter_elements(data: bytes, start: int = 0, end: int = None):
+    """Iterate over the (child) elements of EBML data.
+
+    :return: (element ID, data start, data end) for each element
+    """
+    end = len(data) if end is None else min(end, len(data))
+    pos = start
+    while pos < end:
+        element_id, size, header_length = _read_element_header(data, pos)
+        data_start = pos + header_length
+        data_end = end if size is None else data_start + size
+        yield element_id, data_start, data_end
+        pos = data_end
+
+
+def _read_uint(data: bytes) -> int:
+    return int.from_bytes(data, "big")
+
+
+def _read_string(data: bytes) -> str:
+    return data.rstrip(b"\x00").decode("utf8", errors="replace")
+
+
+def _parse_tracks(data: bytes) -> list[str]:
+    codecs = []
+    for element_id, start, end in _iter_elements(data):
+        if element_id != _TRACKENTRY:
+            continue
+        track_type = codec_id = None
+        for child_id, child_start, child_end in _iter_elements(data, start, end):
+            if child_id == _TRACKTYPE:
+                track_type = _read_uint(data[child_start:child_end])
+            elif child_id == _CODECID:
+                codec_id = _read_string(data[child_start:child_end])
+        if track_type == _TRACKTYPE_VIDEO:
+            codecs.append(codec_id or "")
+    return codecs
+
+
+def _parse_simpletag(data: bytes, start: int, end: int, prefix: str, names: set[str]):
+    name = None
+    nested = []
+    for element_id, child_start, child_end in _iter_elements(data, start, end):
+        if element_id == _TAGNAME:
+            name = _read_string(data[child_start:child_end])
+        elif element_id == _SIMPLETAG:
+            nested.append((child_start, child_end))
+    if name is None:
+        return
+    # flattened like MediaInfo does, e.g., "video_convert_x265_x265_no_gain"
+    name = f"{prefix}_{name}" if prefix else name
+    names.add(name.lower())
+    for child_start, child_end in nested:
+        _parse_simpletag(data, child_start, child_end, name, names)
+
+
+def _parse_tags(data: bytes, names: set[str]):
+    for element_id, start, end in _iter_elements(data):
+        if element_id != _TAG:
+            continue
+        for child_id, child_start, child_end in _iter_elements(data, start, end):
+            if child_id == _SIMPLETAG:
+                _parse_simpletag(data, child_start, child_end, "", names)
+
+
+def _read_element(reader: _Reader, offset: int) -> tuple[int, bytes]:
+    """Read a complete element at a file offset.
+
+    :return: (element ID, element data)
+    """
+    header = reader.read(offset, 12)
+    element_id, size, header_length = _read_element_header(header, 0)
+    if size is None:
+        raise ValueError("unknown element size")
+    return element_id, reader.read(offset + header_length, size)
+
+
+def _probe_matroska(reader: _Reader) -> tuple[str, dict]:
+    head = reader.head
+    element_id, start, end = next(_iter_elements(head))
+    if element_id != _EBML:
+        return "", {}
+    doctype = None
+    for child_id, child_start, child_end in _iter_elements(head, start, end):
+        if child_id == _DOCTYPE:
+            doctype = _read_string(head[child_start:child_end])
+    if doctype not in ("matroska", "webm"):
+        return "", {}
+
+    # the segment, containing everything else
+    element_id, size, header_length = _read_element_header(reader.read(end, 12), 0)
+    if element_id != _SEGMENT:
+        return "", {}
+    segment_start = end + header_length
+    segment_end = reader.size if size is None else min(reader.size, segment_start + size)
+
+    # top-level elements before the first cluster (i.e., before the actual media data)
+    offsets = {_SEEKHEAD: set(), _TRACKS: set(), _TAGS: set()}
+    pos = segment_start
+    for _ in range(_MAX_TOPLEVEL):
+        if pos >= segment_end:
+            break
+        element_id, size, header_length = _read_element_header(reader.read(pos, 12), 0)
+        if element_id == _CLUSTER or size is None:
+            break
+        if element_id in offsets:
+            offsets[element_id].add(pos)
+        pos += header_length + size
+
+    # the seek heads point to the other elements, e.g., tags at the end of the file
+    seekheads_done = set()
+    while offsets[_SEEKHEAD] - seekheads_done:
+        offset = min(offsets[_SEEKHEAD] - seekheads_done)
+        seekheads_done.add(offset)
+        _, data = _read_element(reader, offset)
+        for element_id, start, end in _iter_elements(data):
+            if element_id != _SEEK:
+                continue
+            seek_id = seek_position = None
+            for child_id, child_start, child_end in _iter_elements(data, start, end):
+                if child_id == _SEEKID:
+                    seek_id = _read_uint(data[child_start:child_end])
+                elif child_id == _SEEKPOSITION:
+                    seek_position = _read_uint(data[child_start:child_end])
+            if seek_id in offsets and seek_position is not None:
+                offsets[seek_id].add(segment_start + seek_position)
+
+    if not offsets[_TRACKS]:
+        return "", {}
+    video_codecs = []
+    for offset in sorted(offsets[_TRACKS]):
+        element_id, data = _read_element(reader, offset)
+        if element_id == _TRACKS:
+            video_codecs.extend(_parse_tracks(data))
+    tag_names = set()
+    for offset in sorted(offsets[_TAGS]):
+        element_id, data = _read_element(reader, offset)
+        if element_id == _TAGS:
+            _parse_tags(data, tag_names)
+    return CONTAINER_MATROSKA, {"video_codecs": video_codecs, "tag_names": tag_names}
+
+
+def _read_box_header(data: bytes, pos: int) -> tuple[bytes, int | None, int]:
+    """Read an MP4 box header.
+
+    :return: (box type, box size or None if until the end, header length)
+    """
+    size, box_type = struct.unpack_from(">I4s", data, pos)
+    if size == 1:
+        return box_type, struct.unpack_from(">Q", data, pos + 8)[0], 16
+    if size == 0:
+        return box_type, None, 8
+    return box_type, size, 8
+
+
+def _iter_boxes(data: bytes, start: int = 0, end: int = None):
+    """Iterate over the (child) boxes of MP4 data.
+
+    :return: (box type, data start, data end) for each box
+    """
+    end = len(data) if end is None else min(end, len(data))
+    pos = start
+    while pos + 8 <= end:
+        box_type, size, header_length = _read_box_header(data, pos)
+        size = end - pos if size is None else size
+        if size < header_length:
+            raise ValueError("invalid box size")
+        yield box_type, pos + header_length, pos + size
+        pos += size
+
+
+def _parse_trak(data: bytes, start: int, end: int) -> str | None:
+    """Get the sample entry type (codec) of a video track, None if no video track."""
+    handler = None
+    sample_entry = None
+    stack = [(start, end)]
+    while stack:
+        start, end = stack.pop()
+        for box_type, box_start, box_end in _iter_boxes(data, start, end):
+            if box_type in _MP4_CONTAINERS:
+                stack.append((box_start, box_end))
+            elif box_type == b"hdlr":
+                # version/flags, pre_defined, handler_type
+                handler = data[box_start + 8:box_start + 12]
+            elif box_type == b"stsd":
+                # version/flags, entry_count, then the first sample entry (a box)
+                for entry_type, _, _ in _iter_boxes(data, box_start + 8, box_end):
+                    sample_entry = entry_type.decode("latin1")
+                    break
+    if handler != b"vide":
+        return None
+    return sample_entry or ""
+
+
+def _probe_mp4(reader: _Reader) -> tuple[str, dict]:
+    if reader.head[4:8] != b"ftyp":
+        return "", {}
+    # top-level boxes, the moov box could be at the end (after the media data)
+    pos = 0
+    for _ in range(_MAX_TOPLEVEL):
+        if pos + 8 > reader.size:
+            break
+        box_type, size, header_length = _read_box_header(reader.read(pos, 16), 0)
+        size = reader.size - pos if size is None else size
+        if size < header_length:
+            raise ValueError("invalid box size")
+        if box_type == b"moov":
+            data = reader.read(pos + header_length, size - header_length)
+            video_codecs = []
+            for child_type, child_start, child_end in _iter_boxes(data):
+                if child_type == b"trak":
+                    codec = _parse_trak(data, child_start, child_end)
+                    if codec is not None:
+                        video_codecs.append(codec)
+            return CONTAINER_MP4, {"video_codecs": video_codecs, "tag_names": set()}
+        pos += size
+    return "", {}
+
+
+def probe_codec(filepath) -> tuple[str, dict]:
+    """Get the video codecs (and tag names) of MKV and MP4 files, reading only the needed parts.
+
+    :param filepath: file path
+    :return: (container, info), container is "" if unknown or not sure, then info is empty,
+             otherwise info has "video_codecs" (list of codec IDs/sample entry types)
+             and "tag_names" (set of lower-case, MediaInfo-like flattened tag names)
+    :raises OSError: if the file can not be read
+    """
+    with open(filepath, "rb") as fin:
+        reader = _Reader(fin)
+        if len(reader.head) < 12:
+            return "", {}
+        try:
+            if reader.head.startswith(b"\x1a\x45\xdf\xa3"):
+                container, info = _probe_matroska(reader)
+            else:
+                container, info = _probe_mp4(reader)
+        except (ValueError, IndexError, StopIteration, struct.error):
+            # broken, truncated, or simply not understood
+            return "", {}
+    if container and _INDIRECT_CODECS.intersection(info["video_codecs"]):
+        return "", {}
+    return container, info
@@ -3,6 +3,8 @@
 """Various utility methods."""
 
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 
@@ -20,3 +22,103 @@ def get_file_size_mb(filepath: Path, round_decimals: int = 2) -> float:
     except OSError as ex:
         logging.exception(ex)
     return -1
+
+
+def drop_page_cache(filepath: Path) -> bool:
+    """Advise the OS to drop a file's cached pages, e.g., after reading a big file once.
+
+    Only supported where os.posix_fadvise() is available (e.g., Linux).
+
+    :param filepath: file path
+    :return: True if advised, False if not supported or OSError
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    try:
+        fd = os.open(filepath, os.O_RDONLY)
+    except OSError as ex:
+        logging.debug("drop_page_cache problem: %s", ex)
+        return False
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError as ex:
+        logging.debug("drop_page_cache problem: %s", ex)
+        return False
+    finally:
+        os.close(fd)
+    return True
+
+
+def _scandir_split(path) -> tuple[list[os.DirEntry], list[os.DirEntry]] | None:
+    """List a directory, split into directory and non-directory entries.
+
+    :param path: directory path (str or bytes)
+    :return: (directory entries, file entries), or None if not listable
+    """
+    dir_entries = []
+    file_entries = []
+    try:
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                try:
+                    # like os.walk(), symlinks to directories count as directories
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    dir_entries.append(entry)
+                else:
+                    file_entries.append(entry)
+    except OSError as ex:
+        # like os.walk(), ignore unlistable directories
+        logging.debug("scandir problem: %s", ex)
+        return None
+    return dir_entries, file_entries
+
+
+def _is_symlink(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_symlink()
+    except OSError:
+        return False
+
+
+def scandir_walk(top, max_workers: int = 1):
+    """Walk a directory tree top-down, like os.walk(), but yield os.DirEntry objects.
+
+    The DirEntry objects carry the file type (and on Windows the stat
+    information) from the directory listing, i.e., no additional stat()
+    calls are needed for type checks. Like os.walk() symlinks to
+    directories are listed as directories but are not descended into,
+    and the directory entries list can be modified in-place to prune
+    the traversal.
+    With max_workers > 1 the sub-directories are listed in parallel
+    worker threads, ahead of the traversal (the yield order stays the same).
+
+    :param top: root directory (str or bytes)
+    :param max_workers: number of threads for parallel directory listings
+    :return: generator of (dirpath, dir_entries, file_entries)
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+
+    def listing(path):
+        if executor is None:
+            return _scandir_split(path)
+        return executor.submit(_scandir_split, path)
+
+    try:
+        stack = [(top, listing(top))]
+        while stack:
+            dirpath, listed = stack.pop()
+            split = listed.result() if executor is not None else listed
+            if split is None:
+                continue
+            dir_entries, file_entries = split
+            yield dirpath, dir_entries, file_entries
+            # (potentially pruned) sub-directories, in order
+            children = [(entry.path, listing(entry.path))
+                        for entry in dir_entries if not _is_symlink(entry)]
+            stack.extend(reversed(children))
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,241 @@
+#!python3
+# -*- coding: utf-8 -*-
+"""Direct access to the MediaInfo library, reusing one handle for many files.
+
+pymediainfo's MediaInfo.parse() creates a new library handle for every file
+and builds (and parses) the complete XML output of all tracks. When only a
+few fields are of interest, querying them directly with MediaInfo_Get() is
+much cheaper.
+
+The library is loaded on its own (like pymediainfo does, preferring the one
+bundled with pymediainfo's wheels). If that is not possible, the handles fall
+back to pymediainfo's public MediaInfo.parse().
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import re
+import sys
+import threading
+import weakref
+from functools import lru_cache
+
+import pymediainfo
+from pymediainfo import MediaInfo
+
+# MediaInfo_stream_t
+STREAM_GENERAL = 0
+STREAM_VIDEO = 1
+STREAM_AUDIO = 2
+STREAM_TEXT = 3
+# MediaInfo_info_t, the value itself
+_INFO_TEXT = 1
+# MediaInfo_infooptions_t, search the parameter by name
+_INFO_NAME = 0
+# pymediainfo's track types of the stream kinds
+_TRACK_TYPES = {STREAM_GENERAL: "General", STREAM_VIDEO: "Video", STREAM_AUDIO: "Audio", STREAM_TEXT: "Text"}
+# pymediainfo's track attribute names which do not follow from the parameter names
+_TRACK_ATTRIBUTES = {"Audio_Codec_List": "audio_codecs", "StreamSize_Proportion": "proportion_of_this_stream"}
+
+
+def _get_library_paths() -> list[str]:
+    """Get the candidate paths of the MediaInfo library, in order of preference.
+
+    :return: library file paths or names
+    """
+    if os.name == "nt":
+        names = ["MediaInfo.dll"]
+    elif sys.platform == "darwin":
+        names = ["libmediainfo.0.dylib", "libmediainfo.dylib"]
+    else:
+        names = ["libmediainfo.so.0"]
+    # bundled with pymediainfo's wheels, then the system's library search path
+    package_dir = os.path.dirname(pymediainfo.__file__)
+    paths = [os.path.join(package_dir, name) for name in names
+             if os.path.isfile(os.path.join(package_dir, name))]
+    paths.extend(names)
+    return paths
+
+
+def _define_prototypes(lib):
+    """Define the prototypes of the used library functions.
+
+    :param lib: ctypes library
+    """
+    lib.MediaInfo_New.argtypes = []
+    lib.MediaInfo_New.restype = ctypes.c_void_p
+    lib.MediaInfo_Delete.argtypes = [ctypes.c_void_p]
+    lib.MediaInfo_Delete.restype = None
+    lib.MediaInfo_Option.argtypes = [ctypes.c_void_p, ctypes.c_wchar_p, ctypes.c_wchar_p]
+    lib.MediaInfo_Option.restype = ctypes.c_wchar_p
+    lib.MediaInfo_Open.argtypes = [ctypes.c_void_p, ctypes.c_wchar_p]
+    lib.MediaInfo_Open.restype = ctypes.c_size_t
+    lib.MediaInfo_Close.argtypes = [ctypes.c_void_p]
+    lib.MediaInfo_Close.restype = None
+    lib.MediaInfo_Get.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_size_t,
+                                  ctypes.c_wchar_p, ctypes.c_int, ctypes.c_int]
+    lib.MediaInfo_Get.restype = ctypes.c_wchar_p
+    lib.MediaInfo_Count_Get.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_size_t]
+    lib.MediaInfo_Count_Get.restype = ctypes.c_size_t
+
+
+@lru_cache(maxsize=1)
+def _load_library():
+    """Load the MediaInfo library once.
+
+    :return: ctypes library, None if not loadable
+    """
+    lib_type = ctypes.WinDLL if os.name == "nt" else ctypes.CDLL
+    paths = _get_library_paths()
+    # the (slow) lookup of the system's library only as last resort
+    found = ctypes.util.find_library("mediainfo")
+    if found:
+        paths.append(found)
+    for path in paths:
+        try:
+            lib = lib_type(path)
+            _define_prototypes(lib)
+        except (OSError, AttributeError) as ex:
+            # not loadable, or not a MediaInfo library (missing functions)
+            logging.debug("MediaInfo library problem: %s", ex)
+            continue
+        return lib
+    logging.warning("Could not load the MediaInfo library, using pymediainfo's MediaInfo.parse()")
+    return None
+
+
+def to_number(value: str) -> int | float | None:
+    """Convert a MediaInfo field value to a number.
+
+    :param value: field value, e.g., "1002" or "1002.500"
+    :return: int or float, or None if empty or not numeric
+    """
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class MediaInfoHandle:
+    """MediaInfo library handle, to be reused for many files (one per thread!)."""
+
+    def __init__(self, parse_speed: float = 0.5):
+        """Create a new library handle.
+
+        :param parse_speed: MediaInfo's ParseSpeed option, 0 = headers only, 1 = full parse
+        """
+        self._lib = _load_library()
+        if self._lib is None:
+            raise OSError("MediaInfo library not available")
+        self._handle = self._lib.MediaInfo_New()
+        self._lib.MediaInfo_Option(self._handle, "ParseSpeed", str(parse_speed))
+        # free the library handle when this object is gone
+        self._finalizer = weakref.finalize(self, self._lib.MediaInfo_Delete, self._handle)
+
+    def open(self, filepath) -> bool:
+        """Open and parse a file, closing the previous one.
+
+        :param filepath: file path
+        :return: True if the file could be opened
+        """
+        # like MediaInfo.parse(), raises FileNotFoundError for missing files
+        os.stat(filepath)
+        self._lib.MediaInfo_Close(self._handle)
+        return self._lib.MediaInfo_Open(self._handle, os.fspath(filepath)) == 1
+
+    def get(self, parameter: str, stream_kind: int = STREAM_GENERAL, stream_number: int = 0) -> str:
+        """Get a field value of the opened file.
+
+        :param parameter: field name, e.g., "Duration"
+        :param stream_kind: stream (track) type, e.g., STREAM_GENERAL
+        :param stream_number: number of the stream of this type
+        :return: value, empty string if not available
+        """
+        return self._lib.MediaInfo_Get(self._handle, stream_kind, stream_number,
+                                       parameter, _INFO_TEXT, _INFO_NAME) or ""
+
+    def count(self, stream_kind: int) -> int:
+        """Get the number of streams (tracks) of a type.
+
+        :param stream_kind: stream (track) type, e.g., STREAM_AUDIO
+        :return: number of streams
+        """
+        # stream number -1 (as size_t) means "number of streams"
+        return self._lib.MediaInfo_Count_Get(self._handle, stream_kind, ctypes.c_size_t(-1).value)
+
+    def close(self):
+        """Close the opened file."""
+        self._lib.MediaInfo_Close(self._handle)
+
+
+class ParsedMediaInfoHandle:
+    """Fallback of MediaInfoHandle, using pymediainfo's MediaInfo.parse().
+
+    The values are the tracks' attributes, i.e., as formatted by pymediainfo.
+    """
+
+    def __init__(self, parse_speed: float = 0.5):
+        """Create a new handle.
+
+        :param parse_speed: MediaInfo's ParseSpeed option, 0 = headers only, 1 = full parse
+        """
+        self._parse_speed = parse_speed
+        self._tracks = []
+
+    def open(self, filepath) -> bool:
+        """Open and parse a file, see MediaInfoHandle.open()."""
+        # raises FileNotFoundError for missing files
+        media_info = MediaInfo.parse(filepath, parse_speed=self._parse_speed, full=True,
+                                     legacy_stream_display=False)
+        self._tracks = media_info.tracks
+        return True
+
+    def _get_tracks(self, stream_kind: int) -> list:
+        track_type = _TRACK_TYPES[stream_kind]
+        return [track for track in self._tracks if track.track_type == track_type]
+
+    def get(self, parameter: str, stream_kind: int = STREAM_GENERAL, stream_number: int = 0) -> str:
+        """Get a field value of the opened file, see MediaInfoHandle.get()."""
+        tracks = self._get_tracks(stream_kind)
+        if stream_number >= len(tracks):
+            return ""
+        # e.g., "OverallBitRate" -> "overall_bit_rate"
+        attribute = _TRACK_ATTRIBUTES.get(parameter) \
+            or re.sub(r"(?<=[a-z])(?=[A-Z])", "_", parameter).lower()
+        value = getattr(tracks[stream_number], attribute)
+        return "" if value is None else str(value)
+
+    def count(self, stream_kind: int) -> int:
+        """Get the number of streams (tracks) of a type, see MediaInfoHandle.count()."""
+        return len(self._get_tracks(stream_kind))
+
+    def close(self):
+        """Close the opened file."""
+        self._tracks = []
+
+
+_thread_local = threading.local()
+
+
+def get_thread_handle(parse_speed: float = 0.5) -> MediaInfoHandle | ParsedMediaInfoHandle:
+    """Get the current thread's library handle, created on first use.
+
+    Without a loadable MediaInfo library the handle is a ParsedMediaInfoHandle.
+
+    :param parse_speed: MediaInfo's ParseSpeed option for a new handle
+    :return: handle
+    """
+    handles = getattr(_thread_local, "handles", None)
+    if handles is None:
+        handles = _thread_local.handles = {}
+    handle = handles.get(parse_speed)
+    if handle is None:
+        handle_type = MediaInfoHandle if _load_library() is not None else ParsedMediaInfoHandle
+        handle = handles[parse_speed] = handle_type(parse_speed)
+    return handle
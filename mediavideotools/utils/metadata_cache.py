@@ -0,0 +1,134 @@
+#!python3
+# -*- coding: utf-8 -*-
+"""Persistent on-disk cache for (expensive) per-file metadata.
+
+The cache is a SQLite database, one per tool, e.g.,
+`~/.cache/mediavideotools/stats.db`. Entries are keyed by the absolute
+file path and are only valid as long as the file's modification time
+and size are unchanged.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+# commit after this many new entries (and when closing)
+COMMIT_INTERVAL = 100
+
+
+def get_default_cache_dir() -> Path:
+    """Get the default cache directory, respecting XDG_CACHE_HOME.
+
+    :return: cache directory path
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home().joinpath(".cache")
+    return Path(base, "mediavideotools")
+
+
+class MetadataCache:
+    """SQLite based cache of JSON-serializable metadata per file."""
+
+    def __init__(self, name: str, cache_dir: Path = None, read_only: bool = False):
+        """Open (or create) the cache database.
+
+        :param name: cache name, e.g., the tool name, used as database filename
+        :param cache_dir: directory for the database file (default: ~/.cache/mediavideotools)
+        :param read_only: open an existing database without writing to it, new entries
+                          are only collected (see collected), e.g., in worker processes
+        """
+        if cache_dir is None:
+            cache_dir = get_default_cache_dir()
+        self._filepath = cache_dir.joinpath(f"{name}.db")
+        self._lock = threading.Lock()
+        self._num_uncommitted = 0
+        self._read_only = read_only
+        self._collected = []
+        if read_only:
+            # never takes a write lock, i.e., no conflicts with the (single) writing process
+            self._conn = sqlite3.connect(f"{self._filepath.absolute().as_uri()}?mode=ro",
+                                         uri=True, check_same_thread=False)
+            return
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # the connection is shared by worker threads, serialized by the lock
+        self._conn = sqlite3.connect(self._filepath, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS metadata ("
+                           "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, data TEXT)")
+        self._conn.commit()
+        logging.debug("metadata cache: %s", self._filepath)
+
+    @property
+    def filepath(self) -> Path:
+        """Database file path."""
+        return self._filepath
+
+    @property
+    def collected(self) -> list[tuple[str, object, os.stat_result]]:
+        """New entries of a read-only cache, as (file path, metadata, stat result) for put()."""
+        return self._collected
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit, closing the database."""
+        self.close()
+
+    @staticmethod
+    def _key(filepath) -> str:
+        return os.path.abspath(filepath)
+
+    def get(self, filepath, stat_result: os.stat_result = None):
+        """Get the cached metadata for a file.
+
+        :param filepath: file path
+        :param stat_result: the file's stat result, if already available
+        :return: cached metadata, or None if unknown or outdated
+        """
+        if stat_result is None:
+            try:
+                stat_result = os.stat(filepath)
+            except OSError:
+                return None
+        with self._lock:
+            row = self._conn.execute("SELECT mtime_ns, size, data FROM metadata WHERE path=?",
+                                     (self._key(filepath),)).fetchone()
+        if row is None or row[0] != stat_result.st_mtime_ns or row[1] != stat_result.st_size:
+            return None
+        return json.loads(row[2])
+
+    def put(self, filepath, data, stat_result: os.stat_result = None):
+        """Store metadata for a file.
+
+        :param filepath: file path
+        :param data: JSON-serializable metadata
+        :param stat_result: the file's stat result, if already available
+        """
+        if stat_result is None:
+            try:
+                stat_result = os.stat(filepath)
+            except OSError:
+                return
+        with self._lock:
+            if self._read_only:
+                self._collected.append((self._key(filepath), data, stat_result))
+                return
+            self._conn.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)",
+                               (self._key(filepath), stat_result.st_mtime_ns, stat_result.st_size,
+                                json.dumps(data)))
+            self._num_uncommitted += 1
+            if self._num_uncommitted >= COMMIT_INTERVAL:
+                self._conn.commit()
+                self._num_uncommitted = 0
+
+    def close(self):
+        """Commit pending entries and close the database."""
+        with self._lock:
+            if not self._read_only:
+                self._conn.commit()
+            self._conn.close()
@@ -13,7 +13,11 @@ Arguments:
   basepath        Starting root path/directory for recursive scan.
 
 Options:
+  -c --cache        Use a persistent cache of the metadata,
+                    only unchanged files (modification time, size) are reused.
   -h --help         Show this screen.
+  -j --jobs=N       Number of parallel MediaInfo processes,
+                    0 means one per CPU core [default: 0].
   -v --verbose      Be more verbose.
   --version         Show version.
 """
@@ -38,11 +42,21 @@ Options:
 import logging
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
 
-import arrow
 # pylint: disable-next=redefined-builtin
 from docopt import docopt
-from pymediainfo import MediaInfo
+
+# HACK to run file both as module and Python program
+try:
+    # for running as Python program
+    from utils.file_utils import scandir_walk
+    from utils.metadata_cache import MetadataCache
+except ModuleNotFoundError:
+    # for pytest a relative import is needed
+    from .utils.file_utils import scandir_walk
+    from .utils.metadata_cache import MetadataCache
 
 __appname__ = "canon_avi_datetime_rename"
 __version__ = "1.2.3"
@@ -60,69 +74,157 @@ if sys.version_info < (3, 0):
     sys.stderr.write("Minimum required version is Python 3.x!\n")
     sys.exit(1)
 
+# number of threads for parallel directory listings (I/O bound)
+SCAN_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# "mastered date" format of Canon cameras, e.g. 'WED JAN 01 16:19:36 2014'
+CANON_DATE_FORMAT = "ddd MMM DD HH:mm:ss YYYY"
+
+
+def _find_avi_files(basepath: str) -> list[str]:
+    """Find all AVI files which are not renamed yet.
+
+    :param basepath: root directory for recursive scanning
+    :return: absolute file paths
+    """
+    filepaths = []
+    # once, not per file
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+    # bytes, i.e., only the matching names are decoded
+    for _, _, file_entries in scandir_walk(os.fsencode(basepath), max_workers=SCAN_MAX_WORKERS):
+        for entry in file_entries:
+            filename = entry.name
+            # like os.path.splitext(), leading dots are not an extension (".avi" is no AVI file)
+            if filename[-4:].lower() != b".avi" or not filename[:-4].lstrip(b"."):
+                continue
+            filepath = os.path.abspath(os.fsdecode(entry.path))
+            # simple check if already done renaming
+            if filename.endswith(b"].avi"):
+                if debug:
+                    logging.debug(
+                        "Skipping because most probably already renamed: %s", filepath)
+                continue
+            filepaths.append(filepath)
+    return filepaths
+
+
+def _stat_or_none(filepath: str) -> os.stat_result | None:
+    """Get a file's stat result.
+
+    :param filepath: file path
+    :return: stat result, None if not accessible
+    """
+    try:
+        return os.stat(filepath)
+    except OSError:
+        return None
+
+
+def _parse_one(filepath: str) -> tuple[str, str]:
+    """Get the "mastered date" metadata field of a file (run in a worker process).
+
+    :param filepath: file path
+    :return: (file path, mastered date)
+    """
+    # imported only when needed (in the worker processes), it takes a while
+    # pylint: disable-next=import-outside-toplevel
+    from pymediainfo import MediaInfo
 
-def run(basepath: str):
+    # only general track (header) metadata is needed, i.e., no need to parse the whole file
+    media_info = MediaInfo.parse(filepath, parse_speed=0.0, full=False, legacy_stream_display=False)
+    general_data = media_info.general_tracks[0]
+    return filepath, general_data.mastered_date
+
+
+def _handle_file(filepath: str, mastered_date: str, mtime: float):
+    """Check the dates of a file and print the renaming command.
+
+    :param filepath: file path
+    :param mastered_date: "mastered date" metadata field
+    :param mtime: file modification time (from stat)
+    """
+    # imported only when needed, it takes a while
+    # pylint: disable-next=import-outside-toplevel
+    import arrow
+
+    basename = os.path.splitext(os.path.basename(filepath))[0]
+
+    # local file date, like MediaInfo's "File_Modified_Date_Local" (full seconds, no timezone)
+    file_datetime = arrow.get(datetime.fromtimestamp(int(mtime)))
+
+    # creation date from camera
+    exif_datetime = None
+    try:
+        # Canon's format first, the heuristic parsing is much slower
+        exif_datetime = arrow.get(mastered_date, CANON_DATE_FORMAT)
+    except arrow.parser.ParserMatchError:
+        try:
+            exif_datetime = arrow.get(mastered_date)
+        except arrow.parser.ParserError:
+            raise ValueError(
+                f"Could not parse mastered-date field, file:'{filepath}', metadata:'{mastered_date}'") \
+                from arrow.parser.ParserError
+
+    if not exif_datetime:
+        raise RuntimeError("Invalid state! No mastered-date!")
+
+    # check that dates are almost similar
+    delta = abs(exif_datetime - file_datetime).seconds
+    if delta > 1 and delta not in (3599, 3600):
+        logging.warning(
+            "Problem with filesystem date and mastered-date! file:'%s', filesystem:%s, metadata:%s, delta:%s, seconds:%d",
+            filepath, file_datetime, exif_datetime, str(
+                exif_datetime - file_datetime), delta
+        )
+        return
+
+    filepath_new = os.path.join(
+        os.path.dirname(filepath),
+        f"{exif_datetime.format('YYYY-MM-DD_HHmmss')} [{basename}].avi"
+    )
+
+    print(f'mv "{filepath}" "{filepath_new}"')
+
+
+def run(basepath: str, max_workers: int = None, cache: MetadataCache = None):
     """Run the main job.
 
     :param basepath: root directory for recursive scanning
+    :param max_workers: number of parallel MediaInfo processes (None: one per CPU core)
+    :param cache: optional persistent cache of the metadata fields
     :return: exit/return code (for main())
     """
     if not os.path.isdir(basepath):
         raise NotADirectoryError(basepath)
-    for root, _, files in os.walk(basepath):
-        for filename in files:
-            basename, ext = os.path.splitext(filename)
-            if ext.lower() == ".avi":
-                filepath = os.path.abspath(os.path.join(root, filename))
-                logging.debug("processing: %s ...", filepath)
-
-                # simple check if already done renaming
-                if filename.endswith("].avi"):
-                    logging.debug(
-                        "Skipping because most probably already renamed: %s", filepath)
-                    continue
-
-                media_info = MediaInfo.parse(filepath)
-                general_data = media_info.general_tracks[0]
-
-                # local file date (should be equal to that from filesystem)
-                file_datetime = arrow.get(
-                    general_data.file_last_modification_date__local)
-
-                # creation date from camera
-                logging.debug(general_data.mastered_date)
-                exif_datetime = None
-                try:
-                    exif_datetime = arrow.get(general_data.mastered_date)
-                except arrow.parser.ParserError:
-                    try:
-                        # e.g. 'WED JAN 01 16:19:36 2014'
-                        exif_datetime = arrow.get(
-                            general_data.mastered_date, "ddd MMM DD HH:mm:ss YYYY")
-                    except arrow.parser.ParserMatchError:
-                        raise ValueError(
-                            f"Could not parse mastered-date field, file:'{filepath}', metadata:'{general_data.mastered_date}'") \
-                            from arrow.parser.ParserMatchError
-
-                if not exif_datetime:
-                    raise RuntimeError("Invalid state! No mastered-date!")
-
-                # check that dates are almost similar
-                delta = abs(exif_datetime - file_datetime).seconds
-                if delta > 1 and delta not in (3599, 3600):
-                    logging.warning(
-                        "Problem with filesystem date and mastered-date! file:'%s', filesystem:%s, metadata:%s, delta:%s, seconds:%d",
-                        filepath, file_datetime, exif_datetime, str(
-                            exif_datetime - file_datetime), delta
-                    )
-                    continue
-
-                filepath_new = os.path.join(
-                    os.path.dirname(filepath),
-                    f"{exif_datetime.format('YYYY-MM-DD_HHmmss')} [{basename}].avi"
-                )
-
-                print(f'mv "{filepath}" "{filepath_new}"')
+    # first find all files, stat them in parallel threads (overlapping the file
+    # system latency), then parse them in worker processes,
+    # the results (in order) are handled here in the main process
+    filepaths = _find_avi_files(basepath)
+    with ThreadPoolExecutor(max_workers=SCAN_MAX_WORKERS) as executor:
+        stat_results = dict(zip(filepaths, executor.map(_stat_or_none, filepaths)))
+    filepaths = [filepath for filepath in filepaths if stat_results[filepath] is not None]
+    cached = {}
+    if cache is not None:
+        for filepath in filepaths:
+            fields = cache.get(filepath, stat_results[filepath])
+            if fields is not None:
+                cached[filepath] = fields["mastered_date"]
+        logging.debug("cached: %d of %d files", len(cached), len(filepaths))
+    to_parse = [filepath for filepath in filepaths if filepath not in cached]
+    # once, not per file
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        parsed = executor.map(_parse_one, to_parse, chunksize=8)
+        for filepath in filepaths:
+            stat_result = stat_results[filepath]
+            if filepath in cached:
+                mastered_date = cached[filepath]
+            else:
+                _, mastered_date = next(parsed)
+                if cache is not None:
+                    cache.put(filepath, {"mastered_date": mastered_date}, stat_result)
+            if debug:
+                logging.debug("processing: %s (mastered date: %s) ...", filepath, mastered_date)
+            _handle_file(filepath, mastered_date, stat_result.st_mtime)
     return 0
 
 
@@ -135,6 +237,9 @@ def main():
     arguments = docopt(__doc__, version=version_string)
     arg_basepath = arguments["<basepath>"]
     arg_verbose = arguments["--verbose"]
+    arg_jobs = int(arguments["--jobs"])
+    arg_cache = arguments["--cache"]
+    assert arg_jobs >= 0, "number of jobs must not be negative!"
 
     # setup logging
     logging.basicConfig(level=logging.INFO if not DEBUG else logging.DEBUG,
@@ -145,7 +250,11 @@ def main():
         logging.getLogger("").setLevel(logging.DEBUG)
     logging.info(version_string)
     logging.info("base path: %s", os.path.realpath(arg_basepath))
-    return run(arg_basepath)
+    if not arg_cache:
+        return run(arg_basepath, arg_jobs or None)
+    with MetadataCache("canonavi") as cache:
+        logging.info("cache: %s", cache.filepath)
+        return run(arg_basepath, arg_jobs or None, cache)
 
 
 if __name__ == '__main__':
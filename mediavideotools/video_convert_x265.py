@@ -17,15 +17,26 @@ Arguments:
 
 Options:
   --abort-on-err  Do not continue (default) but abort after an error.
+  -c --cache      Use a persistent cache of the metadata checks,
+                  only unchanged files (modification time, size) are reused.
   -e --extra=X    Extra arguments for ffmpeg.
+  --gpu-slots=N   Maximum number of concurrent hevc_nvenc conversions [default: 3].
   -h --help       Show this screen.
   --hdr-remove    Remove HDR color mapping.
+  --hwaccel       Decode on the GPU (CUDA), i.e., keep the frames in the GPU memory.
   -k --keep       Keep encoding artifacts, even if no real size gain.
   -l --list       Just list, do not start conversion process.
   --no-color      No colored log output.
+  --no-nice       Do not lower the priority of the conversion processes.
+  --nvenc-tune=X  Tuning of the hevc_nvenc encoder: fast, balanced or quality
+                  (default: NVENC's defaults).
   -o --out=FILE   Write commands to output file or "-" for STDOUT
                   instead of calling ffmpeg directly.
   --out-overwrite Force overwrite of commands output file.
+  --parallel=N    Number of concurrent conversions [default: 1].
+  --per-job-timeout=SECS
+                  Stop a conversion after SECS seconds, 0 for no timeout
+                  (default: 4 times the video's duration).
   -q --quiet      Be more quiet.
   --reencode      Force encoding, even if already x265.
   -s --size=MB    Minimum necessary file size in MB [default: 100].
@@ -51,7 +62,9 @@ Options:
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import codecs
 import datetime
+import itertools
 import logging
 import os
 import re
@@ -64,11 +77,11 @@ import sys
 import threading
 # pylint: disable-next=redefined-builtin
 from codecs import open
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum
-from io import BytesIO
 from pathlib import Path
 from string import Template
-from time import sleep
 
 import colorlog
 import pymediainfo
@@ -78,16 +91,22 @@ from pymediainfo import MediaInfo
 # HACK to run file both as module and Python program
 try:
     # for running as Python program
-    from mkv_metadata import mkv_add_metadata_xml, mkv_produce_metadata
+    from mkv_metadata import mkv_add_metadata_xml, mkv_produce_metadata_xml
     from mime_checker import is_video
     from utils.singleton import SingleInstance
-    from utils.file_utils import get_file_size_mb
+    from utils.file_utils import get_file_size_mb, scandir_walk, drop_page_cache
+    from utils.metadata_cache import MetadataCache
+    from utils.fast_probe import probe_codec, HEVC_CODECS
+    from utils.cpu_info import get_usable_cpu_count
 except ModuleNotFoundError:
     # for pytest a relative import is needed
-    from .mkv_metadata import mkv_add_metadata_xml, mkv_produce_metadata
+    from .mkv_metadata import mkv_add_metadata_xml, mkv_produce_metadata_xml
     from .mime_checker import is_video
     from .utils.singleton import SingleInstance
-    from .utils.file_utils import get_file_size_mb
+    from .utils.file_utils import get_file_size_mb, scandir_walk, drop_page_cache
+    from .utils.metadata_cache import MetadataCache
+    from .utils.fast_probe import probe_codec, HEVC_CODECS
+    from .utils.cpu_info import get_usable_cpu_count
 
 __appname__ = "video_convert_x265"
 __version__ = "1.22.0"
@@ -103,6 +122,27 @@ __status__ = "Production"
 # e.g. 'ffmpeg -n -i "%s" -map 0 -c:v libx265 "%s"'
 # hevc_nvenc = NVIDIA NVENC hevc encoder (codec hevc). Best options are the default settings!
 CONVERT_CMD_TEMPLATE = 'ffmpeg -n -hide_banner -i "${input}" -map 0 -c:s copy -c:v hevc_nvenc ${additional} "${output}"'
+# the video conversion command with hardware (CUDA) decoding, the frames stay in the GPU memory
+CONVERT_CMD_HWACCEL = "-hwaccel cuda -hwaccel_output_format cuda"
+CONVERT_CMD_TEMPLATE_HWACCEL = CONVERT_CMD_TEMPLATE.replace(" -i ", f" {CONVERT_CMD_HWACCEL} -i ", 1)
+# hardware decoding fallback for files where CUDA decoding fails (e.g., on older GPUs)
+CONVERT_CMD_HWACCEL_FALLBACK = "-hwaccel nvdec"
+# ffmpeg's error messages of failed hardware decoding, i.e., a retry with the fallback makes sense
+HWACCEL_ERROR_RE = re.compile(rb"hwaccel initiali[sz]ation returned error|Failed setup for format cuda"
+                              rb"|doesn't support hardware accelerated|Hardware is lacking required capabilities"
+                              rb"|CUDA_ERROR_|cuvid", re.IGNORECASE)
+# marker of a failed hardware decoding attempt's files (report), set aside for the retry
+FILENAME_MARKER_HWACCEL_FAILED = ".hwaccel_failed"
+# additional command strings for tuning the hevc_nvenc encoder (--nvenc-tune),
+# "fast" is the high-throughput profile, e.g., for archival usage
+NVENC_TUNES = {
+    "fast": "-preset p1 -tune hq -rc-lookahead 0 -spatial_aq 0 -temporal_aq 0 -b_ref_mode middle",
+    "balanced": "-preset p4 -tune hq",
+    "quality": "-preset p7 -tune hq -spatial_aq 1 -temporal_aq 1",
+}
+# split frame encoding, i.e., use both NVENC engines (GPU compute capability 8.9+, Ada and newer)
+NVENC_SPLIT_ENCODE = "-split_encode_mode forced"
+NVENC_SPLIT_ENCODE_MIN_COMPUTE_CAP = 8.9
 # additional command string to remove HDR
 # https://ericswpark.com/blog/2022/2022-12-14-ffmpeg-convert-hdr-to-sdr/
 CONVERT_CMD_HDR_REMOVE = '-vf "zscale=t=linear:npl=100,format=gbrpf32le,zscale=p=bt709,tonemap=tonemap=hable:desat=0,zscale=t=bt709:m=bt709:r=tv,format=yuv420p" -pix_fmt yuv420p'
@@ -121,12 +161,28 @@ FILENAME_POSTFIX_DONE = ".x265done"
 # skipped filename extensions (tuple/list)
 FILENAME_EXTENSIONS_BLACKLIST = (
     ".rar", ".par2", ".zip", ".jpg", ".jpeg", ".nfo", ".srt", ".idx", ".sub", ".style")
+_BLACKLIST = frozenset(FILENAME_EXTENSIONS_BLACKLIST)
+# x264/h264 in filenames, to be removed
+_X264_RE = re.compile(r"[ ._-][xhH]264")
 # MKV metadata base tag name
 MKV_METADATA_BASETAGNAME = "video_convert_x265"
 # MKV metadata key name of the no-gain flag
 MKV_METADATA_X265NOGAIN = "x265_no_gain"
 # TCP port for socket listener, for stopping the main-loop
 TCP_PORT = 12345
+# maximum number of bytes read at once from the conversion process' STDERR
+STDERR_CHUNK_SIZE = 65536
+# number of bytes of the previous STDERR chunk also searched, i.e., for messages split between chunks
+STDERR_OVERLAP_SIZE = 256
+# number of threads for parallel metadata checks (I/O bound)
+PROBE_MAX_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+# conversion timeout, as factor of the video's duration (but at least TIMEOUT_MIN_SECONDS)
+TIMEOUT_DURATION_FACTOR = 4
+TIMEOUT_MIN_SECONDS = 600
+# niceness of the conversion processes (lower priority), i.e., the host stays responsive
+NICE_INCREMENT = 10
+# line separator for the report files
+_LINESEP_BYTES = os.linesep.encode()
 
 DEBUG = bool(os.environ.get("DEBUG", "").lower() in ("1", "true", "yes"))
 
@@ -134,8 +190,8 @@ if sys.version_info < (3, 9):
     sys.stderr.write("Minimum required version is Python 3.9!\n")
     sys.exit(1)
 
-# flag: keep running until this is set to False
-main_loop_running = True
+# event: keep running until this is set (e.g., by CTRL+C or TCP connection)
+main_loop_stop = threading.Event()
 
 
 class ConversionCommand:
@@ -155,6 +211,11 @@ class ConversionCommand:
         self.__convert_cmd_template = convert_cmd_template
         assert isinstance(filepath, Path)
         self.__filepath = filepath
+        # computed on first use, used multiple times per conversion
+        self.__filepath_new = None
+        self.__filepath_done = None
+        self.__command = None
+        self.__argv = None
 
     def get_filepath(self) -> Path:
         """Return the filepath, i.e., the original path and filename."""
@@ -162,15 +223,33 @@ class ConversionCommand:
 
     def get_filepath_new(self) -> Path:
         """Return the filepath for marked files, i.e., with x265-marker."""
-        filepath = _build_filename_with_marker(self.__filepath,
-                                               marker=FILENAME_MARKER_X265,
-                                               target_ext=FILENAME_EXTENSION)
-        filepath = self.eliminate_x264(filepath)
-        return filepath
+        if self.__filepath_new is None:
+            filepath = _build_filename_with_marker(self.__filepath,
+                                                   marker=FILENAME_MARKER_X265,
+                                                   target_ext=FILENAME_EXTENSION)
+            self.__filepath_new = self.eliminate_x264(filepath)
+        return self.__filepath_new
 
     def get_filepath_done(self) -> Path:
         """Return filepath for done-files."""
-        return _get_done_filename(self.__filepath)
+        if self.__filepath_done is None:
+            self.__filepath_done = _get_done_filename(self.__filepath)
+        return self.__filepath_done
+
+    def should_convert(self) -> bool:
+        """Check (again) if the file still needs a conversion, i.e., is not x265/HEVC already.
+
+        Only the container headers are checked (no MediaInfo), e.g., just before the conversion.
+
+        :return: False if all video tracks are HEVC, True otherwise (or unknown)
+        """
+        try:
+            container, info = probe_codec(self.__filepath)
+        except OSError:
+            return True
+        if not container or not info["video_codecs"]:
+            return True
+        return not all(codec in HEVC_CODECS for codec in info["video_codecs"])
 
     def get_command(self) -> str:
         """Get the final run-command string.
@@ -178,27 +257,85 @@ class ConversionCommand:
         e.g. ffmpeg -n -i "%s" -map 0 -c copy -c:v libx265 "%s_x265.mkv"
         :return: command string
         """
-        return self.__convert_cmd_template.substitute(
-            input=self.get_filepath().absolute(),
-            output=self.get_filepath_new().absolute(),
-            additional=""
-        ).strip()
+        if self.__command is None:
+            self.__command = self.__convert_cmd_template.substitute(
+                input=self.get_filepath().absolute(),
+                output=self.get_filepath_new().absolute(),
+                additional=""
+            ).strip()
+        return self.__command
+
+    def get_argv(self) -> list[str]:
+        """Get the final run-command arguments, e.g., for subprocess calls.
+
+        Unlike splitting get_command() the file paths are never (re-)parsed,
+        i.e., any character in the filenames is fine.
+
+        :return: command arguments list
+        """
+        if self.__argv is None:
+            placeholders = {
+                "${input}": str(self.get_filepath().absolute()),
+                "${output}": str(self.get_filepath_new().absolute()),
+            }
+            argv = []
+            # split the template, i.e., before the paths are substituted
+            for token in shlex.split(self.__convert_cmd_template.template):
+                if token in placeholders:
+                    argv.append(placeholders[token])
+                elif token != "${additional}":
+                    argv.append(Template(token).substitute(
+                        input=placeholders["${input}"], output=placeholders["${output}"], additional=""))
+            self.__argv = argv
+        return self.__argv
 
     @staticmethod
     def eliminate_x264(filepath: Path) -> Path:
         """Eliminate the x264/h264/etc. in the filename."""
-        return filepath.with_stem(re.sub(r"[ ._-][xhH]264", "", filepath.stem))
+        return filepath.with_stem(_X264_RE.sub("", filepath.stem))
 
 
-def __handle_args_cmdtemplate(arg_ffmpeg_extra_args: str) -> Template:
-    s = Template(CONVERT_CMD_TEMPLATE)
+def __handle_args_cmdtemplate(arg_ffmpeg_extra_args: str, hwaccel: bool = False) -> Template:
+    s = Template(CONVERT_CMD_TEMPLATE_HWACCEL if hwaccel else CONVERT_CMD_TEMPLATE)
     if arg_ffmpeg_extra_args:
         # append again, for later possibility to re-use as Template
         arg_ffmpeg_extra_args = f"{arg_ffmpeg_extra_args} ${{additional}}"
         # replace additional-placeholder
         s_new = s.safe_substitute(additional=arg_ffmpeg_extra_args)
-        return Template(s_new)
-    return s
+        s = Template(s_new)
+    return _limit_encoder_threads(s)
+
+
+def _limit_encoder_threads(convert_cmd_template: Template, cpu_count: int = None) -> Template:
+    """Limit the threads of software encoders to the (usable) physical CPU cores.
+
+    Software encoders use all logical CPUs by default, i.e., oversubscribe
+    SMT machines and CPU-limited containers. Hardware encoders are unchanged.
+
+    :param convert_cmd_template: conversion command template
+    :param cpu_count: number of usable physical CPU cores (default: detect)
+    :return: conversion command template, with thread limits
+    """
+    template = convert_cmd_template.template
+    if "libx265" in template and "-x265-params" not in template:
+        extra = f"-x265-params pools={cpu_count or get_usable_cpu_count()}"
+    elif "libx264" in template and "-threads" not in template:
+        # more than 4 threads do not help much for libx264
+        extra = f"-threads {min(4, cpu_count or get_usable_cpu_count())}"
+    else:
+        return convert_cmd_template
+    return Template(convert_cmd_template.safe_substitute(additional=f"{extra} ${{additional}}"))
+
+
+def _get_hwaccel_fallback_template(convert_cmd_template: Template) -> Template | None:
+    """Get the conversion template with the fallback hardware decoding.
+
+    :param convert_cmd_template: conversion command template
+    :return: template with fallback hardware decoding, None if not CUDA decoding
+    """
+    if CONVERT_CMD_HWACCEL not in convert_cmd_template.template:
+        return None
+    return Template(convert_cmd_template.template.replace(CONVERT_CMD_HWACCEL, CONVERT_CMD_HWACCEL_FALLBACK))
 
 
 def __handle_args_outputstream(arg_force, arg_output):
@@ -231,10 +368,6 @@ def _get_done_filename(filepath: Path):
     return filepath.with_suffix(f"{filepath.suffix}{FILENAME_POSTFIX_DONE}")
 
 
-def __check_is_blacklisted(filepath: Path):
-    return filepath.suffix in FILENAME_EXTENSIONS_BLACKLIST
-
-
 def _build_filename_with_marker(filepath: Path, marker: str, target_ext: str = None):
     if __check_has_mark(filepath, marker):
         # do nothing if already marked
@@ -246,25 +379,33 @@ def _build_filename_with_marker(filepath: Path, marker: str, target_ext: str = N
     return filepath_new
 
 
-def _socket_listener():
-    global main_loop_running
-    # keep on creating a socket server until the main-loop-running flag is false
-    while main_loop_running:
-        try:
-            with socket.create_server(("localhost", TCP_PORT)) as sock:
-                # we need a timeout for non-blocking listening
-                sock.settimeout(2)
-                while True:
-                    # accept() blocks until the timeout is reached
-                    con, addr = sock.accept()
-                    logging.info("socket connection: %s", str((con, addr)))
-                    # set the flag to stop the main loop
-                    logging.info("Flagging main loop to stop ...")
-                    main_loop_running = False
-        except socket.timeout:
-            pass  # do nothing
-        except socket.error as ex:
-            logging.exception(ex)
+def _socket_listener(sock: socket.socket):
+    with sock:
+        # accept() blocks until there is a connection, i.e., no polling
+        while not main_loop_stop.is_set():
+            try:
+                con, addr = sock.accept()
+            except OSError as ex:
+                logging.exception(ex)
+                break
+            with con:
+                if main_loop_stop.is_set():
+                    # wake-up connection by _stop_socket_listener()
+                    break
+                logging.info("socket connection: %s", str((con, addr)))
+                # set the flag to stop the main loop
+                logging.info("Flagging main loop to stop ...")
+                main_loop_stop.set()
+
+
+def _stop_socket_listener():
+    # unblock the listener's accept() by connecting to it (main_loop_stop must be set)
+    try:
+        with socket.create_connection(("localhost", TCP_PORT), timeout=1):
+            pass
+    except OSError:
+        # i.e., the listener is not running anymore
+        pass
 
 
 def check_metadata_hasdonotmarker(media_info: pymediainfo.MediaInfo) -> bool:
@@ -299,10 +440,68 @@ def check_metadata_isx265(media_info: pymediainfo.MediaInfo) -> bool:
     return True
 
 
+def _probe_metadata(filepath: Path, cache: MetadataCache = None) -> tuple[bool, bool] | None:
+    """Check the metadata of a video file, i.e., if x265 and if it has the do-not-marker.
+
+    :param filepath: video file path
+    :param cache: optional persistent cache for unchanged files
+    :return: (is x265, has do-not-marker), None if the metadata could not be parsed
+    """
+    if cache is not None:
+        cached = cache.get(filepath)
+        if cached is not None:
+            return cached["is_x265"], cached["has_donotmarker"]
+
+    # first try to read just the container's header structures (MKV, MP4)
+    try:
+        container, info = probe_codec(filepath)
+    except OSError:
+        # MediaInfo will tell
+        container = ""
+    if container and info["video_codecs"]:
+        is_x265 = all(codec in HEVC_CODECS for codec in info["video_codecs"])
+        has_donotmarker = f"{MKV_METADATA_BASETAGNAME}_{MKV_METADATA_X265NOGAIN}" in info["tag_names"]
+    else:
+        # metadata parsing using pymediainfo (libmediainfo)
+        try:
+            media_info = MediaInfo.parse(filepath.absolute())
+        except Exception as ex:
+            logging.error(
+                "Could not parse media info for '%s': %s", filepath, ex)
+            return None
+        is_x265 = check_metadata_isx265(media_info)
+        has_donotmarker = check_metadata_hasdonotmarker(media_info)
+
+    if cache is not None:
+        cache.put(filepath, {"is_x265": is_x265, "has_donotmarker": has_donotmarker})
+    return is_x265, has_donotmarker
+
+
+def _entry_name(entry: os.DirEntry) -> str:
+    return entry.name
+
+
+def _scan(rootdir: Path) -> Iterator[os.DirEntry]:
+    """Recursively scan a directory, sorted by name (like os.walk with sorting).
+
+    The DirEntry objects carry the file type and cache the stat result,
+    i.e., each file is stat'ed at most once.
+
+    :param rootdir: root directory where to start the recursive scan
+    :return: generator of non-directory entries
+    """
+    for _, dir_entries, file_entries in scandir_walk(os.fspath(rootdir)):
+        dir_entries.sort(key=_entry_name)
+        file_entries.sort(key=_entry_name)
+        yield from file_entries
+
+
 def find_candidates(rootdir: Path,
                     min_file_size_mb: float,
                     forceencode: bool = False,
                     skip_mime: bool = False,
+                    cache: MetadataCache = None,
+                    file_sizes: dict[Path, int] = None,
                     ) -> list[Path]:
     """Find video files candidates.
 
@@ -310,83 +509,102 @@ def find_candidates(rootdir: Path,
     :param min_file_size_mb: minimum file size in MB for actually considering candidates
     :param forceencode: force encoding even if a file has a done-marker
     :param skip_mime: skip MIME type checking when looking for candidates
+    :param cache: optional persistent cache of the metadata checks
+    :param file_sizes: optional dictionary, to be filled with the candidates' file sizes (bytes)
     :return: list of Path objects
     """
-    result = []
-    for root, dirs, files in os.walk(rootdir):
-        dirs.sort()
-        files.sort()
-
-        for filename in files:
-            filepath = Path(root, filename)
-            logging.debug("filepath: %s", filepath)
-
-            if __check_is_blacklisted(filepath):
-                # i.e., not a video file (considering the file's extension)
-                logging.debug(
-                    "Skipping extension-blacklisted (FILENAME_EXTENSIONS_BLACKLIST): %s", filename)
+    # first pass: the cheap checks
+    preliminary = []
+    # local names for the (hot) loop
+    is_blacklisted = _BLACKLIST.__contains__
+    marker_x265 = FILENAME_MARKER_X265
+    splitext = os.path.splitext
+    for entry in _scan(rootdir):
+        filename = entry.name
+        extension = splitext(filename)[1]
+        # string-level checks first, i.e., before creating a Path object
+        if is_blacklisted(extension):
+            # i.e., not a video file (considering the file's extension)
+            logging.debug(
+                "Skipping extension-blacklisted (FILENAME_EXTENSIONS_BLACKLIST): %s", filename)
+            continue
+
+        if marker_x265 in filename:
+            # e.g., "_x265" in filename
+            logging.debug("Marker '%s' (FILENAME_MARKER_X265) is in filename: %s",
+                          marker_x265, filename)
+            continue
+
+        filepath = Path(entry.path)
+        logging.debug("filepath: %s", filepath)
+
+        if __check_is_donefile(filepath):
+            # e.g., ".x265done" in filename suffix
+            logging.debug(
+                "Already done (FILENAME_POSTFIX_DONE): %s", filename)
+            continue
+
+        # check if video file size is actually relevant for re-encoding,
+        # the DirEntry's (cached) stat result, i.e., no extra stat() call
+        try:
+            file_size = entry.stat().st_size
+        except OSError as ex:
+            if not entry.is_symlink():
+                # (broken symlinks are expected, no need for details)
+                logging.exception(ex)
+            logging.error("Problem getting file size for: %s", filepath)
+            continue
+        file_mb = round(file_size / 1024.0 / 1024.0, 2)
+        logging.debug("file_mb: %.02f", file_mb)
+        if file_mb < min_file_size_mb:
+            logging.info("File is too small (%.02f MB): %s ",
+                         file_mb, filename)
+            continue
+
+        # MIME type check, skip non-video files
+        # (is_video() checks the signature of well-known containers first, before libmagic)
+        if not skip_mime:
+            try:
+                if not is_video(filepath):
+                    logging.debug(
+                        "MIME type check: not a video file: %s", filepath.name)
+                    continue
+            except Exception as ex:
+                # this could happen on MS Windows and when there are
+                # Unicode characters in the filename
+                logging.exception(
+                    "Problem with MIME type check: %s" % ex, exc_info=False)
                 continue
 
-            if __check_has_mark(filepath, marker=FILENAME_MARKER_X265):
-                # e.g., "_x265" in filename
-                logging.debug("Marker '%s' (FILENAME_MARKER_X265) is in filename: %s",
-                              FILENAME_MARKER_X265, filename)
-                continue
+        if forceencode:
+            logging.info(
+                "Because of override switch consider it nevertheless: %s", filepath)
+        preliminary.append(filepath)
+        if file_sizes is not None:
+            file_sizes[filepath] = file_size
 
-            if __check_is_donefile(filepath):
-                # e.g., ".x265done" in filename suffix
-                logging.debug(
-                    "Already done (FILENAME_POSTFIX_DONE): %s", filename)
-                continue
+    if forceencode:
+        return preliminary
 
-            # check if video file size is actually relevant for re-encoding
-            file_mb = get_file_size_mb(filepath)
-            logging.debug("file_mb: %.02f", file_mb)
-            if file_mb < 0:
-                logging.error("Problem getting file size for: %s", filepath)
-                continue
-            if file_mb < min_file_size_mb:
-                logging.info("File is too small (%.02f MB): %s ",
-                             file_mb, filename)
+    # second pass: the (expensive, I/O bound) metadata checks in parallel threads
+    result = []
+    with ThreadPoolExecutor(max_workers=PROBE_MAX_WORKERS) as executor:
+        metadatas = executor.map(_probe_metadata, preliminary, itertools.repeat(cache))
+        for filepath, metadata in zip(preliminary, metadatas):
+            if metadata is None:
                 continue
+            is_x265, has_donotmarker = metadata
 
-            # MIME type check, skip non-video files
-            if not skip_mime:
-                try:
-                    if not is_video(filepath):
-                        logging.debug(
-                            "MIME type check: not a video file: %s", filepath.name)
-                        continue
-                except Exception as ex:
-                    # this could happen on MS Windows and when there are
-                    # Unicode characters in the filename
-                    logging.exception(
-                        "Problem with MIME type check: %s" % ex, exc_info=False)
-                    continue
-
-            if forceencode:
+            if is_x265:
                 logging.info(
-                    "Because of override switch consider it nevertheless: %s", filepath)
-                result.append(filepath)
-            else:
-                # metadata parsing using pymediainfo (libmediainfo)
-                try:
-                    media_info = MediaInfo.parse(filepath.absolute())
-                except Exception as ex:
-                    logging.error(
-                        "Could not parse media info for '%s': %s", filepath, ex)
-                    continue
-
-                if check_metadata_isx265(media_info):
-                    logging.info(
-                        "Based on metadata, already x265: %s", filename)
-                    continue
-                if check_metadata_hasdonotmarker(media_info):
-                    logging.info("Marked as do-not: %s", filename)
-                    continue
+                    "Based on metadata, already x265: %s", filepath.name)
+                continue
+            if has_donotmarker:
+                logging.info("Marked as do-not: %s", filepath.name)
+                continue
 
-                # this is a candidate
-                result.append(filepath)
+            # this is a candidate
+            result.append(filepath)
 
     return result
 
@@ -394,68 +612,165 @@ def find_candidates(rootdir: Path,
 class ConversionProcessResult(IntEnum):
     """Return code for run_conversion_process(...)."""
 
+    HWACCEL_FAILED = -5
+    TIMED_OUT = -4
     ORIGINAL_MISSING = -3
     NOT_SMALLER = -2
     NON_ZERO = -1
     OK = 0
 
 
+def _stop_process(proc: subprocess.Popen, timed_out: threading.Event):
+    """Stop a (stalled) process, first friendly, then forcefully.
+
+    :param proc: the process
+    :param timed_out: event to be set, i.e., flagging the timeout
+    """
+    timed_out.set()
+    logging.warning("Timeout! Terminating process %d ...", proc.pid)
+    proc.terminate()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        logging.warning("Killing process %d ...", proc.pid)
+        proc.kill()
+
+
+def _lower_priority(pid: int):
+    """Lower the CPU (and thereby I/O) scheduling priority of a process.
+
+    :param pid: process id
+    """
+    if not hasattr(os, "setpriority"):
+        # i.e., MS Windows, handled by the process creation flags
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, pid) + NICE_INCREMENT)
+        if hasattr(os, "SCHED_BATCH"):
+            # Linux, CPU-intensive non-interactive process
+            os.sched_setscheduler(pid, os.SCHED_BATCH, os.sched_param(0))
+    except OSError as ex:
+        logging.warning("Could not lower the process priority: %s", ex)
+
+
+def estimate_timeout(filepath: Path) -> float | None:
+    """Estimate a conversion timeout based on the video's duration.
+
+    :param filepath: video file path
+    :return: timeout in seconds, None if unknown duration
+    """
+    try:
+        media_info = MediaInfo.parse(filepath, parse_speed=0.0)
+        duration_seconds = float(media_info.general_tracks[0].duration or 0) / 1000
+    except (OSError, RuntimeError, IndexError, ValueError) as ex:
+        logging.debug("No duration for '%s': %s", filepath, ex)
+        return None
+    if not duration_seconds:
+        return None
+    return max(TIMEOUT_MIN_SECONDS, TIMEOUT_DURATION_FACTOR * duration_seconds)
+
+
 def run_conversion_process(cmd: ConversionCommand,
                            keep: bool = False,
-                           create_report: bool = True):
+                           create_report: bool = True,
+                           live_output: bool = True,
+                           reencode: bool = False,
+                           timeout: float = None,
+                           nice: bool = False):
     """Run the actual external conversion tool.
 
     :param cmd: the ConversionCommand dataclass
     :param keep: keep conversion artifacts
     :param create_report: if to create a report logfile
+    :param live_output: print the tool's output to STDERR
+    :param reencode: force re-encoding even if already x265
+    :param timeout: seconds after which the tool is stopped (None: no timeout)
+    :param nice: run the tool with lower priority
     :return: 0 if all good, >0 otherwise
     """
+    if not reencode and not cmd.should_convert():
+        # e.g., multiple video tracks or changed since the candidates search
+        logging.info("Already x265, skipping: %s", cmd.get_filepath())
+        return ConversionProcessResult.OK
+
     cmd_str = cmd.get_command()
 
     # running...
     t_start = datetime.datetime.now()
     logging.info("running command (at %s): %s", t_start, cmd_str)
-    stderr = BytesIO()
+    # written on the fly, i.e., the output is not collected in memory
+    report_file = _ReportFile(cmd.get_filepath_new().with_suffix(".log"), cmd_str) \
+        if create_report else None
     proc = None
+    watchdog = None
+    timed_out = threading.Event()
+    hwaccel_error = False
     try:
         if DEBUG:
             logging.warning("****DEBUG*** not actually running '%s'", cmd_str)
         else:
 
             # run the external conversion program
-            proc = subprocess.Popen(shlex.split(
-                cmd_str), stderr=subprocess.PIPE)
-
-            # live output and collecting until nothing more is produced
+            # unbuffered, i.e., read() returns whatever is available
+            # (only) on MS Windows the priority is set by the creation flags
+            creationflags = subprocess.BELOW_NORMAL_PRIORITY_CLASS if nice and os.name == "nt" else 0
+            proc = subprocess.Popen(cmd.get_argv(), stderr=subprocess.PIPE, bufsize=0,
+                                    creationflags=creationflags)
+            if nice:
+                _lower_priority(proc.pid)
+            if timeout:
+                # e.g., a stalled hardware decoder, the reading below would block forever
+                watchdog = threading.Timer(timeout, _stop_process, args=(proc, timed_out))
+                watchdog.daemon = True
+                watchdog.start()
+
+            # incremental, i.e., multibyte characters split between chunks are fine
+            decoder = codecs.getincrementaldecoder("utf8")(errors="replace")
+            stderr_tail = b""
+            # live output and reporting until nothing more is produced
             while proc.stderr and proc.stderr.readable():
-                # only read 1 byte/character (not readline()!)
+                # read chunks of what is available (not readline()!)
                 # NOTE: readline() does not work for ffmpeg because "frame=..."
                 # status message does not end with a newline
                 # readline() does not work with later filtering
-                c = proc.stderr.read(1)
-                if not c:
+                chunk = proc.stderr.read(STDERR_CHUNK_SIZE)
+                if not chunk:
                     break
                 # print to STDERR (console)
-                sys.stderr.write(c.decode(encoding="utf8", errors="replace"))
+                if live_output:
+                    sys.stderr.write(decoder.decode(chunk))
                 # store/record for logfile
-                stderr.write(c)
+                if report_file is not None:
+                    report_file.write(chunk)
+                if not hwaccel_error:
+                    hwaccel_error = HWACCEL_ERROR_RE.search(stderr_tail + chunk) is not None
+                    stderr_tail = chunk[-STDERR_OVERLAP_SIZE:]
 
             # set proc.returncode
             proc.wait()
+            # the source file was read once, do not let it evict other cached data
+            drop_page_cache(cmd.get_filepath())
     except OSError as ex:
         logging.exception(ex)
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
 
     t_stop = datetime.datetime.now()
     t_duration = t_stop - t_start
     logging.info("done (at %s), duration: %s", t_stop, t_duration)
 
-    if create_report:
-        report_filepath = cmd.get_filepath_new().with_suffix(".log")
-        _create_report_file(report_filepath, cmd_str, stderr.getvalue())
+    if report_file is not None:
+        report_file.close()
 
     # post-process checking
     if proc is None or proc.returncode != 0:
-        if proc:
+        if timed_out.is_set():
+            logging.error("PROBLEM running converter! Timed out after %d seconds.", timeout)
+        elif proc and hwaccel_error:
+            logging.error(
+                "PROBLEM running converter! Hardware decoding failed, return code: %s", proc.returncode)
+        elif proc:
             logging.error(
                 "PROBLEM running converter! return code: %s", proc.returncode)
         else:
@@ -472,6 +787,10 @@ def run_conversion_process(cmd: ConversionCommand,
                     "Problem removing left-over artifact!", exc_info=ex)
 
         # stop right here
+        if timed_out.is_set():
+            return ConversionProcessResult.TIMED_OUT
+        if hwaccel_error:
+            return ConversionProcessResult.HWACCEL_FAILED
         return ConversionProcessResult.NON_ZERO
 
     file_mb = get_file_size_mb(cmd.get_filepath())
@@ -518,15 +837,17 @@ def run_conversion_process(cmd: ConversionCommand,
             # only the template without the actual paths (privacy concerns...)
             "ENCODER_SETTINGS": CONVERT_CMD_TEMPLATE,
         }
-        metadata_xml = mkv_produce_metadata(
+        metadata_xml = mkv_produce_metadata_xml(
             meta_standard=meta_standard, meta_custom=meta_custom)
         mkv_add_metadata_xml(cmd.get_filepath_new(), metadata_xml)
+        drop_page_cache(cmd.get_filepath_new())
 
     # only pause for cooldown if there is a relevant file size and job duration
     # (do not wait/halt for small files, no cool down needed there)
     if file_mb > 100 and t_duration.total_seconds() > COOLDOWN_AFTER_SECONDS:
         logging.info("waiting %d sec to cool down ...", COOLDOWN_SECONDS)
-        sleep(COOLDOWN_SECONDS)
+        # returns early if stopping
+        main_loop_stop.wait(COOLDOWN_SECONDS)
         logging.debug("cool down done.")
     else:
         logging.debug("No cooldown because file or job duration too small.")
@@ -534,11 +855,24 @@ def run_conversion_process(cmd: ConversionCommand,
     return ConversionProcessResult.OK
 
 
+def _set_aside_failed_attempt(cmd: ConversionCommand):
+    """Rename a failed attempt's report (and kept artifact), i.e., not overwritten by the retry.
+
+    :param cmd: the failed attempt's ConversionCommand
+    """
+    filepath_new = cmd.get_filepath_new()
+    for filepath in (filepath_new.with_suffix(".log"), filepath_new):
+        if filepath.exists():
+            target = filepath.with_name(f"{filepath.stem}{FILENAME_MARKER_HWACCEL_FAILED}{filepath.suffix}")
+            logging.info("Keeping the failed attempt's file as: %s", target)
+            os.replace(filepath, target)
+
+
 def _add_metadata_nogain(cmd: ConversionCommand, meta_custom: dict[str, object]):
     # add metadata (marking) to tell about this futile conversion endeavour
     logging.info("marking original file (add metadata) ...")
     meta_custom[MKV_METADATA_X265NOGAIN] = True
-    metadata_xml = mkv_produce_metadata(
+    metadata_xml = mkv_produce_metadata_xml(
         meta_standard={}, meta_custom=meta_custom)
     mkv_add_metadata_xml(cmd.get_filepath(), metadata_xml, keep_times=True)
     # rename original file to indicate that future conversion is futile
@@ -549,20 +883,69 @@ def _add_metadata_nogain(cmd: ConversionCommand, meta_custom: dict[str, object])
     os.rename(cmd.get_filepath(), filepath_donemarked)
 
 
+class _ReportFile:
+    """Report logfile alongside the media file, written while the conversion process runs."""
+
+    def __init__(self, report_filepath: Path, cmd_str: str):
+        """Create the report file.
+
+        :param report_filepath: report logfile path
+        :param cmd_str: conversion command string, for the header
+        """
+        self.__report_filepath = report_filepath
+        # incomplete last line of the previous data
+        self.__rest = b""
+        logging.debug("report_file: %s", report_filepath.resolve())
+        try:
+            # pylint: disable-next=consider-using-with
+            self.__fout = Path(report_filepath).open("wb")
+            self.__fout.write(f"cmd_str: {cmd_str}\n\n".encode())
+        except OSError as ex:
+            self.__handle_error(ex)
+
+    def __handle_error(self, ex: OSError):
+        logging.exception("Problem storing ffmpeg output to logfile '%s'!" %
+                          self.__report_filepath.resolve(), exc_info=ex)
+        self.__fout = None
+
+    def __write_lines(self, lines: list[bytes]):
+        # without the (many) progress status lines
+        data = b"".join(line.rstrip(b"\r\n") + _LINESEP_BYTES
+                        for line in lines if not line.startswith(b"frame="))
+        if data and self.__fout is not None:
+            try:
+                self.__fout.write(data)
+            except OSError as ex:
+                self.__handle_error(ex)
+
+    def write(self, data: bytes):
+        """Write (filtered) output of the conversion process, complete lines only.
+
+        :param data: output chunk, lines may be split between chunks
+        """
+        lines = (self.__rest + data).splitlines(keepends=True)
+        # a trailing CR could be the first half of a CRLF
+        self.__rest = lines.pop() if lines and not lines[-1].endswith(b"\n") else b""
+        self.__write_lines(lines)
+
+    def close(self):
+        """Write the rest and close the file."""
+        if self.__rest:
+            self.__write_lines([self.__rest])
+            self.__rest = b""
+        if self.__fout is not None:
+            try:
+                self.__fout.close()
+            except OSError as ex:
+                self.__handle_error(ex)
+            self.__fout = None
+
+
 def _create_report_file(report_filepath: Path, cmd_str: str, data: bytes):
     # store into logfile alongside the media file
-    logging.debug("report_file: %s", report_filepath.resolve())
-    try:
-        with Path(report_filepath).open("wb") as fout:
-            fout.write(f"cmd_str: {cmd_str}\n".encode())
-            fout.write(b"\n")
-            for line in data.splitlines():
-                if not line.startswith(b"frame="):
-                    fout.write(line)
-                    fout.write(os.linesep.encode())
-    except OSError as ex:
-        logging.exception("Problem storing ffmpeg output to logfile '%s'!" %
-                          report_filepath.resolve(), exc_info=ex)
+    report_file = _ReportFile(report_filepath, cmd_str)
+    report_file.write(data)
+    report_file.close()
 
 
 def run(rootdir: Path,
@@ -575,7 +958,12 @@ def run(rootdir: Path,
         reencode: bool = False,
         skip_mime: bool = False,
         create_report: bool = True,
-        signalling: bool = True):
+        signalling: bool = True,
+        cache: MetadataCache = None,
+        parallel: int = 1,
+        gpu_slots: int = 3,
+        timeout: float = None,
+        nice: bool = False):
     """Run the main job.
 
     :param rootdir: root directory where to start the recursive scan
@@ -588,10 +976,14 @@ def run(rootdir: Path,
     :param reencode: force re-encoding even if already x265
     :param skip_mime: skip MIME type checking when looking for candidates
     :param create_report: create report file (FILENAME.log)
+    :param signalling: stop by CTRL+C or TCP connection
+    :param cache: optional persistent cache of the metadata checks
+    :param parallel: number of concurrent conversion processes
+    :param gpu_slots: maximum number of concurrent hevc_nvenc conversion processes
+    :param timeout: seconds after which a conversion is stopped (None: based on the duration, 0: no timeout)
+    :param nice: run the conversion processes with lower priority
     :return: exit/return code (int, for main())
     """
-    global main_loop_running
-
     if not rootdir.is_dir():
         raise NotADirectoryError(rootdir)
     if just_list:
@@ -599,10 +991,13 @@ def run(rootdir: Path,
 
     # collect list of file candidates
     logging.info("Recursively finding file conversion candidates...")
+    file_sizes = {}
     candidates = find_candidates(rootdir,
                                  min_file_size_mb=min_file_size_mb,
                                  forceencode=reencode,
-                                 skip_mime=skip_mime)
+                                 skip_mime=skip_mime,
+                                 cache=cache,
+                                 file_sizes=file_sizes)
     logging.info("Found #%d conversion candidates.", len(candidates))
 
     if not candidates:
@@ -631,42 +1026,84 @@ def run(rootdir: Path,
     # output_stream is None => run conversion command
     ##
 
+    # (again) running, e.g., after a previous run()
+    main_loop_stop.clear()
+
     if signalling:
         # signal listening/handler for CTRL+C
         def ctrl_c_handler(signalnum, frame):
-            global main_loop_running
             logging.info("SIGINT/CTRL+C event! Flagging main loop to stop ...")
-            main_loop_running = False
+            main_loop_stop.set()
 
         # allow the processing to be stopped by CTRL+C or by a simple socket/TCP connection
         signal.signal(signal.SIGINT, ctrl_c_handler)  # CTRL+C
 
         # start a TCP listener (for stop-signalling) in an extra thread
-        socket_thread = threading.Thread(target=_socket_listener)
-        socket_thread.start()
-
-    return_code = 0
-    for i, cmd in enumerate(conversion_commands):
-        if not main_loop_running:
-            logging.info("main_loop_running is set to false! stopping ...")
-            # this could happen if
-            # - socket connection
-            # - CTRL+C
-            break
+        socket_thread = None
+        try:
+            sock = socket.create_server(("localhost", TCP_PORT))
+        except OSError as ex:
+            # i.e., address already in use
+            logging.exception(ex)
+        else:
+            socket_thread = threading.Thread(target=_socket_listener, args=(sock,))
+            socket_thread.start()
+
+    if parallel > 1 and "hevc_nvenc" in convert_cmd_template.template and parallel > gpu_slots:
+        # the number of concurrent NVENC sessions is limited (by the GPU/driver)
+        logging.info("Limiting parallel conversions to %d (GPU sessions).", gpu_slots)
+        parallel = gpu_slots
+    if parallel > 1:
+        # largest first, i.e., no long conversion at the end when the other workers are idle
+        conversion_commands.sort(key=lambda cmd: file_sizes.get(cmd.get_filepath(), 0), reverse=True)
+    hwaccel_fallback_template = _get_hwaccel_fallback_template(convert_cmd_template)
+    # flag: stop starting new conversions because of an error
+    aborting = threading.Event()
+
+    def convert(i: int, cmd: ConversionCommand) -> int | None:
+        if main_loop_stop.is_set() or aborting.is_set():
+            return None
         logging.info("%d/%d process ...", i + 1, len(conversion_commands))
-        return_code += run_conversion_process(cmd,
-                                              keep=keep, create_report=create_report)
-        logging.debug("run.return_code: %d", return_code)
-
-        if return_code < 0 and abortonerrror:
+        job_timeout = (timeout if timeout is not None else estimate_timeout(cmd.get_filepath())) or None
+        # live output of parallel processes would be an unreadable mix
+        result = run_conversion_process(cmd, keep=keep, create_report=create_report,
+                                        live_output=parallel == 1, reencode=reencode,
+                                        timeout=job_timeout, nice=nice)
+        if result == ConversionProcessResult.HWACCEL_FAILED and hwaccel_fallback_template is not None:
+            # hardware decoding failed, e.g., unsupported codec variant
+            logging.warning("Retrying with '%s' ...", CONVERT_CMD_HWACCEL_FALLBACK)
+            _set_aside_failed_attempt(cmd)
+            cmd = ConversionCommand(hwaccel_fallback_template, cmd.get_filepath())
+            result = run_conversion_process(cmd, keep=keep, create_report=create_report,
+                                            live_output=parallel == 1, reencode=reencode,
+                                            timeout=job_timeout, nice=nice)
+        if result < 0 and abortonerrror:
             logging.info("Aborting...")
-            break
-        # else, output cosmetics (logging is on stderr)
-        sys.stderr.write(("-" * 80 + "\n") * 2 + "\n" * 2)
+            aborting.set()
+        return result
+
+    return_code = 0
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        # results in order, the conversions are started as workers become free
+        for result in executor.map(convert, itertools.count(), conversion_commands):
+            if result is None:
+                if not aborting.is_set():
+                    logging.info("main_loop_stop is set! stopping ...")
+                    # this could happen if
+                    # - socket connection
+                    # - CTRL+C
+                # the remaining ones are not started
+                break
+            return_code += result
+            logging.debug("run.return_code: %d", return_code)
+            # output cosmetics (logging is on stderr)
+            sys.stderr.write(("-" * 80 + "\n") * 2 + "\n" * 2)
 
     if signalling:
-        main_loop_running = False
-        socket_thread.join(timeout=1)
+        main_loop_stop.set()
+        if socket_thread is not None:
+            _stop_socket_listener()
+            socket_thread.join(timeout=1)
 
     # return the accumulated exit codes (should be 0 if everything went correct)
     return return_code
@@ -696,6 +1133,51 @@ def check_prerequisites():
     return True
 
 
+def check_hwaccel(hwaccel: str = "cuda") -> bool:
+    """Check if ffmpeg supports a hardware acceleration method.
+
+    :param hwaccel: hardware acceleration method, e.g., "cuda"
+    :return: True if supported
+    """
+    exe = shlex.split(CONVERT_CMD_TEMPLATE)[0]
+    try:
+        output = subprocess.run([exe, "-hide_banner", "-hwaccels"], capture_output=True,
+                                check=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError) as ex:
+        logging.exception(ex)
+        return False
+    # first line is a header "Hardware acceleration methods:"
+    return hwaccel in output.split()[1:]
+
+
+def get_gpu_compute_capability() -> float | None:
+    """Get the (NVIDIA) GPU's compute capability, e.g., 8.9 for Ada.
+
+    :return: compute capability of the first GPU, None if unknown
+    """
+    try:
+        output = subprocess.run(["nvidia-smi", "--query-gpu=compute_cap", "--format=csv,noheader"],
+                                capture_output=True, check=True, text=True).stdout
+        return float(output.split()[0])
+    except (OSError, subprocess.CalledProcessError, ValueError, IndexError) as ex:
+        logging.debug("No GPU compute capability: %s", ex)
+        return None
+
+
+def _get_nvenc_tune_args(tune: str, compute_capability: float | None) -> str:
+    """Get the additional ffmpeg arguments for a hevc_nvenc tuning.
+
+    :param tune: tuning name, key of NVENC_TUNES
+    :param compute_capability: GPU compute capability, None if unknown
+    :return: additional command string
+    """
+    args = NVENC_TUNES[tune]
+    if tune == "fast" and compute_capability is not None \
+            and compute_capability >= NVENC_SPLIT_ENCODE_MIN_COMPUTE_CAP:
+        args = f"{args} {NVENC_SPLIT_ENCODE}"
+    return args
+
+
 def main():
     """Run the main program.
 
@@ -723,8 +1205,15 @@ def main():
     arg_keep = arguments["--keep"]
     arg_reencode = arguments["--reencode"]
     arg_hdr_remove = arguments["--hdr-remove"]
+    arg_hwaccel = arguments["--hwaccel"]
+    arg_nvenc_tune = arguments["--nvenc-tune"]
     arg_ffmpeg_extra_args = arguments["--extra"]
     arg_abortonerrror = arguments["--abort-on-err"]
+    arg_cache = arguments["--cache"]
+    arg_parallel = int(arguments["--parallel"])
+    arg_gpu_slots = int(arguments["--gpu-slots"])
+    arg_nice = not arguments["--no-nice"]
+    arg_timeout = float(arguments["--per-job-timeout"]) if arguments["--per-job-timeout"] is not None else None
 
     # setup logging
     handler = colorlog.StreamHandler(stream=sys.stderr)
@@ -746,11 +1235,27 @@ def main():
     logging.info("root directory: %s", root.absolute())
     logging.info("min file size: %d MB", arg_min_file_size_mb)
 
+    if arg_nvenc_tune:
+        assert arg_nvenc_tune in NVENC_TUNES, f"--nvenc-tune must be one of: {', '.join(NVENC_TUNES)}"
+        nvenc_tune_args = _get_nvenc_tune_args(arg_nvenc_tune, get_gpu_compute_capability())
+        # before the extra arguments, i.e., these can override
+        arg_ffmpeg_extra_args = "%s %s" % (nvenc_tune_args, arg_ffmpeg_extra_args) \
+            if arg_ffmpeg_extra_args else nvenc_tune_args
+
     if arg_hdr_remove:
         arg_ffmpeg_extra_args = "%s %s" % (arg_ffmpeg_extra_args, CONVERT_CMD_HDR_REMOVE) \
             if arg_ffmpeg_extra_args else CONVERT_CMD_HDR_REMOVE
 
-    convert_cmd_template = __handle_args_cmdtemplate(arg_ffmpeg_extra_args)
+    if arg_hwaccel:
+        if arg_hdr_remove:
+            # the zscale filters need the frames in the CPU memory
+            logging.warning("No hardware decoding because of HDR removal.")
+            arg_hwaccel = False
+        elif not check_hwaccel("cuda"):
+            logging.warning("No CUDA hardware decoding available, using software decoding.")
+            arg_hwaccel = False
+
+    convert_cmd_template = __handle_args_cmdtemplate(arg_ffmpeg_extra_args, arg_hwaccel)
     logging.info("conversion command template: %s", convert_cmd_template)
 
     output_stream = __handle_args_outputstream(
@@ -759,20 +1264,35 @@ def main():
 
     assert not (arg_just_list and output_stream is None), "--list needs --out!"
     assert arg_min_file_size_mb >= 0
+    assert arg_parallel >= 1, "number of parallel conversions must be at least 1!"
+    assert arg_gpu_slots >= 1, "number of GPU slots must be at least 1!"
+    assert arg_timeout is None or arg_timeout >= 0, "timeout must not be negative!"
 
     if not check_prerequisites():
         logging.fatal("Preqrequisites failure!")
         return -9
 
-    exit_code = run(root,
-                    convert_cmd_template,
-                    arg_min_file_size_mb,
-                    output_stream,
-                    arg_just_list,
-                    arg_keep,
-                    arg_abortonerrror,
-                    arg_reencode,
-                    arg_skip_mime)
+    cache = MetadataCache("convert_x265") if arg_cache else None
+    if cache is not None:
+        logging.info("cache: %s", cache.filepath)
+    try:
+        exit_code = run(root,
+                        convert_cmd_template,
+                        arg_min_file_size_mb,
+                        output_stream,
+                        arg_just_list,
+                        arg_keep,
+                        arg_abortonerrror,
+                        arg_reencode,
+                        arg_skip_mime,
+                        cache=cache,
+                        parallel=arg_parallel,
+                        gpu_slots=arg_gpu_slots,
+                        timeout=arg_timeout,
+                        nice=arg_nice)
+    finally:
+        if cache is not None:
+            cache.close()
     logging.debug("exit_code: %d", exit_code)
     return exit_code
 
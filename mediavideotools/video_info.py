@@ -17,7 +17,11 @@ Arguments:
   directory         Starting root directory for recursive scan.
 
 Options:
+  -c --cache        Use a persistent cache of the metadata,
+                    only unchanged files (modification time, size) are reused.
   -h --help         Show this screen.
+  -j --jobs=N       Number of parallel MediaInfo threads,
+                    0 means automatic [default: 0].
   --no-color        No colored log output.
   -o --out=FILE     Write to output file, could also be "-" for STDOUT.
   -v --verbose      Be more verbose.
@@ -46,19 +50,26 @@ import os
 import sys
 # pylint: disable-next=redefined-builtin
 from codecs import open
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import colorlog
 from docopt import docopt
-from pymediainfo import MediaInfo
 
 # HACK to run file both as module and Python program
 try:
     # for running as Python program
     from mime_checker import is_video
+    from utils.metadata_cache import MetadataCache
+    from utils.file_utils import scandir_walk
+    from utils.mediainfo_handle import get_thread_handle, STREAM_GENERAL, STREAM_VIDEO
 except ModuleNotFoundError:
     # for pytest a relative import is needed
     from .mime_checker import is_video
+    from .utils.metadata_cache import MetadataCache
+    from .utils.file_utils import scandir_walk
+    from .utils.mediainfo_handle import get_thread_handle, STREAM_GENERAL, STREAM_VIDEO
 
 
 __version__ = "1.4.3"
@@ -71,6 +82,13 @@ __status__ = "Production"
 
 # CSV delimiter
 DELIMITER = ";"
+# number of threads for parallel metadata reads, the MediaInfo library and libmagic
+# release the GIL, i.e., I/O waits and parsing overlap (I/O bound)
+SCAN_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# CSV rows are written in chunks of (at least) this many characters
+OUTPUT_CHUNK_SIZE = 65536
+# buffer size of the output file
+OUTPUT_BUFFER_SIZE = 1 << 20
 
 # MediaInfo fields to output
 FIELDS_OF_INTEREST = (
@@ -90,6 +108,25 @@ FIELDS_OF_INTEREST = (
     ("Video", "pixel_aspect_ratio"),
     ("Video", "proportion_of_this_stream")
 )
+# MediaInfo library parameter names of the fields of interest
+# (NOTE: "video_codecs" has never been filled by pymediainfo, "Codecs_Video" is empty as well)
+MEDIAINFO_PARAMETERS = {
+    "file_size": "FileSize",
+    "format": "Format",
+    "duration": "Duration",
+    "video_codecs": "Codecs_Video",
+    "audio_codecs": "Audio_Codec_List",
+    "audio_language_list": "Audio_Language_List",
+    "text_language_list": "Text_Language_List",
+    "format_profile": "Format_Profile",
+    "encoded_library_name": "Encoded_Library_Name",
+    "bit_rate": "BitRate",
+    "bit_rate_mode": "BitRate_Mode",
+    "pixel_aspect_ratio": "PixelAspectRatio",
+    "proportion_of_this_stream": "StreamSize_Proportion",
+}
+# MediaInfo library stream kinds of the track types
+MEDIAINFO_STREAM_KINDS = {"General": STREAM_GENERAL, "Video": STREAM_VIDEO}
 
 DEBUG = bool(os.environ.get("DEBUG", "").lower() in ("1", "true", "yes"))
 
@@ -99,11 +136,66 @@ if sys.version_info < (3, 0):
     sys.exit(1)
 
 
-def scan(rootdir: Path, output_stream=sys.stdout):
+def _entry_name(entry: os.DirEntry) -> str:
+    return entry.name
+
+
+def _find_files(rootdir: Path) -> Iterator[os.DirEntry]:
+    """Recursively find all files, sorted.
+
+    The DirEntry objects carry the file type from the directory listing,
+    i.e., no extra stat() calls are needed for the symlink checks.
+
+    :param rootdir: starting base path
+    :return: generator of (non-directory) directory entries
+    """
+    for _, dir_entries, file_entries in scandir_walk(str(rootdir.resolve())):
+        dir_entries.sort(key=_entry_name)
+        file_entries.sort(key=_entry_name)
+        yield from file_entries
+
+
+def _get_values(filepath: Path) -> tuple[list[str] | None, OSError | None]:
+    """Get the CSV values of a media file's fields of interest (run in a worker thread).
+
+    :param filepath: file path
+    :return: (CSV values or None if not a video file, exception if failed)
+    """
+    # check if actually a video file
+    try:
+        if not is_video(filepath):
+            return None, None
+    except OSError as ex:
+        return None, ex
+
+    # get the info by using MediaInfo library, querying the fields directly
+    # with the worker thread's (reused) library handle,
+    # all fields of interest are in the headers, i.e., no need to parse the whole file
+    handle = get_thread_handle(parse_speed=0.0)
+    if not handle.open(filepath):
+        return None, OSError(f"MediaInfo could not open the file: {filepath}")
+
+    values = []
+    try:
+        for track_type, field_name in FIELDS_OF_INTEREST:
+            # the first track of the type, empty if there is none
+            value = handle.get(MEDIAINFO_PARAMETERS[field_name], MEDIAINFO_STREAM_KINDS[track_type])
+            if DELIMITER in value:
+                value = f'"{value}"'
+            values.append(value)
+    finally:
+        # release the file, the handle is kept for the next one
+        handle.close()
+    return values, None
+
+
+def scan(rootdir: Path, output_stream=sys.stdout, max_workers: int = None, cache: MetadataCache = None):
     """Recursive scanning for all media files.
 
     :param rootdir: starting base path
     :param output_stream: output stream, defaults to STDOUT
+    :param max_workers: number of parallel MediaInfo threads (None: SCAN_MAX_WORKERS)
+    :param cache: optional persistent cache of the CSV values
     """
     if not rootdir.is_dir():
         raise NotADirectoryError(rootdir)
@@ -111,50 +203,82 @@ def scan(rootdir: Path, output_stream=sys.stdout):
     # CSV header line
     fieldnames = [foi[1] for foi in FIELDS_OF_INTEREST]
     output_stream.write(f"{DELIMITER.join(['filename'] + fieldnames)}\n")
-    for root, dirs, files in os.walk(rootdir.resolve()):
-        dirs.sort()
-        files.sort()
-        for filename in files:
-            filepath = Path(root, filename)
+
+    filepaths = []
+    symlinks = set()
+    broken_symlinks = set()
+    # inode numbers, from the directory listing (no extra stat() calls)
+    inodes = {}
+    for entry in _find_files(rootdir):
+        filepath = Path(entry.path)
+        filepaths.append(filepath)
+        inodes[filepath] = entry.inode()
+        # only symlinks need to be stat'ed
+        if entry.is_symlink():
+            symlinks.add(filepath)
+            if not os.path.exists(entry.path):
+                broken_symlinks.add(filepath)
+    cached = {}
+    if cache is not None:
+        for filepath in filepaths:
+            if filepath not in broken_symlinks:
+                fields = cache.get(filepath)
+                if fields is not None:
+                    cached[filepath] = fields["values"]
+        logging.debug("cached: %d of %d files", len(cached), len(filepaths))
+    # the files are read in inode order, i.e., roughly in on-disk order,
+    # which turns random seeks into (mostly) sequential reads on spinning disks
+    to_parse = sorted((filepath for filepath in filepaths
+                       if filepath not in broken_symlinks and filepath not in cached),
+                      key=inodes.__getitem__)
+    # the paths are already resolved (resolved root, no symlinked directories followed),
+    # i.e., only symlinked files need to be resolved, the rest is a string operation
+    cwd_prefix = os.path.join(os.getcwd(), "")
+    # the files are analyzed in worker threads, the results (in path order) are handled here
+    with ThreadPoolExecutor(max_workers=max_workers or SCAN_MAX_WORKERS) as executor:
+        results = zip(to_parse, executor.map(_get_values, to_parse))
+        # results which arrived ahead of their turn
+        pending = {}
+        # CSV rows not yet written, and their number of characters
+        rows = []
+        rows_length = 0
+        for filepath in filepaths:
             logging.info("filepath: %s ...", filepath)
 
-            if filepath.is_symlink() and not filepath.exists():
+            if filepath in broken_symlinks:
                 logging.warning("skipping broken symlink: %s",
                                 filepath.absolute())
                 continue
 
-            # check if actually a video file
-            try:
-                if not is_video(filepath):
-                    logging.debug(
-                        "Not expected file type, skipping : %s", filepath)
-                    continue
-            except FileNotFoundError as ex:
-                logging.exception(ex, exc_info=False)
+            if filepath in cached:
+                values, error = cached[filepath], None
+            else:
+                while filepath not in pending:
+                    parsed_filepath, result = next(results)
+                    pending[parsed_filepath] = result
+                values, error = pending.pop(filepath)
+                if cache is not None and error is None:
+                    cache.put(filepath, {"values": values})
+            if error is not None:
+                logging.exception(error, exc_info=False)
                 continue
-            except OSError as ex:
-                logging.exception(ex, exc_info=False)
+            if values is None:
+                logging.debug(
+                    "Not expected file type, skipping : %s", filepath)
                 continue
 
-            # get the info by using MediaInfo library
             logging.info("Analyzing media type: %s", filepath)
-            media_info = MediaInfo.parse(filepath)
-
-            # construct row container
-            row = [f'"{filepath.resolve().relative_to(Path(os.getcwd()))}"', ]
-
-            for foi in FIELDS_OF_INTEREST:
-                foi_track_name, field_name = foi
-                for track in media_info.tracks:
-                    if track.track_type == foi_track_name:
-                        value = str(track.to_data().get(field_name, ""))
-                        if DELIMITER in value:
-                            value = f'"{value}"'
-                        row.append(value)
-
             # write row, with delimiter
-            output_stream.write(f"{DELIMITER.join(row)}\n")
-
+            real_filepath = str(filepath.resolve()) if filepath in symlinks else str(filepath)
+            row = f'"{real_filepath.removeprefix(cwd_prefix)}"{DELIMITER}{DELIMITER.join(values)}\n'
+            rows.append(row)
+            rows_length += len(row)
+            if rows_length >= OUTPUT_CHUNK_SIZE:
+                output_stream.write("".join(rows))
+                rows.clear()
+                rows_length = 0
+
+    output_stream.write("".join(rows))
     output_stream.flush()
     return 0
 
@@ -170,6 +294,9 @@ def main():
     arg_output = arguments["--out"]
     arg_verbose = arguments["--verbose"]
     arg_nocolor = arguments["--no-color"]
+    arg_jobs = int(arguments["--jobs"])
+    arg_cache = arguments["--cache"]
+    assert arg_jobs >= 0, "number of jobs must not be negative!"
 
     # setup logging
     handler = colorlog.StreamHandler(stream=sys.stderr)
@@ -187,12 +314,16 @@ def main():
         if os.path.exists(arg_output):
             raise FileExistsError(arg_output)
         # pylint: disable-next=consider-using-with
-        out = open(arg_output, "w", encoding="utf8")
+        out = open(arg_output, "w", encoding="utf8", buffering=OUTPUT_BUFFER_SIZE)
 
     root = Path(arg_root)
     logging.info("base path: %s", root.absolute())
     logging.info("output: %s", out)
-    return scan(root, out)
+    if not arg_cache:
+        return scan(root, out, arg_jobs or None)
+    with MetadataCache("video_info") as cache:
+        logging.info("cache: %s", cache.filepath)
+        return scan(root, out, arg_jobs or None, cache)
 
 
 if __name__ == '__main__':
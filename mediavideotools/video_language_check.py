@@ -14,6 +14,8 @@ Arguments:
   directory       Starting root directory for recursive scan.
 
 Options:
+  -c --cache      Use a persistent cache of the track languages,
+                  only unchanged files (modification time, size) are reused.
   -h --help       Show this screen.
   -j --json       JSON output, mapping filepath->missingLangCodes.
   --no-color      No colored log output.
@@ -25,6 +27,7 @@ import json
 import logging
 import os
 import re
+import stat
 #
 # LICENSE:
 #
@@ -44,19 +47,25 @@ import re
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import sys
+from functools import lru_cache
 from pathlib import Path
 
 import colorlog
 from docopt import docopt
-from pymediainfo import MediaInfo
 
 # HACK to run file both as module and Python program
 try:
     # for running as Python program
     from mime_checker import is_video
+    from utils.mediainfo_handle import get_thread_handle, STREAM_AUDIO
+    from utils.metadata_cache import MetadataCache
+    from utils.file_utils import scandir_walk
 except ModuleNotFoundError:
     # for pytest a relative import is needed
     from .mime_checker import is_video
+    from .utils.mediainfo_handle import get_thread_handle, STREAM_AUDIO
+    from .utils.metadata_cache import MetadataCache
+    from .utils.file_utils import scandir_walk
 
 __version__ = "1.7.3"
 __date__ = "2020-10-04"
@@ -74,17 +83,25 @@ if sys.version_info < (3, 0):
     sys.exit(1)
 
 IGNORE_MARKER = "[__]"
+# 2-letter language codes in path names, e.g., "[DE]"
+LANGUAGE_TAG_RE = re.compile(r"\[([A-Z]{2})\]")
 
 
-def __get_path_languages(filepath: Path, use_full_path: bool = True) -> set:
+def __get_path_languages(filepath: Path, use_full_path: bool = True) -> frozenset:
     assert len(
         filepath.parts) > 1, "filepath must have filename and parent directory!"
     dirpath = filepath.parent  # full path
     dirname = filepath.parts[-2]  # just the file's parent directory name
+    return __get_text_languages(str(dirpath) if use_full_path else str(dirname))
+
+
+@lru_cache(maxsize=4096)
+def __get_text_languages(text: str) -> frozenset:
+    if "[" not in text:
+        # no tags at all, no need to run the regex
+        return frozenset()
     # find 2-letter language codes, e.g., ['DE', 'EN']
-    path_languages = re.findall(
-        r"\[([A-Z]{2})\]", str(dirpath) if use_full_path else str(dirname))
-    return set(path_languages)
+    return frozenset(LANGUAGE_TAG_RE.findall(text))
 
 
 def __get_missing_in_path(path_languages: set, track_languages: set) -> set:
@@ -95,28 +112,49 @@ def __get_toomuch_in_path(path_languages: set, track_languages: set) -> set:
     return path_languages - track_languages
 
 
-def get_track_languages_for_file(filepath: Path) -> set:
+def get_track_languages_for_file(filepath: Path, cache: MetadataCache = None) -> set:
     """Get the track languages from a video file's metadata.
 
     :param filepath: file path of the video file to check
+    :param cache: optional persistent cache of the track languages
     :return: List of upper-case language codes, None if not a video file.
     """
     if not isinstance(filepath, Path):
         raise TypeError("filepath must be pathlib.Path!")
-    if filepath.is_dir():
+    # one stat() call for all checks (and the cache)
+    try:
+        stat_result = os.stat(filepath)
+    except OSError as ex:
+        # e.g., also broken symlinks or symlink loops
+        raise FileNotFoundError(filepath) from ex
+    if stat.S_ISDIR(stat_result.st_mode):
         raise IsADirectoryError(
             "filepath must be a valid file path, not a directory!")
-    if not filepath.exists():
-        raise FileNotFoundError(filepath)
+    if cache is not None:
+        cached = cache.get(filepath, stat_result)
+        if cached is not None:
+            languages = cached["languages"]
+            return None if languages is None else set(languages)
+    result = __get_track_languages(filepath)
+    if cache is not None:
+        cache.put(filepath, {"languages": None if result is None else sorted(result)}, stat_result)
+    return result
+
+
+def __get_track_languages(filepath: Path) -> set:
     if not is_video(filepath):
         return None
-    # use pymediainfo to parse the video file
-    media_info = MediaInfo.parse(filepath)
-    # loop over all tracks (video, audio, text, ...)
+    # only the audio tracks' language fields are needed, i.e., query them directly
+    # from the MediaInfo library (headers only, no complete XML output of all tracks)
+    handle = get_thread_handle(parse_speed=0.0)
+    handle.open(filepath)
+    languages = [handle.get("Language", STREAM_AUDIO, stream_number)
+                 for stream_number in range(handle.count(STREAM_AUDIO))]
+    # release the file, the handle is kept for the next one
+    handle.close()
     result = set()
-    for track in media_info.audio_tracks:
-        language = track.language
-        if language is None:  # language could be None!
+    for language in languages:
+        if not language:  # language could be missing!
             continue
         # some data harmonization...
         lang_lo = language.lower()
@@ -130,10 +168,11 @@ def get_track_languages_for_file(filepath: Path) -> set:
     return result
 
 
-def get_track_languages_for_files(paths: list[Path]) -> set:
+def get_track_languages_for_files(paths: list[Path], cache: MetadataCache = None) -> set:
     """Collect all track languages in the files.
 
     :param paths: list of complete file paths
+    :param cache: optional persistent cache of the track languages
     :return: set of collected track languages
     """
     files_languages = set()
@@ -141,7 +180,7 @@ def get_track_languages_for_files(paths: list[Path]) -> set:
         if filepath.is_symlink() and not filepath.exists():
             logging.warning("skipping broken symlink: %s", filepath.absolute())
             continue
-        track_languages = get_track_languages_for_file(filepath)
+        track_languages = get_track_languages_for_file(filepath, cache)
         if not track_languages:
             # e.g., not a video file
             continue
@@ -151,11 +190,16 @@ def get_track_languages_for_files(paths: list[Path]) -> set:
     return files_languages
 
 
-def scan(rootdir: Path, use_full_path: bool = True):
+def _walk_root(walk_item: tuple) -> str:
+    return walk_item[0]
+
+
+def scan(rootdir: Path, use_full_path: bool = True, cache: MetadataCache = None):
     """Recursive directory scan.
 
     :param rootdir: root directory, starting point
     :param use_full_path: True: consider the full path, False: only single parent dirname
+    :param cache: optional persistent cache of the track languages
     :return dictionary with filepath->{missing_in_path: [...], toomuch_in_path: [...]}
     """
     assert isinstance(rootdir, Path)
@@ -163,11 +207,12 @@ def scan(rootdir: Path, use_full_path: bool = True):
         raise NotADirectoryError(rootdir)
 
     result = {}
-    for root, _, files in sorted(os.walk(rootdir.resolve())):
+    # directory entries, i.e., no extra stat() calls for the file type checks
+    for root, _, file_entries in sorted(scandir_walk(str(rootdir.resolve())), key=_walk_root):
         if IGNORE_MARKER in root:
             logging.info("ignoring (IGNORE_MARKER): %s", root)
             continue
-        if not files:
+        if not file_entries:
             continue
 
         logging.info("processing directory: %s", root)
@@ -178,10 +223,10 @@ def scan(rootdir: Path, use_full_path: bool = True):
         logging.debug("root_languages: %s", root_languages)
 
         # construct list of complete paths (root + filenames)
-        filespaths = [Path(root, filename) for filename in files]
+        filespaths = [Path(entry.path) for entry in file_entries]
 
         # collect all track languages in the files
-        files_languages = get_track_languages_for_files(filespaths)
+        files_languages = get_track_languages_for_files(filespaths, cache)
 
         # path relative to the methods' rootdir
         relative_path = Path(root).relative_to(rootdir.resolve())
@@ -221,6 +266,7 @@ def main():
     arg_json_output = arguments["--json"]
     arg_no_full_path = arguments["--no-full-path"]
     arg_nocolor = arguments["--no-color"]
+    arg_cache = arguments["--cache"]
 
     # setup logging
     handler = colorlog.StreamHandler(stream=sys.stderr)
@@ -235,7 +281,12 @@ def main():
 
     root = Path(arg_root)
     logging.info("base path: %s", root.resolve())
-    result = scan(root, use_full_path=not arg_no_full_path)
+    if not arg_cache:
+        result = scan(root, use_full_path=not arg_no_full_path)
+    else:
+        with MetadataCache("language_check") as cache:
+            logging.info("cache: %s", cache.filepath)
+            result = scan(root, use_full_path=not arg_no_full_path, cache=cache)
     if arg_json_output:
         print(json.dumps(result))
     return 0
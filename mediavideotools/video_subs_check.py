@@ -44,19 +44,25 @@ Options:
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 ##
-import glob
 import logging
 import os
 import re
 import sys
 # pylint: disable-next=redefined-builtin
 from codecs import open
-from fnmatch import fnmatch
 from pathlib import Path
 
 import colorlog
 from docopt import docopt
 
+# HACK to run file both as module and Python program
+try:
+    # for running as Python program
+    from utils.file_utils import scandir_walk
+except ModuleNotFoundError:
+    # for pytest a relative import is needed
+    from .utils.file_utils import scandir_walk
+
 __version__ = "1.0.0"
 __date__ = "2023-07-03"
 __updated__ = "2023-07-03"
@@ -65,7 +71,10 @@ __license__ = 'AGPL-3.0+'
 __email__ = "ixtalo@gmail.com"
 __status__ = "Production"
 
-MOVIE_FILES_PATTERNS = ["*.mkv", "*.avi", "*.mp4"]
+MOVIE_FILES_EXTENSIONS = frozenset((".mkv", ".avi", ".mp4"))
+SUBS_FILES_EXTENSIONS = frozenset((".sub", ".srt"))
+# subtitle filename (stem) with language code and/or forced flag, e.g., "foobar-eng-forced"
+SUBS_BASENAME_RE = re.compile(r"^(.+?)[-_.](forced|[a-z]{2,3})(?:[-_.]forced)?$")
 
 DEBUG = bool(os.environ.get("DEBUG", "").lower() in ("1", "true", "yes"))
 
@@ -74,6 +83,10 @@ if sys.version_info < (3, 9):
     sys.exit(1)
 
 
+def _entry_name(entry: os.DirEntry) -> str:
+    return entry.name
+
+
 def scan(rootdir: Path, output_stream=sys.stdout):
     """Recursive scanning for all media files.
 
@@ -83,38 +96,38 @@ def scan(rootdir: Path, output_stream=sys.stdout):
     if not rootdir.is_dir():
         raise NotADirectoryError(rootdir)
 
-    curdir = Path(os.curdir).resolve()
-    regex = re.compile(r"^(.+?)[-_.](forced|[a-z]{2,3})(?:[-_.]forced)?$")
+    # directory entries, i.e., no extra stat() calls for the file type checks
+    for root, dir_entries, file_entries in scandir_walk(str(rootdir.resolve())):
+        dir_entries.sort(key=_entry_name)
 
-    for root, dirs, files in os.walk(rootdir.resolve()):
-        dirs.sort()
-        root_path = Path(root).resolve()
-
-        # check for a "./Subs/" folder
-        if not ("subs" in dirs or "Subs" in dirs):
+        # check for a "./Subs/" folder (any case, the name is known from the listing)
+        subs_name = next((entry.name for entry in dir_entries if entry.name.lower() == "subs"), None)
+        if subs_name is None:
             # irrelevant -> skip/continue
             continue
 
-        subs_dir = Path(root).joinpath("subs")
-        if not subs_dir.exists():
-            subs_dir = Path(root).joinpath("Subs")
-            if not subs_dir.exists():
-                raise RuntimeError(
-                    "Invalid program state - this should never happen!")
-
-        # collect all .sub files
-        # NOTE: glob.glob(..., root_dir=...) is only after Python 3.10,
-        # for lower versions use os.chdir instead
-        os.chdir(subs_dir)
-        subs_files = glob.glob("*.sub")
-        subs_files += glob.glob("*.srt")
+        root_path = Path(root).resolve()
+        subs_dir = Path(root, subs_name)
+
+        # collect all .sub files (like glob, i.e., no hidden files and case-sensitive),
+        # listed relative to the Subs folder without changing the working directory
+        subs_files = []
+        try:
+            with os.scandir(subs_dir) as iterator:
+                for entry in iterator:
+                    if not entry.name.startswith(".") \
+                            and os.path.splitext(entry.name)[1] in SUBS_FILES_EXTENSIONS:
+                        subs_files.append(entry.name)
+        except OSError as ex:
+            # like glob, ignore unlistable directories
+            logging.debug("scandir problem: %s", ex)
         logging.debug("subs_dir: '%s' --> files: #%d",
                       subs_dir.resolve(), len(subs_files))
 
         # gather just the basenames, i.e., without language code and without extension
         subs_basenames = set()
         for subs_file in subs_files:
-            basename = regex.sub(r"\1", Path(subs_file).stem, 1)
+            basename = SUBS_BASENAME_RE.sub(r"\1", os.path.splitext(subs_file)[0], 1)
             subs_basenames.add(basename)
 
         logging.debug("subs_basenames: %s", subs_basenames)
@@ -125,28 +138,22 @@ def scan(rootdir: Path, output_stream=sys.stdout):
 
         # collect movie basenames (without extension)
         movies_basenames = set()
-        for pattern in MOVIE_FILES_PATTERNS:
-            assert "*" in pattern, "Invalid globbing pattern!"
-            for file in files:
-                if fnmatch(file, pattern):
-                    basename = Path(file).stem
-                    movies_basenames.add(basename)
+        for entry in file_entries:
+            basename, extension = os.path.splitext(entry.name)
+            if extension.lower() in MOVIE_FILES_EXTENSIONS:
+                movies_basenames.add(basename)
 
         logging.debug("movies: %s; subtitles: %s",
                       movies_basenames, subs_basenames)
 
         # check if the filenames in the upper folder are according to the .sub basenames
-        # (A + B) - (A - B)
-        invalid = movies_basenames.union(
-            subs_basenames) - movies_basenames.intersection(subs_basenames)
+        # (A + B) - (A & B), i.e., the symmetric difference
+        invalid = movies_basenames ^ subs_basenames
         if invalid:
             logging.warning(
                 "Invalid subtitle files found for '%s': %s", root_path, invalid)
             output_stream.write(f"{str(root_path)}\n")
 
-    # back to its original
-    os.chdir(curdir)
-
     output_stream.flush()
     return 0
 
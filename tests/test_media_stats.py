@@ -10,8 +10,10 @@ from pathlib import Path
 import pytest
 from docopt import DocoptExit
 
+from mediavideotools import media_stats
 from mediavideotools.media_stats import \
     DirectoryMediaStats, MyMediaInfo, scan, get_media_file_info, main
+from mediavideotools.utils.metadata_cache import MetadataCache
 
 # pushd tests && python ../media_stats.py -v ./testdata/ 2>/dev/null
 TESTDATA_OUTPUT = """path;level;num_entries;cum_filesize_bytes;cum_duration_seconds;mean_bit_rate
@@ -37,12 +39,12 @@ TESTDATA_OUTPUT = """path;level;num_entries;cum_filesize_bytes;cum_duration_seco
 "testdata/correct/Unicode-äöüß";3;1;242994;1.002;1940072.0
 "testdata/correct/Cool Run (1993) [EN]/subdir";4;1;21960;1.02;172235.0
 "testdata/correct/Cool Run (1993) [EN]";3;1;21960;1.02;172235.0
-"testdata/correct";2;10;1770369;12.521;1242606.7
-"testdata";1;2;1967195;18.183;763955.8
+"testdata/correct";2;10;1770369;12.521;1242606.8
+"testdata";1;2;1967195;18.183;763955.9
 """
 
 # pushd tests && python ../media_stats.py -v . 2>/dev/null | tail -1
-TESTDATA_OUTPUT_MAINDIR_EXTRALINE = '".";0;1;1967195;18.183;763955.8'
+TESTDATA_OUTPUT_MAINDIR_EXTRALINE = '".";0;1;1967195;18.183;763955.9'
 
 
 class TestMyMediaStats:
@@ -221,6 +223,35 @@ def test_scan_testsdir():
     assert TESTDATA_OUTPUT_MAINDIR_EXTRALINE in actual
 
 
+def test_scan_processes():
+    sio = StringIO()
+    scan(Path("./testdata/"), output_stream=sio)
+    sio_processes = StringIO()
+    scan(Path("./testdata/"), output_stream=sio_processes, processes=2)
+    assert sio_processes.getvalue() == sio.getvalue()
+
+
+def test_scan_processes_cache(tmp_path, monkeypatch):
+    mkv = Path("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv").read_bytes()
+    for filename in ("root.mkv", "a/x.mkv", "b/y.mkv"):
+        filepath = tmp_path.joinpath("t", filename)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        filepath.write_bytes(mkv)
+    monkeypatch.chdir(tmp_path)
+    sio = StringIO()
+    scan(Path("t"), output_stream=sio)
+    for _ in range(2):
+        # first filling the cache, then reading from it
+        with MetadataCache("stats", cache_dir=tmp_path) as cache:
+            sio_processes = StringIO()
+            scan(Path("t"), output_stream=sio_processes, cache=cache, processes=2)
+            assert sio_processes.getvalue() == sio.getvalue()
+    # all entries, also of the worker processes, are in the cache
+    with MetadataCache("stats", cache_dir=tmp_path) as cache:
+        for filename in ("root.mkv", "a/x.mkv", "b/y.mkv"):
+            assert cache.get(tmp_path.joinpath("t", filename)) is not None
+
+
 def test_get_media_file_info():
     mmi = get_media_file_info(
         Path("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv"))
@@ -231,6 +262,31 @@ def test_get_media_file_info():
     assert mmi.bit_rate == 1940072
 
 
+def test_get_media_file_info_cache(tmp_path, monkeypatch):
+    filepath = Path("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv")
+    with MetadataCache("stats", cache_dir=tmp_path) as cache:
+        get_media_file_info(filepath, cache)
+        # second call must not parse the file again
+
+        def mock_get_thread_handle(*_, **__):
+            raise AssertionError("MediaInfo must not be called!")
+        monkeypatch.setattr(media_stats, "get_thread_handle", mock_get_thread_handle)
+        mmi = get_media_file_info(filepath, cache)
+    assert mmi.path == filepath
+    assert mmi.file_size == 242994
+    assert mmi.duration == 1.002
+    assert mmi.bit_rate == 1940072
+
+
+def test_get_media_file_info_notopened(monkeypatch, caplog):
+    monkeypatch.setattr("mediavideotools.utils.mediainfo_handle.MediaInfoHandle.open", lambda *_: False)
+    filepath = Path("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv")
+    mmi = get_media_file_info(filepath)
+    assert mmi.path == filepath
+    assert mmi.duration is None
+    # no ffprobe fallback
+    assert caplog.messages == [f"MediaInfo could not open the file: {filepath}"]
+
 def test_get_media_file_info_nosuchfile():
     with pytest.raises(FileNotFoundError):
         # pylint: disable-next=pointless-statement
@@ -8,7 +8,7 @@ from pathlib import Path
 
 import pytest
 
-from mediavideotools.mime_checker import is_mediafile, is_video, is_audio
+from mediavideotools.mime_checker import is_mediafile, is_mediafile_path, is_video, is_audio, has_video_signature
 
 
 def test_is_mediafile():
@@ -45,6 +45,24 @@ def test_is_mediafile():
         is_mediafile("STRINSTEADOFPATH")
 
 
+def test_is_mediafile_nonmediaextension():
+    # no file access at all for non-media filename extensions
+    assert not is_mediafile(Path("DOESNOTEXIST.nfo"))
+    assert not is_mediafile(Path("DOESNOTEXIST.SRT"))
+    with pytest.raises(FileNotFoundError):
+        is_mediafile(Path("DOESNOTEXIST.mkv"))
+
+
+def test_is_mediafile_path():
+    assert is_mediafile_path(
+        "./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv")
+    assert is_mediafile_path("./testdata/correct/sample-3s.mp3")
+    assert not is_mediafile_path("./testdata/incorrect/justfilename.mkv")
+    assert not is_mediafile_path("DOESNOTEXIST.nfo")
+    with pytest.raises(FileNotFoundError):
+        is_mediafile_path("DOESNOTEXIST")
+
+
 def test_is_video():
     """Tests for video-file checks."""
     # pylint: disable=line-too-long
@@ -80,3 +98,24 @@ def test_is_audio():
         Path("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv"))
     assert not is_audio(
         Path("./testdata/correct/SampleVideoFlv/sample_640x360_1sec.flv"))
+
+
+def test_is_video_is_audio_nonmediaextension():
+    # no file access at all for non-media filename extensions
+    assert not is_video(Path("DOESNOTEXIST.srt"))
+    assert not is_audio(Path("DOESNOTEXIST.JPG"))
+    with pytest.raises(FileNotFoundError):
+        is_audio(Path("DOESNOTEXIST.mp3"))
+
+
+def test_has_video_signature():
+    assert has_video_signature("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv", ".mkv")
+    assert has_video_signature("./testdata/correct/Der Stiefelkater (2011) [DE]/poe-dgk_cut_x264.avi", ".avi")
+    assert has_video_signature("./testdata/incorrect/nocontent.mkv", ".mkv")
+    # wrong extension or not a video container
+    assert not has_video_signature("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv", ".avi")
+    assert not has_video_signature("./testdata/incorrect/justfilename.mkv", ".mkv")
+    # unknown extension, no file access at all
+    assert not has_video_signature("DOESNOTEXIST.mp3", ".mp3")
+    with pytest.raises(FileNotFoundError):
+        has_video_signature("DOESNOTEXIST.mkv", ".mkv")
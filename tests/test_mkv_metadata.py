@@ -5,8 +5,12 @@
 # pylint: disable=missing-function-docstring, line-too-long, invalid-name
 
 import xml.etree.ElementTree as ET
+from pathlib import Path
 
-from mediavideotools.mkv_metadata import mkv_produce_metadata
+import pytest
+
+from mediavideotools.mkv_metadata import mkv_produce_metadata, mkv_produce_metadata_xml, \
+    mkv_add_metadata_xml, mkv_add_metadata_xml_batch, get_path_to_mkvpropedit
 
 
 def test_mkv_produce_metadata_empty():
@@ -48,3 +52,99 @@ def test_mkv_produce_metadata_ok():
                        b'</Simple></Tag><Tag><Simple><Name>video_convert_x265</Name><Simple><Name>cus'
                        b'tom1</Name><String>bla1</String></Simple><Simple><Name>custom2</Name><String'
                        b'>222</String></Simple></Simple></Tag></Tags>')
+
+
+def test_mkv_produce_metadata_xml():
+    assert mkv_produce_metadata_xml(meta_standard={}, meta_custom={}) == \
+        b"<?xml version='1.0' encoding='utf8'?>\n<Tags />"
+    meta_standard = {"foo1": "bar1", "foo2": 22}
+    meta_custom = {"custom1": "bla1", "custom2": 222}
+    actual = mkv_produce_metadata_xml(meta_standard=meta_standard, meta_custom=meta_custom)
+    expected = ET.tostring(mkv_produce_metadata(meta_standard=meta_standard, meta_custom=meta_custom).getroot(),
+                           encoding='utf8', method='xml')
+    assert actual == expected
+
+
+def test_mkv_produce_metadata_xml_escape():
+    actual = mkv_produce_metadata_xml(meta_standard={"a&b": "<äöü>"}, meta_custom={}, basetagname="x")
+    assert actual == ("<?xml version='1.0' encoding='utf8'?>\n<Tags><Tag><Simple><Name>a&amp;b</Name>"
+                      "<String>&lt;äöü&gt;</String></Simple></Tag></Tags>").encode("utf8")
+
+
+def test_get_path_to_mkvpropedit(monkeypatch, tmp_path):
+    get_path_to_mkvpropedit.cache_clear()
+    monkeypatch.setenv("PATH", str(tmp_path))
+    with pytest.raises(RuntimeError):
+        get_path_to_mkvpropedit()
+    mkvpropedit = tmp_path.joinpath("mkvpropedit")
+    mkvpropedit.write_text("#!/bin/sh\n")
+    mkvpropedit.chmod(0o755)
+    assert get_path_to_mkvpropedit() == str(mkvpropedit)
+    # cached, no further PATH lookup
+    mkvpropedit.unlink()
+    assert get_path_to_mkvpropedit() == str(mkvpropedit)
+    get_path_to_mkvpropedit.cache_clear()
+
+
+def test_mkv_add_metadata_xml_nomkvpropedit(monkeypatch, tmp_path):
+    get_path_to_mkvpropedit.cache_clear()
+    monkeypatch.setenv("PATH", str(tmp_path))
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    with pytest.raises(RuntimeError):
+        mkv_add_metadata_xml(Path("./testdata/incorrect/nocontent.mkv"),
+                             mkv_produce_metadata_xml(meta_standard={}, meta_custom={"foo": 1}))
+    # no temporary XML file left behind
+    assert not list(tmp_path.iterdir())
+    get_path_to_mkvpropedit.cache_clear()
+
+
+def _fake_mkvpropedit(tmp_path: Path) -> Path:
+    """Fake mkvpropedit which copies the tags XML file (--tags global:<file>) to <mkvfile>.xml."""
+    bindir = tmp_path.joinpath("bin")
+    bindir.mkdir()
+    mkvpropedit = bindir.joinpath("mkvpropedit")
+    mkvpropedit.write_text('#!/bin/sh\n/bin/cat "${3#global:}" > "$1.xml"\n')
+    mkvpropedit.chmod(0o755)
+    return bindir
+
+
+def test_mkv_add_metadata_xml(monkeypatch, tmp_path):
+    get_path_to_mkvpropedit.cache_clear()
+    monkeypatch.setenv("PATH", str(_fake_mkvpropedit(tmp_path)))
+    tempdir = tmp_path.joinpath("temp")
+    tempdir.mkdir()
+    monkeypatch.setattr("tempfile.tempdir", str(tempdir))
+    mkvfile = tmp_path.joinpath("foo.mkv")
+    mkvfile.write_bytes(b"foo")
+    xml = mkv_produce_metadata_xml(meta_standard={}, meta_custom={"foo": 1})
+    mkv_add_metadata_xml(mkvfile, xml)
+    assert tmp_path.joinpath("foo.mkv.xml").read_bytes() == xml
+    # no temporary XML file left behind
+    assert not list(tempdir.iterdir())
+    # ElementTree
+    tmp_path.joinpath("foo.mkv.xml").unlink()
+    mkv_add_metadata_xml(mkvfile, mkv_produce_metadata(meta_standard={}, meta_custom={"foo": 1}))
+    assert tmp_path.joinpath("foo.mkv.xml").read_bytes() == xml
+    # kept temporary XML file
+    mkv_add_metadata_xml(mkvfile, xml, keep_xml=True)
+    assert [p.read_bytes() for p in tempdir.iterdir()] == [xml]
+    get_path_to_mkvpropedit.cache_clear()
+
+
+def test_mkv_add_metadata_xml_batch(monkeypatch, tmp_path):
+    get_path_to_mkvpropedit.cache_clear()
+    monkeypatch.setenv("PATH", str(_fake_mkvpropedit(tmp_path)))
+    jobs = []
+    for i in range(10):
+        mkvfile = tmp_path.joinpath(f"foo{i}.mkv")
+        mkvfile.write_bytes(b"foo")
+        jobs.append((mkvfile, mkv_produce_metadata_xml(meta_standard={}, meta_custom={"foo": i})))
+    mkv_add_metadata_xml_batch(jobs, max_workers=4)
+    for mkvfile, xml in jobs:
+        assert tmp_path.joinpath(f"{mkvfile.name}.xml").read_bytes() == xml
+    # no files, nothing to do
+    mkv_add_metadata_xml_batch([])
+    with pytest.raises(TypeError):
+        # noinspection PyTypeChecker
+        mkv_add_metadata_xml_batch([("foo.mkv", b"")])
+    get_path_to_mkvpropedit.cache_clear()
@@ -8,8 +8,8 @@ import pytest
 
 from mediavideotools import rename_x265_remove_x264
 from mediavideotools.rename_x265_remove_x264 import \
-    main, run, scan, _handle_filepath, _handle_files, _get_marker, \
-    FILENAME_MARKER_X265, FILENAME_EXTENSION
+    main, run, scan, _handle_filepath, _handle_files, \
+    MARKER, FILENAME_MARKER_X265, FILENAME_EXTENSION
 
 
 def test_handle_filepath():
@@ -35,12 +35,12 @@ def test_handle_filepath_invalid():
         _handle_filepath("foo.x264-bar.mkv")
 
 
-def test_get_marker():
-    assert _get_marker() == f"{FILENAME_MARKER_X265}{FILENAME_EXTENSION}"
+def test_marker():
+    assert MARKER == f"{FILENAME_MARKER_X265}{FILENAME_EXTENSION}"
 
 
 def test_scan():
-    actual = scan(Path("./testdata"))
+    actual = list(scan(Path("./testdata")))
     assert Path(
         'testdata/incorrect/x265_abundant_x264/foo.h264-bar_x265.mkv') in actual
     assert Path(
@@ -51,7 +51,7 @@ def test_scan():
 
 def test_handle_files():
     files = scan(Path("./testdata"))
-    actual = _handle_files(files)
+    actual = dict(_handle_files(files))
     assert len(actual) == 3
     assert Path(
         'testdata/incorrect/x265_abundant_x264/foo.h264-bar_x265.mkv') in actual.keys()
@@ -68,7 +68,7 @@ def test_handle_files():
 
 
 def test_run(monkeypatch):
-    def mock_scan(_):
+    def mock_scan(_, **__):
         return [Path("foo1.x264-bar.mkv"), Path("foo2.mkv")]
 
     monkeypatch.setattr(rename_x265_remove_x264, "scan", mock_scan)
@@ -82,7 +82,7 @@ def test_run(monkeypatch):
 
 
 def test_run_no_candidates(monkeypatch, caplog):
-    def mock_scan(_):
+    def mock_scan(_, **__):
         return []
 
     monkeypatch.setattr(rename_x265_remove_x264, "scan", mock_scan)
@@ -93,7 +93,7 @@ def test_run_no_candidates(monkeypatch, caplog):
 
 
 def test_run_no_relevant_files(monkeypatch, caplog):
-    def mock_scan(_):
+    def mock_scan(_, **__):
         return [Path("not_marker.mkv")]
 
     monkeypatch.setattr(rename_x265_remove_x264, "scan", mock_scan)
@@ -105,10 +105,39 @@ def test_run_no_relevant_files(monkeypatch, caplog):
 
 
 def test_main(monkeypatch):
-    def mock_scan(_):
+    def mock_scan(_, **__):
         return [Path("foo1.x264-bar.mkv"), Path("foo2.mkv")]
 
     monkeypatch.setattr(rename_x265_remove_x264, "scan", mock_scan)
     monkeypatch.setattr("sys.argv", ("foo", "NOT_REALLY_NEEDED"))
     assert main() == 0
     # NOTE: capsys did not work, stdout & stderr were empty :-(
+
+
+def test_run_apply(tmp_path, caplog):
+    tmp_path.joinpath("foo.x264-bar_x265.mkv").write_bytes(b"foo")
+    tmp_path.joinpath("a.h264-b_x265.mkv").write_bytes(b"a")
+    tmp_path.joinpath("a.b_x265.mkv").write_bytes(b"existing")
+    stream = StringIO()
+    returncode = run(tmp_path, output_stream=stream, apply=True)
+    assert returncode == -3
+    assert tmp_path.joinpath("foo.bar_x265.mkv").read_bytes() == b"foo"
+    assert not tmp_path.joinpath("foo.x264-bar_x265.mkv").exists()
+    # not overwritten
+    assert tmp_path.joinpath("a.b_x265.mkv").read_bytes() == b"existing"
+    assert tmp_path.joinpath("a.h264-b_x265.mkv").exists()
+    assert stream.getvalue().startswith("renamed '")
+    assert caplog.messages[-1] == "Could not rename 1 files."
+
+
+def test_scan_prune(tmp_path):
+    for dirname in ("a", "Subs", "subtitles", ".hidden", "b/ARTWORK", "b/c"):
+        tmp_path.joinpath(dirname).mkdir(parents=True)
+        tmp_path.joinpath(dirname, "foo.x264-bar_x265.mkv").write_bytes(b"foo")
+    actual = [p.relative_to(tmp_path).as_posix() for p in scan(tmp_path)]
+    assert actual == ["a/foo.x264-bar_x265.mkv", "b/c/foo.x264-bar_x265.mkv"]
+    # no pruning, except for hidden directories
+    actual = [p.relative_to(tmp_path).as_posix() for p in scan(tmp_path, prune_dirs=())]
+    assert actual == ["Subs/foo.x264-bar_x265.mkv", "a/foo.x264-bar_x265.mkv",
+                      "b/ARTWORK/foo.x264-bar_x265.mkv", "b/c/foo.x264-bar_x265.mkv",
+                      "subtitles/foo.x264-bar_x265.mkv"]
@@ -3,8 +3,10 @@
 """Unit tests."""
 # pylint: disable=missing-function-docstring, line-too-long
 
+import socket
 import subprocess
 import sys
+import threading
 from io import StringIO
 from pathlib import Path
 from string import Template
@@ -15,13 +17,16 @@ from pymediainfo import MediaInfo
 
 from mediavideotools.video_convert_x265 import \
     ConversionCommand, \
-    __handle_args_cmdtemplate, \
+    __handle_args_cmdtemplate, _get_hwaccel_fallback_template, _limit_encoder_threads, \
+    _socket_listener, _stop_socket_listener, _create_report_file, _ReportFile, _get_nvenc_tune_args, estimate_timeout, \
     _get_done_filename, _build_filename_with_marker, check_metadata_isx265, \
     find_candidates, \
     run, \
     run_conversion_process, \
     main, \
-    CONVERT_CMD_TEMPLATE, ConversionProcessResult
+    CONVERT_CMD_TEMPLATE, CONVERT_CMD_HWACCEL, ConversionProcessResult
+from mediavideotools import video_convert_x265
+from mediavideotools.utils.metadata_cache import MetadataCache
 
 EXAMPLE_TEMPLATE = Template("foo ${input} ${output} ${additional}")
 
@@ -62,6 +67,15 @@ class TestConversionCommand:
         cmd = ConversionCommand(EXAMPLE_TEMPLATE, p)
         assert cmd.get_filepath().absolute() == p.absolute()
 
+    def test_get_argv(self):
+        p = Path('foo "bar" $baz.mkv').absolute()
+        cmd = ConversionCommand(Template(CONVERT_CMD_TEMPLATE), p)
+        assert cmd.get_argv() == ["ffmpeg", "-n", "-hide_banner", "-i", str(p), "-map", "0", "-c:s", "copy",
+                                  "-c:v", "hevc_nvenc", str(p.with_name('foo "bar" $baz_x265.mkv'))]
+        cmd = ConversionCommand(Template('ffmpeg -i "${input}" -vf "a=b c" ${additional} "${output}.tmp"'),
+                                Path("/foo.avi"))
+        assert cmd.get_argv() == ["ffmpeg", "-i", "/foo.avi", "-vf", "a=b c", "/foo_x265.mkv.tmp"]
+
     def test_get_filepath_new(self):
         cmd = ConversionCommand(EXAMPLE_TEMPLATE, Path("foo.mkv"))
         assert cmd.get_filepath_new().name == "foo_x265.mkv"
@@ -199,6 +213,17 @@ def test_find_candidates():
     assert set(actual).intersection(set(expected))
 
 
+def test_find_candidates_cache(tmp_path):
+    with MetadataCache("convert_x265", cache_dir=tmp_path) as cache:
+        expected = find_candidates(Path("./testdata"), min_file_size_mb=0)
+        assert find_candidates(Path("./testdata"), min_file_size_mb=0, cache=cache) == expected
+        # again, now from the cache
+        assert find_candidates(Path("./testdata"), min_file_size_mb=0, cache=cache) == expected
+        assert cache.get(Path(
+            "./testdata/correct/Cool Run (1993) [EN]/subdir/cool.run.720p.bluray.hevc.x265.rmteam_cut.mkv")) \
+            == {"is_x265": True, "has_donotmarker": False}
+
+
 def test_handle_args_cmdtemplate():
     actual = __handle_args_cmdtemplate("EXTRA_ARG1 EXTRA_ARG2")
     assert isinstance(actual, Template)
@@ -207,6 +232,39 @@ def test_handle_args_cmdtemplate():
         'EXTRA_ARG1 EXTRA_ARG2 ${additional} "${output}"'
 
 
+def test_handle_args_cmdtemplate_hwaccel():
+    actual = __handle_args_cmdtemplate("", hwaccel=True)
+    assert actual.template == \
+        'ffmpeg -n -hide_banner -hwaccel cuda -hwaccel_output_format cuda -i "${input}" -map 0 -c:s copy ' \
+        '-c:v hevc_nvenc ${additional} "${output}"'
+    assert _get_hwaccel_fallback_template(actual).template == \
+        'ffmpeg -n -hide_banner -hwaccel nvdec -i "${input}" -map 0 -c:s copy ' \
+        '-c:v hevc_nvenc ${additional} "${output}"'
+    # no hardware decoding, no fallback
+    assert _get_hwaccel_fallback_template(__handle_args_cmdtemplate("")) is None
+
+
+def test_limit_encoder_threads():
+    assert _limit_encoder_threads(Template("ffmpeg -c:v libx265 ${additional}"), 4).template \
+        == "ffmpeg -c:v libx265 -x265-params pools=4 ${additional}"
+    assert _limit_encoder_threads(Template("ffmpeg -c:v libx264 ${additional}"), 8).template \
+        == "ffmpeg -c:v libx264 -threads 4 ${additional}"
+    # hardware encoder
+    assert _limit_encoder_threads(Template(CONVERT_CMD_TEMPLATE), 4).template == CONVERT_CMD_TEMPLATE
+    # explicitly given
+    assert _limit_encoder_threads(Template("ffmpeg -c:v libx264 -threads 2 ${additional}"), 8).template \
+        == "ffmpeg -c:v libx264 -threads 2 ${additional}"
+
+
+def test_get_nvenc_tune_args():
+    assert _get_nvenc_tune_args("balanced", 8.9) == "-preset p4 -tune hq"
+    assert _get_nvenc_tune_args("fast", None) \
+        == "-preset p1 -tune hq -rc-lookahead 0 -spatial_aq 0 -temporal_aq 0 -b_ref_mode middle"
+    assert _get_nvenc_tune_args("fast", 8.6) == _get_nvenc_tune_args("fast", None)
+    # Ada and newer, two NVENC engines
+    assert _get_nvenc_tune_args("fast", 8.9).endswith(" -split_encode_mode forced")
+
+
 def test_run(monkeypatch, caplog):
     def mock_popen(_, **__):
         proc = subprocess.CompletedProcess("fooargs", 0)
@@ -239,6 +297,124 @@ def test_run(monkeypatch, caplog):
         == "[Errno 2] No such file or directory: 'testdata/incorrect/nocontent_x265.mkv'"
 
 
+def test_run_parallel(monkeypatch, caplog):
+    def mock_popen(_, **__):
+        proc = subprocess.CompletedProcess("fooargs", 0)
+        proc.stderr = StringIO()
+        proc.wait = lambda: None
+        return proc
+
+    monkeypatch.setattr(subprocess, "Popen", mock_popen)
+    result = run(Path("./testdata"), EXAMPLE_TEMPLATE, min_file_size_mb=0,
+                 create_report=False, signalling=False, parallel=3)
+    assert result == 0
+    # 2 broken links, 6 conversions
+    assert len(caplog.messages) == 8
+
+
+def test_run_parallel_largest_first(monkeypatch):
+    started = []
+
+    def mock_popen(argv, **__):
+        started.append(Path(argv[1]))
+        proc = subprocess.CompletedProcess("fooargs", 0)
+        proc.stderr = StringIO()
+        proc.wait = lambda: None
+        return proc
+
+    monkeypatch.setattr(subprocess, "Popen", mock_popen)
+    file_sizes = {}
+    candidates = find_candidates(Path("./testdata"), min_file_size_mb=0, file_sizes=file_sizes)
+    assert set(file_sizes) >= set(candidates)
+    largest = max(candidates, key=file_sizes.get).absolute()
+    run(Path("./testdata"), EXAMPLE_TEMPLATE, min_file_size_mb=0,
+        create_report=False, signalling=False, parallel=2)
+    assert len(started) == len(candidates)
+    # started by one of the 2 workers first
+    assert largest in started[:2]
+
+
+def test_run_abortonerror(monkeypatch, caplog):
+    def mock_popen(_, **__):
+        proc = subprocess.CompletedProcess("fooargs", 111)
+        proc.stderr = StringIO()
+        proc.wait = lambda: None
+        return proc
+
+    monkeypatch.setattr(subprocess, "Popen", mock_popen)
+    result = run(Path("./testdata"), EXAMPLE_TEMPLATE, min_file_size_mb=0,
+                 abortonerrror=True, create_report=False, signalling=False)
+    # stopped after the first one
+    assert result == ConversionProcessResult.NON_ZERO
+    assert caplog.messages.count("PROBLEM running converter! return code: 111") == 1
+
+
+def _hwaccel_template(stderr_cuda: str) -> Template:
+    """Failing fake converter with hardware decoding, records the '-hwaccel' value in <output>.runs."""
+    script = "import sys; open(sys.argv[-1] + '.runs', 'a').write(sys.argv[2] + chr(10)); " \
+             f"sys.stderr.write('{stderr_cuda}' if sys.argv[2] == 'cuda' else 'Conversion failed!'); sys.exit(1)"
+    return Template(f'"{sys.executable}" -c "{script}" {CONVERT_CMD_HWACCEL} -i "${{input}}" ${{additional}} "${{output}}"')
+
+
+def test_run_hwaccel_fallback(tmp_path):
+    filepath = tmp_path.joinpath("foo.mkv")
+    filepath.write_bytes(Path("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv").read_bytes())
+    template = _hwaccel_template("[hevc @ 0x1] Failed setup for format cuda: hwaccel initialisation returned error.")
+    result = run(tmp_path, template, min_file_size_mb=0, signalling=False)
+    # the retry failed too, but not because of hardware decoding
+    assert result == ConversionProcessResult.NON_ZERO
+    assert tmp_path.joinpath("foo_x265.mkv.runs").read_text() == "cuda\nnvdec\n"
+    # the first attempt's report is kept
+    assert b"Failed setup for format cuda" in tmp_path.joinpath("foo_x265.hwaccel_failed.log").read_bytes()
+    assert b"Conversion failed!" in tmp_path.joinpath("foo_x265.log").read_bytes()
+
+
+def test_run_hwaccel_fallback_othererror(tmp_path):
+    filepath = tmp_path.joinpath("foo.mkv")
+    filepath.write_bytes(Path("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv").read_bytes())
+    result = run(tmp_path, _hwaccel_template("No space left on device"), min_file_size_mb=0, signalling=False)
+    assert result == ConversionProcessResult.NON_ZERO
+    # no retry
+    assert tmp_path.joinpath("foo_x265.mkv.runs").read_text() == "cuda\n"
+    assert not tmp_path.joinpath("foo_x265.hwaccel_failed.log").exists()
+
+
+def test_run_conversion_process_already_x265(monkeypatch):
+    def mock_popen(_, **__):
+        raise AssertionError("must not be called")
+
+    monkeypatch.setattr(subprocess, "Popen", mock_popen)
+    cmd = ConversionCommand(Template(CONVERT_CMD_TEMPLATE), Path(
+        "./testdata/correct/Cool Run (1993) [EN]/subdir/cool.run.720p.bluray.hevc.x265.rmteam_cut.mkv"))
+    assert not cmd.should_convert()
+    assert run_conversion_process(cmd, create_report=False) == ConversionProcessResult.OK
+    # not a HEVC file, or not existing
+    assert ConversionCommand(EXAMPLE_TEMPLATE, Path(
+        "./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv")).should_convert()
+    assert ConversionCommand(EXAMPLE_TEMPLATE, Path("foo.bar")).should_convert()
+
+
+def test_run_conversion_process_timeout(tmp_path):
+    # a stalled process
+    template = Template(f'"{sys.executable}" -c "import time; time.sleep(30)" "${{input}}" "${{output}}" ${{additional}}')
+    cmd = ConversionCommand(template, tmp_path.joinpath("foo.mkv"))
+    result = run_conversion_process(cmd, create_report=False, timeout=0.5)
+    assert result == ConversionProcessResult.TIMED_OUT
+
+
+def test_run_conversion_process_nice(tmp_path):
+    template = Template(f'"{sys.executable}" -c "import os, time; time.sleep(0.2); assert os.nice(0) >= 10" "${{input}}" "${{output}}" ${{additional}}')
+    cmd = ConversionCommand(template, tmp_path.joinpath("foo.mkv"))
+    # the process fails (NON_ZERO) if not niced
+    assert run_conversion_process(cmd, create_report=False, nice=True) == ConversionProcessResult.OK
+
+
+def test_estimate_timeout():
+    # 1 second video, the minimum
+    assert estimate_timeout(Path("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv")) == 600
+    assert estimate_timeout(Path("./testdata/NOTEXISTING.mkv")) is None
+
+
 def test_run_conversion_process_nonzeroreturncode(monkeypatch, caplog):
     def mock_popen(_, **__):
         proc = subprocess.CompletedProcess("fooargs", 111)
@@ -254,6 +430,54 @@ def test_run_conversion_process_nonzeroreturncode(monkeypatch, caplog):
     assert caplog.messages == ["PROBLEM running converter! return code: 111"]
 
 
+def test_socket_listener(monkeypatch):
+    monkeypatch.setattr(video_convert_x265, "main_loop_stop", threading.Event())
+    sock = socket.create_server(("localhost", 0))
+    monkeypatch.setattr(video_convert_x265, "TCP_PORT", sock.getsockname()[1])
+    thread = threading.Thread(target=_socket_listener, args=(sock,))
+    thread.start()
+    # a connection flags the main loop to stop
+    socket.create_connection(("localhost", video_convert_x265.TCP_PORT)).close()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert video_convert_x265.main_loop_stop.is_set()
+
+
+def test_stop_socket_listener(monkeypatch):
+    monkeypatch.setattr(video_convert_x265, "main_loop_stop", threading.Event())
+    sock = socket.create_server(("localhost", 0))
+    monkeypatch.setattr(video_convert_x265, "TCP_PORT", sock.getsockname()[1])
+    thread = threading.Thread(target=_socket_listener, args=(sock,))
+    thread.start()
+    video_convert_x265.main_loop_stop.set()
+    _stop_socket_listener()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    # not running anymore, no problem
+    _stop_socket_listener()
+
+
+def test_create_report_file(tmp_path):
+    report_filepath = tmp_path.joinpath("foo.log")
+    _create_report_file(report_filepath, "ffmpeg foo",
+                        b"Input #0\nframe=    1 fps=0.0\rframe=    2 fps=0.0\rStream mapping:\n")
+    assert report_filepath.read_bytes() == b"cmd_str: ffmpeg foo\n\nInput #0\nStream mapping:\n"
+    _create_report_file(report_filepath, "ffmpeg foo", b"")
+    assert report_filepath.read_bytes() == b"cmd_str: ffmpeg foo\n\n"
+
+
+def test_report_file_chunks(tmp_path):
+    report_filepath = tmp_path.joinpath("foo.log")
+    data = b"Input #0\r\nframe=    1 fps=0.0\rframe=    2 fps=0.0\rStream mapping:\nend"
+    # lines split between chunks
+    for i in range(len(data) + 1):
+        report_file = _ReportFile(report_filepath, "ffmpeg foo")
+        report_file.write(data[:i])
+        report_file.write(data[i:])
+        report_file.close()
+        assert report_filepath.read_bytes() == b"cmd_str: ffmpeg foo\n\nInput #0\nStream mapping:\nend\n"
+
+
 def test_run_invalid_root():
     with pytest.raises(NotADirectoryError):
         # first argument must be a valid directory
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 """Unit tests."""
 
+import csv
 from io import StringIO
 from pathlib import Path
 
@@ -9,8 +10,9 @@ import pytest
 from docopt import DocoptExit
 
 from mediavideotools.video_info import scan, main
+from mediavideotools.utils.metadata_cache import MetadataCache
 
-TESTDATA_RUNTIME_OUTPUT_LENGTH = 4125
+TESTDATA_RUNTIME_OUTPUT_LENGTH = 4132
 
 
 def test_scan():
@@ -19,6 +21,64 @@ def test_scan():
     scan(Path("./testdata"), output_stream=out)
     actual = out.getvalue()
     assert len(actual) == TESTDATA_RUNTIME_OUTPUT_LENGTH
+    # all rows with all columns, also for files without video track
+    for row in csv.reader(StringIO(actual), delimiter=";"):
+        assert len(row) == 15
+
+
+def test_scan_cache(tmp_path):
+    """Test the main scanning method with a persistent cache."""
+    filepath = Path("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv")
+    with MetadataCache("test", cache_dir=tmp_path) as cache:
+        out = StringIO()
+        scan(Path("./testdata"), output_stream=out, cache=cache)
+        assert len(out.getvalue()) == TESTDATA_RUNTIME_OUTPUT_LENGTH
+        assert cache.get(filepath)["values"][1] == "Matroska"
+        # cached values are used
+        cache.put(filepath, {"values": ["1"] * 14})
+        out = StringIO()
+        scan(Path("./testdata"), output_stream=out, cache=cache)
+        assert '"testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv";1;1;1;' in out.getvalue()
+
+
+def test_scan_notopened(monkeypatch, caplog, tmp_path):
+    """Test the main scanning method with files MediaInfo can not open."""
+    monkeypatch.setattr("mediavideotools.utils.mediainfo_handle.MediaInfoHandle.open", lambda *_: False)
+    filepath = Path("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv")
+    with MetadataCache("test", cache_dir=tmp_path) as cache:
+        out = StringIO()
+        scan(filepath.parent, output_stream=out, cache=cache)
+        # only the header, and not cached
+        assert len(out.getvalue().splitlines()) == 1
+        assert cache.get(filepath) is None
+    assert f"MediaInfo could not open the file: {filepath.absolute()}" in caplog.messages
+
+def test_scan_chunks(monkeypatch):
+    """Test the main scanning method with small output chunks."""
+    monkeypatch.setattr("mediavideotools.video_info.OUTPUT_CHUNK_SIZE", 500)
+    writes = []
+
+    class Output(StringIO):
+        def write(self, s):
+            writes.append(s)
+            return super().write(s)
+
+    out = Output()
+    scan(Path("./testdata"), output_stream=out)
+    assert len(out.getvalue()) == TESTDATA_RUNTIME_OUTPUT_LENGTH
+    # header line, the chunks, and the remainder
+    assert 3 < len(writes) < 26
+
+
+def test_scan_outside_cwd(monkeypatch, tmp_path):
+    """Test the main scanning method for a directory outside the current working directory."""
+    rootdir = Path("./testdata/correct/SampleVideoMkv").resolve()
+    monkeypatch.chdir(tmp_path)
+    out = StringIO()
+    scan(rootdir, output_stream=out)
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 2
+    assert lines[1].startswith(f'"{rootdir.joinpath("SampleVideo_1280x720_1sec.mkv")}";')
 
 
 def test_scan_nodir():
@@ -12,6 +12,7 @@ from mediavideotools.video_language_check import __get_path_languages, \
     __get_missing_in_path, __get_toomuch_in_path, \
     get_track_languages_for_file, get_track_languages_for_files, \
     scan, main
+from mediavideotools.utils.metadata_cache import MetadataCache
 
 
 def test_get_path_languages():
@@ -62,6 +63,19 @@ def test_get_track_languages_for_file_novideofile():
     assert actual is None
 
 
+def test_get_track_languages_for_file_cache(tmp_path):
+    filepath = Path("./testdata/correct/Cool Run (1993) ["
+                    "EN]/subdir/cool.run.720p.bluray.hevc.x265.rmteam_cut.mkv")
+    with MetadataCache("test", cache_dir=tmp_path) as cache:
+        assert get_track_languages_for_file(filepath, cache) == {"EN"}
+        assert cache.get(filepath) == {"languages": ["EN"]}
+        assert get_track_languages_for_file(Path("test_video_language_check.py"), cache) is None
+        assert cache.get(Path("test_video_language_check.py")) == {"languages": None}
+        # cached
+        cache.put(filepath, {"languages": ["DE", "EN"]})
+        assert get_track_languages_for_file(filepath, cache) == {"DE", "EN"}
+
+
 def test_get_track_languages_for_file_invalid():
     with pytest.raises(TypeError):
         # noinspection PyTypeChecker
@@ -72,6 +86,13 @@ def test_get_track_languages_for_file_invalid():
         get_track_languages_for_file(Path("DOESNOTEXIST"))
 
 
+def test_get_track_languages_for_file_brokenlinks():
+    with pytest.raises(FileNotFoundError):
+        get_track_languages_for_file(Path("./testdata/incorrect/broken_links/doesnotexist"))
+    with pytest.raises(FileNotFoundError):
+        get_track_languages_for_file(Path("./testdata/incorrect/broken_links/cycle"))
+
+
 def test_get_track_languages_for_files_ok1():
     paths = [
         Path("./testdata/README.md"),  # ignored
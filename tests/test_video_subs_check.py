@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 """Unit tests."""
 
+import os
 from io import StringIO
 from pathlib import Path
 
@@ -18,6 +19,37 @@ def test_scan():
     assert len(actual) == 175
 
 
+def test_scan_extensions(tmp_path):
+    """Test the main scanning method with upper-case movie filename extensions."""
+    tmp_path.joinpath("Subs").mkdir()
+    tmp_path.joinpath("Subs", "foobar-eng.sub").touch()
+    tmp_path.joinpath("foobar.MKV").touch()
+    tmp_path.joinpath("foobar.nfo").touch()
+    out = StringIO()
+    scan(tmp_path, output_stream=out)
+    assert out.getvalue() == ""
+    tmp_path.joinpath("another.avi").touch()
+    scan(tmp_path, output_stream=out)
+    assert out.getvalue() == f"{tmp_path.resolve()}\n"
+
+
+def test_scan_subsdir_case(tmp_path):
+    """Test the main scanning method with an upper-case SUBS folder."""
+    tmp_path.joinpath("SUBS").mkdir()
+    tmp_path.joinpath("SUBS", "foobar-eng.sub").touch()
+    tmp_path.joinpath("another.mkv").touch()
+    out = StringIO()
+    scan(tmp_path, output_stream=out)
+    assert out.getvalue() == f"{tmp_path.resolve()}\n"
+
+
+def test_scan_cwd():
+    """Test that the main scanning method does not change the working directory."""
+    cwd = os.getcwd()
+    scan(Path("./testdata"), output_stream=StringIO())
+    assert os.getcwd() == cwd
+
+
 def test_scan_nodir():
     """Test the main scanning method, but with wrong paramters."""
     with pytest.raises(NotADirectoryError):
@@ -0,0 +1,30 @@
+#!pytest
+# -*- coding: utf-8 -*-
+"""Unit tests."""
+
+# pylint: disable=missing-function-docstring
+
+from mediavideotools.utils.cpu_info import get_physical_cpu_count, get_cgroup_cpu_limit, get_usable_cpu_count
+
+
+def test_get_physical_cpu_count(tmp_path):
+    cpuinfo = tmp_path.joinpath("cpuinfo")
+    # 2 sockets, 2 cores each, with hyper-threading
+    cpuinfo.write_text("".join(f"processor\t: {i}\nphysical id\t: {i // 4}\ncore id\t\t: {i % 2}\n\n"
+                               for i in range(8)))
+    assert get_physical_cpu_count(str(cpuinfo)) == 4
+    # unknown
+    assert get_physical_cpu_count(str(tmp_path.joinpath("NOTEXISTING"))) >= 1
+
+
+def test_get_cgroup_cpu_limit(tmp_path):
+    cpu_max = tmp_path.joinpath("cpu.max")
+    cpu_max.write_text("max 100000\n")
+    assert get_cgroup_cpu_limit(str(cpu_max)) is None
+    cpu_max.write_text("250000 100000\n")
+    assert get_cgroup_cpu_limit(str(cpu_max)) == 3
+    assert get_cgroup_cpu_limit(str(tmp_path.joinpath("NOTEXISTING"))) is None
+
+
+def test_get_usable_cpu_count():
+    assert 1 <= get_usable_cpu_count() <= get_physical_cpu_count()
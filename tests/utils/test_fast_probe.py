@@ -0,0 +1,103 @@
+#!pytest
+# -*- coding: utf-8 -*-
+"""Unit tests."""
+
+# pylint: disable=missing-function-docstring, invalid-name
+
+import struct
+
+import pytest
+
+from mediavideotools.utils.fast_probe import probe_codec, CONTAINER_MATROSKA, CONTAINER_MP4
+
+
+def _ebml(element_id: int, data: bytes) -> bytes:
+    """Encode an EBML element, with an 8-byte size."""
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big") \
+        + (0x01 << 56 | len(data)).to_bytes(8, "big") + data
+
+
+def _mkv(codec_id: bytes, tags: bytes = None) -> bytes:
+    """Minimal MKV: header, seek head, tracks, a cluster, and the tags at the end."""
+    ebml_header = _ebml(0x1A45DFA3, _ebml(0x4282, b"matroska"))
+    tracks = _ebml(0x1654AE6B, _ebml(0xAE, _ebml(0x83, b"\x01") + _ebml(0x86, codec_id))
+                   + _ebml(0xAE, _ebml(0x83, b"\x02") + _ebml(0x86, b"A_AAC")))
+    cluster = _ebml(0x1F43B675, bytes(1000))
+    if tags is None:
+        return ebml_header + _ebml(0x18538067, tracks + cluster)
+    seekhead_size = len(_ebml(0x114D9B74, _ebml(0x4DBB, _ebml(0x53AB, bytes(4)) + _ebml(0x53AC, bytes(8)))))
+    tags_position = seekhead_size + len(tracks) + len(cluster)
+    seekhead = _ebml(0x114D9B74, _ebml(0x4DBB, _ebml(0x53AB, b"\x12\x54\xc3\x67")
+                                       + _ebml(0x53AC, tags_position.to_bytes(8, "big"))))
+    segment_data = seekhead + tracks + cluster + tags
+    return ebml_header + _ebml(0x18538067, segment_data)
+
+
+def _mkv_tags(*names: bytes) -> bytes:
+    """Tags with nested simple tags, e.g., ("video_convert_x265", "x265_no_gain")."""
+    simpletag = b""
+    for name in reversed(names):
+        simpletag = _ebml(0x67C8, _ebml(0x45A3, name) + _ebml(0x4487, b"1") + simpletag)
+    return _ebml(0x1254C367, _ebml(0x7373, simpletag))
+
+
+def _box(box_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(data), box_type) + data
+
+
+def _mp4(sample_entry: bytes) -> bytes:
+    """Minimal MP4, with the moov box at the end."""
+    stsd = _box(b"stsd", bytes(4) + struct.pack(">I", 1) + _box(sample_entry, bytes(78)))
+    trak = _box(b"trak", _box(b"mdia", _box(b"hdlr", bytes(8) + b"vide" + bytes(12))
+                                + _box(b"minf", _box(b"stbl", stsd))))
+    return _box(b"ftyp", b"isom" + bytes(4)) + _box(b"mdat", bytes(1000)) + _box(b"moov", trak)
+
+
+def test_probe_codec_testdata():
+    container, info = probe_codec(
+        "./testdata/correct/Cool Run (1993) [EN]/subdir/cool.run.720p.bluray.hevc.x265.rmteam_cut.mkv")
+    assert container == CONTAINER_MATROSKA
+    assert info["video_codecs"] == ["V_MPEGH/ISO/HEVC"]
+    container, info = probe_codec("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv")
+    assert container == CONTAINER_MATROSKA
+    assert info["video_codecs"] == ["V_MPEG4/ISO/ASP"]
+
+
+def test_probe_codec_mkv_tags(tmp_path):
+    filepath = tmp_path.joinpath("foo.mkv")
+    filepath.write_bytes(_mkv(b"V_MPEGH/ISO/HEVC", _mkv_tags(b"video_convert_x265", b"x265_no_gain")))
+    container, info = probe_codec(filepath)
+    assert container == CONTAINER_MATROSKA
+    assert info["video_codecs"] == ["V_MPEGH/ISO/HEVC"]
+    assert info["tag_names"] == {"video_convert_x265", "video_convert_x265_x265_no_gain"}
+
+    filepath.write_bytes(_mkv(b"V_MPEG4/ISO/AVC"))
+    assert probe_codec(filepath) == (CONTAINER_MATROSKA, {"video_codecs": ["V_MPEG4/ISO/AVC"], "tag_names": set()})
+
+
+def test_probe_codec_mp4(tmp_path):
+    filepath = tmp_path.joinpath("foo.mp4")
+    filepath.write_bytes(_mp4(b"hvc1"))
+    assert probe_codec(filepath) == (CONTAINER_MP4, {"video_codecs": ["hvc1"], "tag_names": set()})
+    filepath.write_bytes(_mp4(b"avc1"))
+    assert probe_codec(filepath) == (CONTAINER_MP4, {"video_codecs": ["avc1"], "tag_names": set()})
+
+
+def test_probe_codec_unknown(tmp_path):
+    # not MKV or MP4
+    assert probe_codec("./testdata/correct/sample-3s.mp3") == ("", {})
+    # AVI compatibility mode, the actual codec is not known
+    filepath = tmp_path.joinpath("foo.mkv")
+    filepath.write_bytes(_mkv(b"V_MS/VFW/FOURCC"))
+    assert probe_codec(filepath) == ("", {})
+    # truncated
+    filepath.write_bytes(_mkv(b"V_MPEGH/ISO/HEVC")[:50])
+    assert probe_codec(filepath) == ("", {})
+    # empty
+    filepath.write_bytes(b"")
+    assert probe_codec(filepath) == ("", {})
+
+
+def test_probe_codec_notexisting():
+    with pytest.raises(OSError):
+        probe_codec("./testdata/NOTEXISTING.mkv")
@@ -4,11 +4,12 @@
 
 # pylint: disable=missing-function-docstring, line-too-long, invalid-name
 
+import os
 from pathlib import Path
 
 import pytest
 
-from mediavideotools.utils.file_utils import get_file_size_mb
+from mediavideotools.utils.file_utils import get_file_size_mb, scandir_walk, drop_page_cache
 
 
 def test_get_file_size_mb():
@@ -40,3 +41,31 @@ def test_get_file_size_mb():
     assert get_file_size_mb(
         Path("./testdata/correct/symlinks/SampleVideo_1280x720_1sec.mkv")) == 0.23
     assert get_file_size_mb(Path("./testdata/correct/symlinks/null")) == 0
+
+
+@pytest.mark.parametrize("max_workers", (1, 4))
+def test_scandir_walk(max_workers):
+    # same as os.walk(), also the order
+    expected = [(root, dirs, files) for root, dirs, files in os.walk("testdata")]
+    actual = [(root, [entry.name for entry in dir_entries], [entry.name for entry in file_entries])
+              for root, dir_entries, file_entries in scandir_walk("testdata", max_workers)]
+    assert actual == expected
+
+
+def test_scandir_walk_prune():
+    actual = []
+    for root, dir_entries, _ in scandir_walk("testdata"):
+        actual.append(root)
+        dir_entries[:] = [entry for entry in dir_entries if entry.name != "incorrect"]
+    assert "testdata/correct" in actual
+    assert not any(root.startswith("testdata/incorrect") for root in actual)
+
+
+def test_scandir_walk_nosuchdir():
+    assert not list(scandir_walk("DOESNOTEXIST"))
+
+
+def test_drop_page_cache():
+    if hasattr(os, "posix_fadvise"):
+        assert drop_page_cache(Path("./testdata/correct/sample-3s.mp3"))
+    assert not drop_page_cache(Path("DOESNOTEXIST"))
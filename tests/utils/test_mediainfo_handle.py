@@ -0,0 +1,72 @@
+#!pytest
+# -*- coding: utf-8 -*-
+"""Unit tests."""
+
+# pylint: disable=missing-function-docstring
+
+import pytest
+
+from mediavideotools.utils import mediainfo_handle
+from mediavideotools.utils.mediainfo_handle import \
+    MediaInfoHandle, ParsedMediaInfoHandle, get_thread_handle, to_number, STREAM_AUDIO, STREAM_VIDEO
+
+
+def test_to_number():
+    assert to_number("1002") == 1002
+    assert to_number("1002.500") == 1002.5
+    assert to_number("") is None
+    assert to_number("en") is None
+
+
+def test_get():
+    handle = MediaInfoHandle()
+    assert handle.open("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv")
+    assert handle.get("Duration") == "1002"
+    assert handle.get("FileSize") == "242994"
+    assert handle.get("OverallBitRate") == "1940072"
+    assert handle.count(STREAM_VIDEO) == 1
+    assert handle.get("NOTAFIELD") == ""
+    # reuse the handle for the next file
+    assert handle.open("./testdata/correct/lang/mixed [DE][EN]/boundin.2003.720p.bluray.sinners_s_x265.mkv")
+    assert handle.count(STREAM_AUDIO) == 1
+    assert handle.get("Language", STREAM_AUDIO, 0) == "en"
+    handle.close()
+
+
+def test_open_nosuchfile():
+    with pytest.raises(FileNotFoundError):
+        MediaInfoHandle().open("DOESNOTEXIST")
+
+
+def test_get_thread_handle():
+    assert get_thread_handle() is get_thread_handle()
+    assert get_thread_handle(0) is not get_thread_handle(1)
+
+
+def test_load_library(monkeypatch):
+    # pylint: disable-next=protected-access
+    load_library = mediainfo_handle._load_library.__wrapped__
+    assert load_library() is not None
+    monkeypatch.setattr(mediainfo_handle, "_get_library_paths", lambda: ["DOESNOTEXIST.so"])
+    monkeypatch.setattr("ctypes.util.find_library", lambda _: None)
+    assert load_library() is None
+
+
+def test_parsed_handle():
+    handle = ParsedMediaInfoHandle(0)
+    assert handle.open("./testdata/correct/SampleVideoMkv/SampleVideo_1280x720_1sec.mkv")
+    assert handle.get("Duration") == "1002"
+    assert handle.get("FileSize") == "242994"
+    assert handle.get("OverallBitRate") == "1940072"
+    assert handle.count(STREAM_VIDEO) == 1
+    assert handle.get("Format", STREAM_VIDEO) == "MPEG-4 Visual"
+    assert handle.get("Audio_Codec_List") == "AAC LC"
+    assert handle.get("NOTAFIELD") == ""
+    assert handle.get("Format", STREAM_VIDEO, 1) == ""
+    assert handle.open("./testdata/correct/lang/mixed [DE][EN]/boundin.2003.720p.bluray.sinners_s_x265.mkv")
+    assert handle.count(STREAM_AUDIO) == 1
+    assert handle.get("Language", STREAM_AUDIO, 0) == "en"
+    handle.close()
+    assert handle.count(STREAM_AUDIO) == 0
+    with pytest.raises(FileNotFoundError):
+        handle.open("DOESNOTEXIST")
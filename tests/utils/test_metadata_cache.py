@@ -0,0 +1,68 @@
+#!pytest
+# -*- coding: utf-8 -*-
+"""Unit tests."""
+
+# pylint: disable=missing-function-docstring, invalid-name
+
+import os
+from pathlib import Path
+
+from mediavideotools.utils.metadata_cache import MetadataCache, get_default_cache_dir
+
+
+def test_get_default_cache_dir(monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", "/tmp/xdgcache")
+    assert get_default_cache_dir() == Path("/tmp/xdgcache/mediavideotools")
+    monkeypatch.delenv("XDG_CACHE_HOME")
+    assert get_default_cache_dir() == Path.home().joinpath(".cache", "mediavideotools")
+
+
+def test_get_put(tmp_path):
+    filepath = tmp_path.joinpath("foo.mkv")
+    filepath.write_bytes(b"foo")
+    with MetadataCache("test", cache_dir=tmp_path) as cache:
+        assert cache.filepath == tmp_path.joinpath("test.db")
+        assert cache.get(filepath) is None
+        cache.put(filepath, {"duration": 1.5})
+        assert cache.get(filepath) == {"duration": 1.5}
+    # persistent
+    with MetadataCache("test", cache_dir=tmp_path) as cache:
+        assert cache.get(filepath) == {"duration": 1.5}
+        # changed file size => outdated
+        filepath.write_bytes(b"foobar")
+        assert cache.get(filepath) is None
+
+
+def test_get_put_modified(tmp_path):
+    filepath = tmp_path.joinpath("foo.mkv")
+    filepath.write_bytes(b"foo")
+    with MetadataCache("test", cache_dir=tmp_path) as cache:
+        cache.put(filepath, [1, 2])
+        stat_result = filepath.stat()
+        os.utime(filepath, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 1))
+        assert cache.get(filepath) is None
+
+
+def test_get_put_nosuchfile(tmp_path):
+    with MetadataCache("test", cache_dir=tmp_path) as cache:
+        cache.put(Path("DOESNOTEXIST"), 1)
+        assert cache.get(Path("DOESNOTEXIST")) is None
+
+
+def test_read_only(tmp_path):
+    filepath = tmp_path.joinpath("foo.mkv")
+    filepath.write_bytes(b"foo")
+    filepath2 = tmp_path.joinpath("bar.mkv")
+    filepath2.write_bytes(b"bar")
+    with MetadataCache("test", cache_dir=tmp_path) as cache:
+        cache.put(filepath, {"duration": 1.5})
+        # uncommitted entry of the writing connection, no locking conflicts
+        cache.put(filepath2, {"duration": 3})
+        with MetadataCache("test", cache_dir=tmp_path, read_only=True) as cache_ro:
+            assert cache_ro.get(filepath) is None
+            cache_ro.put(filepath2, {"duration": 2.5})
+            assert cache_ro.get(filepath2) is None
+            assert cache_ro.collected == [(str(filepath2), {"duration": 2.5}, filepath2.stat())]
+        # the collected entries are written by the writing connection
+        cache.put(*cache_ro.collected[0])
+        assert cache.get(filepath2) == {"duration": 2.5}